@@ -1,10 +1,11 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from collections.abc import Iterable
-from datetime import datetime
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass, field
+from functools import partial
 from ipaddress import IPv4Interface
-from util import LogRecord
+from typing import Optional
+from util import LogRecord, format_timestamp, group_by_server
 
 
 class RecordAbstractState(ABC):
@@ -34,7 +35,7 @@ class RecordFailedState(RecordAbstractState):
         last_fail_datetime: 故障時刻
     """
 
-    last_fail_datetime: datetime
+    last_fail_datetime: int
 
     def push_newer_record(self, record: LogRecord):
         if not record.is_timed_out:
@@ -55,8 +56,8 @@ class RecordRecoveredState(RecordAbstractState):
         recovery_datetime: 復旧時刻
     """
 
-    last_fail_datetime: datetime
-    recovery_datetime: datetime
+    last_fail_datetime: int
+    recovery_datetime: int
 
     def push_newer_record(self, record: LogRecord):
         if record.is_timed_out:
@@ -67,9 +68,16 @@ class RecordRecoveredState(RecordAbstractState):
 
 @dataclass
 class ServerContext:
-    """サーバ状態のコンテクスト"""
+    """サーバ状態のコンテクスト
+
+    Attributes:
+        on_transition: 状態が変わるたびに新しい状態を受け取る関数
+    """
 
     _state: RecordAbstractState = field(default_factory=RecordHealthyState)
+    on_transition: Optional[Callable[[RecordAbstractState], None]] = field(
+        default=None, repr=False, compare=False
+    )
 
     def __post_init__(self):
         self._state._context = self
@@ -77,9 +85,16 @@ class ServerContext:
     def push_newer_record(self, record: LogRecord):
         self._state.push_newer_record(record)
 
+    def push_newer_records(self, records: Iterable[LogRecord]):
+        """同じサーバの記録を古い順にまとめて処理する"""
+        for record in records:
+            self._state.push_newer_record(record)
+
     def transition_to(self, state: RecordAbstractState):
         self._state = state
         self._state._context = self
+        if self.on_transition is not None:
+            self.on_transition(state)
 
     @property
     def state(self):
@@ -88,19 +103,30 @@ class ServerContext:
 
 ServerContextMap = dict[IPv4Interface, ServerContext]
 
+TransitionCallback = Callable[[IPv4Interface, RecordAbstractState], None]
 
-def detect_failure_duration(log: Iterable[LogRecord]) -> ServerContextMap:
+
+def detect_failure_duration(
+    log: Iterable[LogRecord], on_transition: Optional[TransitionCallback] = None
+) -> ServerContextMap:
     """読み込まれた監視ログからサーバ状態（健康・故障・復旧）を算出する
 
     Args:
         log: 読み込まれた監視ログ
+        on_transition: 状態が変わるたびにサーバアドレスと新しい状態を受け取る関数
+            （`sinks.PeriodRecorder` など）
     """
     ip_context_map: ServerContextMap = {}
-    for record in log:
-        record_failure_context = ip_context_map.setdefault(
-            record.ipv4interface, ServerContext()
-        )
-        record_failure_context.push_newer_record(record)
+    for batch in group_by_server(log):
+        for ip, records in batch.items():
+            record_failure_context = ip_context_map.get(ip)
+            if record_failure_context is None:
+                record_failure_context = ip_context_map[ip] = ServerContext(
+                    on_transition=None
+                    if on_transition is None
+                    else partial(on_transition, ip)
+                )
+            record_failure_context.push_newer_records(records)
     return ip_context_map
 
 
@@ -116,8 +142,10 @@ def print_failure_duration(log: Iterable[LogRecord]):
     failure_contexts = detect_failure_duration(log)
     for ipv4interface, context in failure_contexts.items():
         if isinstance(context.state, RecordFailedState):
-            print(f"{ipv4interface}, {context.state.last_fail_datetime.isoformat()},")
+            print(
+                f"{ipv4interface}, {format_timestamp(context.state.last_fail_datetime)},"
+            )
         elif isinstance(context.state, RecordRecoveredState):
             print(
-                f"{ipv4interface}, {context.state.last_fail_datetime.isoformat()}, {context.state.recovery_datetime.isoformat()}"
+                f"{ipv4interface}, {format_timestamp(context.state.last_fail_datetime)}, {format_timestamp(context.state.recovery_datetime)}"
             )
@@ -1,10 +1,13 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from collections.abc import Iterable
-from datetime import datetime
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass, field
+from functools import partial
 from ipaddress import IPv4Interface
-from util import LogRecord
+from typing import Optional
+from baseline import DEFAULT_ALPHA, EwmaBaseline, create_baseline
+from sliding_window import AVERAGE, SlidingWindow, create_sliding_window
+from util import LogRecord, format_timestamp, group_by_server
 
 
 class RecordAbstractState(ABC):
@@ -27,8 +30,8 @@ class RecordHealthyState(RecordAbstractState):
         last_overload_datetime_chain: 直近で連続して応答時間が長かった時刻のリスト
     """
 
-    last_timeout_datetime_chain: list[datetime] = field(default_factory=list)
-    last_overload_datetime_chain: list[datetime] = field(default_factory=list)
+    last_timeout_datetime_chain: list[int] = field(default_factory=list)
+    last_overload_datetime_chain: list[int] = field(default_factory=list)
 
     def push_newer_record(self, record: LogRecord):
         if record.is_timed_out:
@@ -45,7 +48,15 @@ class RecordHealthyState(RecordAbstractState):
                 )
         else:
             self.last_timeout_datetime_chain = []
-            if record.response_ms > self.overload_timeout_threshold:
+            if self._context.overload_window is not None:
+                if (
+                    self._context.overload_window.value
+                    > self.overload_timeout_threshold
+                ):
+                    self._context.transition_to(
+                        RecordOverloadState(last_overload_datetime=record.datetime)
+                    )
+            elif self._context.is_slow(record):
                 self.last_overload_datetime_chain.append(record.datetime)
                 if (
                     len(self.last_overload_datetime_chain)
@@ -66,7 +77,7 @@ class RecordFailedState(RecordAbstractState):
         last_fail_datetime: 故障時刻
     """
 
-    last_fail_datetime: datetime
+    last_fail_datetime: int
 
     def push_newer_record(self, record: LogRecord):
         if not record.is_timed_out:
@@ -87,8 +98,8 @@ class RecordFailRecoveredState(RecordHealthyState):
         fail_recovery_datetime: 復旧時刻
     """
 
-    last_fail_datetime: datetime
-    fail_recovery_datetime: datetime
+    last_fail_datetime: int
+    fail_recovery_datetime: int
 
 
 @dataclass(kw_only=True)
@@ -99,10 +110,14 @@ class RecordOverloadState(RecordAbstractState):
         last_overload_datetime: 過負荷時刻
     """
 
-    last_overload_datetime: datetime
+    last_overload_datetime: int
 
     def push_newer_record(self, record: LogRecord):
-        if not record.response_ms > self.overload_timeout_threshold:
+        if self._context.overload_window is not None:
+            slow = self._context.overload_window.value > self.overload_timeout_threshold
+        else:
+            slow = self._context.is_slow(record)
+        if not slow:
             self._context.transition_to(
                 RecordOverloadRecorveredState(
                     last_overload_datetime=self.last_overload_datetime,
@@ -120,8 +135,8 @@ class RecordOverloadRecorveredState(RecordHealthyState):
         overload_recovery_datetime: 復旧時刻
     """
 
-    last_overload_datetime: datetime
-    overload_recovery_datetime: datetime
+    last_overload_datetime: int
+    overload_recovery_datetime: int
 
 
 @dataclass
@@ -132,12 +147,22 @@ class ServerContext:
         consecutive_timeout_threshold: 連続してタイムアウトすると故障とみなす回数
         overload_timeout_threshold: 超過すると過負荷とみなす応答時間（ミリ秒）
         consecutive_overload_threshold: 連続して応答時間が長いと過負荷とみなす回数
+        overload_window: 指定すると、連続回数の代わりに直近の一定時間の平均（または最大）
+            応答時間が `overload_timeout_threshold` を超えたら過負荷とみなす
+        overload_baseline: 指定すると、`overload_timeout_threshold` の代わりに
+            サーバごとの応答時間の基準を上回ったら長いとみなす
+        on_transition: 状態が変わるたびに新しい状態を受け取る関数
     """
 
     consecutive_timeout_threshold: int
     overload_timeout_threshold: int
     consecutive_overload_threshold: int
     _state: RecordAbstractState = field(default_factory=RecordHealthyState)
+    overload_window: Optional[SlidingWindow] = None
+    overload_baseline: Optional[EwmaBaseline] = None
+    on_transition: Optional[Callable[[RecordAbstractState], None]] = field(
+        default=None, repr=False, compare=False
+    )
 
     def __post_init__(self):
         self._state._context = self
@@ -146,25 +171,60 @@ class ServerContext:
         self._state.consecutive_overload_threshold = self.consecutive_overload_threshold
 
     def push_newer_record(self, record: LogRecord):
+        if not record.is_timed_out:
+            if self.overload_window is not None:
+                self.overload_window.push(record.datetime, record.response_ms)
+            if self.overload_baseline is not None:
+                self.overload_baseline.push(record.response_ms)
         self._state.push_newer_record(record)
 
+    def push_newer_records(self, records: Iterable[LogRecord]):
+        """同じサーバの記録を古い順にまとめて処理する"""
+        if self.overload_window is not None or self.overload_baseline is not None:
+            for record in records:
+                self.push_newer_record(record)
+            return
+        for record in records:
+            self._state.push_newer_record(record)
+
     def transition_to(self, state: RecordAbstractState):
         self._state = state
         self._state._context = self
         self._state.consecutive_timeout_threshold = self.consecutive_timeout_threshold
         self._state.overload_timeout_threshold = self.overload_timeout_threshold
         self._state.consecutive_overload_threshold = self.consecutive_overload_threshold
+        if self.on_transition is not None:
+            self.on_transition(state)
+
+    def is_slow(self, record: LogRecord) -> bool:
+        """応答時間が長いか（基準があれば基準、なければ `overload_timeout_threshold` と比べる）
+
+        タイムアウトした記録は応答時間が分からないので長いとみなす
+        """
+        if record.is_timed_out:
+            return True
+        if self.overload_baseline is not None:
+            return self.overload_baseline.above
+        return record.response_ms > self.overload_timeout_threshold
 
     @property
     def state(self):
         return self._state
 
 
+TransitionCallback = Callable[[IPv4Interface, RecordAbstractState], None]
+
+
 def detect_failure_or_overload_duration(
     log: Iterable[LogRecord],
     consecutive_timeout_threshold: int,
     overload_timeout_threshold: int,
     consecutive_overload_threshold: int,
+    overload_window_seconds: Optional[int] = None,
+    overload_window_aggregate: str = AVERAGE,
+    overload_baseline_deviations: Optional[float] = None,
+    overload_baseline_alpha: float = DEFAULT_ALPHA,
+    on_transition: Optional[TransitionCallback] = None,
 ):
     """読み込まれた監視ログからサーバ状態（健康・故障・復旧）を算出する
 
@@ -172,18 +232,36 @@ def detect_failure_or_overload_duration(
         consecutive_timeout_threshold: 連続してタイムアウトすると故障とみなす回数
         overload_timeout_threshold: 超過すると過負荷とみなす応答時間（ミリ秒）
         consecutive_overload_threshold: 連続して応答時間が長いと過負荷とみなす回数
+        overload_window_seconds: 指定すると、連続回数の代わりに直近この秒数の応答時間で
+            過負荷を判定する（`consecutive_overload_threshold` は使わない）
+        overload_window_aggregate: 直近の応答時間の集計方法（"average" または "max"）
+        overload_baseline_deviations: 指定すると、固定の `overload_timeout_threshold` の
+            代わりに、サーバごとの応答時間の指数移動平均からこの標準偏差の倍数を超えたら
+            長いとみなす
+        overload_baseline_alpha: 指数移動平均での新しい応答時間の重み
+        on_transition: 状態が変わるたびにサーバアドレスと新しい状態を受け取る関数
+            （`sinks.PeriodRecorder` など）
     """
     ip_context_map: dict[IPv4Interface, ServerContext] = {}
-    for record in log:
-        record_failure_context = ip_context_map.setdefault(
-            record.ipv4interface,
-            ServerContext(
-                consecutive_timeout_threshold,
-                overload_timeout_threshold,
-                consecutive_overload_threshold,
-            ),
-        )
-        record_failure_context.push_newer_record(record)
+    for batch in group_by_server(log):
+        for ip, records in batch.items():
+            record_failure_context = ip_context_map.get(ip)
+            if record_failure_context is None:
+                record_failure_context = ip_context_map[ip] = ServerContext(
+                    consecutive_timeout_threshold,
+                    overload_timeout_threshold,
+                    consecutive_overload_threshold,
+                    overload_window=create_sliding_window(
+                        overload_window_seconds, overload_window_aggregate
+                    ),
+                    overload_baseline=create_baseline(
+                        overload_baseline_deviations, overload_baseline_alpha
+                    ),
+                    on_transition=None
+                    if on_transition is None
+                    else partial(on_transition, ip),
+                )
+            record_failure_context.push_newer_records(records)
     return ip_context_map
 
 
@@ -192,6 +270,10 @@ def print_failure_or_overload_duration(
     consecutive_timeout_threshold: int,
     overload_timeout_threshold: int,
     consecutive_overload_threshold: int,
+    overload_window_seconds: Optional[int] = None,
+    overload_window_aggregate: str = AVERAGE,
+    overload_baseline_deviations: Optional[float] = None,
+    overload_baseline_alpha: float = DEFAULT_ALPHA,
 ):
     """読み込まれた監視ログからサーバの故障期間と過負荷になっている期間を出力する
 
@@ -207,19 +289,23 @@ def print_failure_or_overload_duration(
         consecutive_timeout_threshold,
         overload_timeout_threshold,
         consecutive_overload_threshold,
+        overload_window_seconds,
+        overload_window_aggregate,
+        overload_baseline_deviations,
+        overload_baseline_alpha,
     )
     for ip, context in ip_context_map.items():
         if isinstance(context.state, RecordFailedState):
-            print(f"{ip}, {context.state.last_fail_datetime.isoformat()},,,")
+            print(f"{ip}, {format_timestamp(context.state.last_fail_datetime)},,,")
         elif isinstance(context.state, RecordFailRecoveredState):
             print(
-                f"{ip}, {context.state.last_fail_datetime.isoformat()}, {context.state.fail_recovery_datetime.isoformat()},,"
+                f"{ip}, {format_timestamp(context.state.last_fail_datetime)}, {format_timestamp(context.state.fail_recovery_datetime)},,"
             )
         elif isinstance(context.state, RecordOverloadState):
             print(
-                f"{ip},,, {context.state.last_overload_datetime.isoformat()},"
+                f"{ip},,, {format_timestamp(context.state.last_overload_datetime)},"
             )
         elif isinstance(context.state, RecordOverloadRecorveredState):
             print(
-                f"{ip},,, {context.state.last_overload_datetime.isoformat()}, {context.state.overload_recovery_datetime.isoformat()}"
+                f"{ip},,, {format_timestamp(context.state.last_overload_datetime)}, {format_timestamp(context.state.overload_recovery_datetime)}"
             )
@@ -1,10 +1,12 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from collections.abc import Iterable
-from datetime import datetime
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass, field
+from functools import partial
 from ipaddress import IPv4Interface, IPv4Network
-from util import LogRecord
+from typing import Optional
+from subnet_columns import NetworkSummary, ServerColumns
+from util import LogRecord, format_timestamp, group_by_server
 
 
 class RecordAbstractState(ABC):
@@ -20,8 +22,8 @@ class RecordAbstractState(ABC):
 
 @dataclass(kw_only=True)
 class RecordHealthyState(RecordAbstractState):
-    last_timeout_datetime_chain: list[datetime] = field(default_factory=list)
-    last_overload_datetime_chain: list[datetime] = field(default_factory=list)
+    last_timeout_datetime_chain: list[int] = field(default_factory=list)
+    last_overload_datetime_chain: list[int] = field(default_factory=list)
 
     def push_newer_record(self, record: LogRecord):
         if record.is_timed_out:
@@ -53,7 +55,7 @@ class RecordHealthyState(RecordAbstractState):
 
 @dataclass(kw_only=True)
 class RecordFailedState(RecordAbstractState):
-    last_fail_datetime: datetime
+    last_fail_datetime: int
 
     def push_newer_record(self, record: LogRecord):
         if not record.is_timed_out:
@@ -67,15 +69,17 @@ class RecordFailedState(RecordAbstractState):
 
 @dataclass(kw_only=True)
 class RecordFailRecoveredState(RecordHealthyState):
-    last_fail_datetime: datetime
-    fail_recovery_datetime: datetime
+    last_fail_datetime: int
+    fail_recovery_datetime: int
 
 
 @dataclass(kw_only=True)
 class RecordOverloadState(RecordAbstractState):
-    last_overload_datetime: datetime
+    last_overload_datetime: int
 
     def push_newer_record(self, record: LogRecord):
+        if record.is_timed_out:
+            return
         if not record.response_ms > self.overload_timeout_threshold:
             self._context.transition_to(
                 RecordOverloadRecorveredState(
@@ -87,8 +91,8 @@ class RecordOverloadState(RecordAbstractState):
 
 @dataclass(kw_only=True)
 class RecordOverloadRecorveredState(RecordHealthyState):
-    last_overload_datetime: datetime
-    overload_recovery_datetime: datetime
+    last_overload_datetime: int
+    overload_recovery_datetime: int
 
 
 @dataclass
@@ -97,6 +101,9 @@ class RecordFailureContext:
     _overload_timeout_threshold: int
     _consecutive_overload_threshold: int
     _state: RecordAbstractState = field(default_factory=RecordHealthyState)
+    on_transition: Optional[Callable[[RecordAbstractState], None]] = field(
+        default=None, repr=False, compare=False
+    )
 
     def __post_init__(self):
         self._state._context = self
@@ -109,6 +116,11 @@ class RecordFailureContext:
     def push_newer_record(self, record: LogRecord):
         self._state.push_newer_record(record)
 
+    def push_newer_records(self, records: Iterable[LogRecord]):
+        """同じサーバの記録を古い順にまとめて処理する"""
+        for record in records:
+            self._state.push_newer_record(record)
+
     def transition_to(self, state: RecordAbstractState):
         self._state = state
         self._state._context = self
@@ -117,6 +129,8 @@ class RecordFailureContext:
         self._state.consecutive_overload_threshold = (
             self._consecutive_overload_threshold
         )
+        if self.on_transition is not None:
+            self.on_transition(state)
 
     @property
     def state(self):
@@ -131,26 +145,20 @@ class NetworkAbstractState(ABC):
     def push_newer_network_contexts(self, *contexts: RecordFailureContext):
         ...
 
-    @abstractmethod
-    def push_newer_record_contexts(
-        self, ip: IPv4Interface, context: RecordFailureContext
-    ):
-        ...
-
 
 @dataclass(kw_only=True)
 class NetworkHealthyState(NetworkAbstractState):
-    last_timeout_ip_datetime_chain: dict[IPv4Interface, list[datetime]] = field(
+    last_timeout_ip_datetime_chain: dict[IPv4Interface, list[int]] = field(
         default_factory=dict
     )
 
     def push_newer_network_contexts(self, *contexts):
-        most_recent_fail_datetime = datetime.min
         for context in contexts:
             if not isinstance(context.state, RecordFailedState):
                 return
-            if context.state.last_fail_datetime > most_recent_fail_datetime:
-                most_recent_fail_datetime = context.state.last_fail_datetime
+        most_recent_fail_datetime = max(
+            context.state.last_fail_datetime for context in contexts
+        )
         self._context.transition_to(
             NetworkFailedState(last_fail_datetime=most_recent_fail_datetime)
         )
@@ -158,7 +166,7 @@ class NetworkHealthyState(NetworkAbstractState):
 
 @dataclass(kw_only=True)
 class NetworkFailedState(NetworkAbstractState):
-    last_fail_datetime: datetime
+    last_fail_datetime: int
 
     def push_newer_network_contexts(self, *contexts):
         for context in contexts:
@@ -174,8 +182,8 @@ class NetworkFailedState(NetworkAbstractState):
 
 @dataclass(kw_only=True)
 class NetworkFailRecorveredState(NetworkHealthyState):
-    last_fail_datetime: datetime
-    fail_recovered_datetime: datetime
+    last_fail_datetime: int
+    fail_recovered_datetime: int
 
 
 @dataclass
@@ -188,9 +196,6 @@ class NetworkFailureContext:
     def push_newer_network_contexts(self, *contexts):
         self._state.push_newer_network_contexts(*contexts)
 
-    def push_newer_record_context(self, context: RecordFailureContext):
-        self._state.push_newer_record_context(context)
-
     def transition_to(self, state: NetworkAbstractState):
         self._state = state
         self._state._context = self
@@ -201,36 +206,39 @@ class NetworkFailureContext:
 
 
 def group_by_ip_network(ip_interfaces: Iterable[IPv4Interface]):
+    columns = ServerColumns.from_interfaces(ip_interfaces)
     network_interface_map: dict[IPv4Network, set[IPv4Interface]] = {}
-    for ip_interface in ip_interfaces:
-        network = ip_interface.network
-        interfaces = network_interface_map.setdefault(network, set())
-        interfaces.add(ip_interface)
+    for key, rows in columns.groups().items():
+        network_interface_map[columns.network(key)] = {
+            columns.servers[row] for row in rows
+        }
     return network_interface_map
 
 
+TransitionCallback = Callable[[IPv4Interface, RecordAbstractState], None]
+
+
 def calc_failure_or_overload(
     log: Iterable[LogRecord],
     consecutive_timeout_threshold: int,
     overload_timeout_threshold: int,
     consecutive_overload_threshold: int,
+    on_transition: Optional[TransitionCallback] = None,
 ):
     ip_context_map: dict[IPv4Interface, RecordFailureContext] = {}
-    network_context_map: dict[IPv4Network, NetworkFailureContext] = {}
-    for record in log:
-        record_failure_context = ip_context_map.setdefault(
-            record.ipv4interface,
-            RecordFailureContext(
-                consecutive_timeout_threshold,
-                overload_timeout_threshold,
-                consecutive_overload_threshold,
-            ),
-        )
-        record_failure_context.push_newer_record(record)
-        network_failure_context = network_context_map.setdefault(
-            record.ipv4interface.network, NetworkFailureContext()
-        )
-        network_context_map.push_newer_record_context(record_failure_context)
+    for batch in group_by_server(log):
+        for ip, records in batch.items():
+            record_failure_context = ip_context_map.get(ip)
+            if record_failure_context is None:
+                record_failure_context = ip_context_map[ip] = RecordFailureContext(
+                    consecutive_timeout_threshold,
+                    overload_timeout_threshold,
+                    consecutive_overload_threshold,
+                    on_transition=None
+                    if on_transition is None
+                    else partial(on_transition, ip),
+                )
+            record_failure_context.push_newer_records(records)
     return ip_context_map
 
 
@@ -238,34 +246,59 @@ def calc_network_failure_from_record_failure_context(
     interface_context_map: dict[IPv4Interface, RecordFailureContext]
 ):
     network_context_map: dict[IPv4Network, NetworkFailureContext] = {}
-    ip_interfaces = interface_context_map.keys()
-    network_interface_map = group_by_ip_network(ip_interfaces)
-    for network, interfaces in network_interface_map.items():
-        network_interface_contexts: list[RecordFailureContext] = []
-        print(network)
-        for interface in interfaces:
-            context = interface_context_map[interface]
-            network_interface_contexts.append(context)
-            print(context.state)
+    columns = ServerColumns.from_interfaces(interface_context_map.keys())
+    contexts = list(interface_context_map.values())
+    for key, rows in columns.groups().items():
         network_failure_context = network_context_map.setdefault(
-            network, NetworkFailureContext()
+            columns.network(key), NetworkFailureContext()
+        )
+        network_failure_context.push_newer_network_contexts(
+            *[contexts[row] for row in rows]
         )
-        network_failure_context.push_newer_network_contexts(*network_interface_contexts)
     return network_context_map
 
 
+def summarize_networks(
+    interface_context_map: dict[IPv4Interface, RecordFailureContext],
+    worst_ms_map: Optional[dict[IPv4Interface, Optional[int]]] = None,
+) -> list[NetworkSummary]:
+    """サブネットごとのサーバ数・故障中のサーバ数・最長応答時間を求める
+
+    Args:
+        interface_context_map: サーバごとの状態
+        worst_ms_map: サーバごとの最長応答時間（`LatencyHistogram.max_ms` など）
+    """
+    columns = ServerColumns.from_interfaces(interface_context_map.keys())
+    failed = [
+        isinstance(context.state, RecordFailedState)
+        for context in interface_context_map.values()
+    ]
+    worst_ms = None
+    if worst_ms_map is not None:
+        worst_ms = [worst_ms_map.get(ip) for ip in columns.servers]
+    return columns.summarize(failed, worst_ms)
+
+
 def detect_failure_or_overload_duration(
     log: Iterable[LogRecord],
     consecutive_timeout_threshold: int,
     overload_timeout_threshold: int,
     consecutive_overload_threshold: int,
+    on_transition: Optional[TransitionCallback] = None,
 ):
     interface_context_map = calc_failure_or_overload(
         log,
         consecutive_timeout_threshold,
         overload_timeout_threshold,
         consecutive_overload_threshold,
+        on_transition,
     )
+    return calc_state_map_from_record_failure_context(interface_context_map)
+
+
+def calc_state_map_from_record_failure_context(
+    interface_context_map: dict[IPv4Interface, RecordFailureContext]
+):
     network_context_map = calc_network_failure_from_record_failure_context(
         interface_context_map
     )
@@ -292,8 +325,15 @@ def print_failure_or_overload_duration(
     )
     for ip, state in ip_state_map.items():
         if isinstance(state, RecordFailedState):
-            print(f"{ip}, {state.last_fail_datetime.isoformat()},")
+            print(f"{ip}, {format_timestamp(state.last_fail_datetime)},")
         elif isinstance(state, RecordFailRecoveredState):
             print(
-                f"{ip}, {state.last_fail_datetime.isoformat()}, {state.fail_recovery_datetime.isoformat()}"
+                f"{ip}, {format_timestamp(state.last_fail_datetime)}, {format_timestamp(state.fail_recovery_datetime)}"
+            )
+    for network, state in network_state_map.items():
+        if isinstance(state, NetworkFailedState):
+            print(f"{network}, {format_timestamp(state.last_fail_datetime)},")
+        elif isinstance(state, NetworkFailRecorveredState):
+            print(
+                f"{network}, {format_timestamp(state.last_fail_datetime)}, {format_timestamp(state.fail_recovered_datetime)}"
             )
@@ -0,0 +1,88 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Optional
+import math
+
+DEFAULT_ALPHA = 0.05
+DEFAULT_WARMUP = 10
+
+
+@dataclass
+class EwmaBaseline:
+    """サーバごとの応答時間の基準（指数移動平均と分散）
+
+    保持するのは平均・分散・件数だけなので、1台あたりのメモリは定数。
+    基準を `deviations` 標準偏差より上回った応答時間は、その上限に切り詰めて基準に入れる。
+    一時的な過負荷では基準はほとんど動かないが、応答時間の水準が変わったまま続けば
+    基準が追いつき、いつまでも長いとみなし続けることはない
+
+    Attributes:
+        deviations: 平均からこの標準偏差の倍数を超えると長いとみなす
+        alpha: 新しい応答時間の重み（0 より大きく 1 以下）
+        warmup: この件数までは基準を作るだけで、長いとはみなさない
+        min_deviation_ms: 標準偏差の下限（ミリ秒）。応答時間がほぼ一定のサーバで
+            わずかな揺れを長いとみなさないようにする
+        above: 最後に入れた応答時間が基準を上回ったか
+    """
+
+    deviations: float
+    alpha: float = DEFAULT_ALPHA
+    warmup: int = DEFAULT_WARMUP
+    min_deviation_ms: float = 1.0
+    above: bool = False
+    _count: int = field(default=0, repr=False)
+    _mean: float = field(default=0.0, repr=False)
+    _variance: float = field(default=0.0, repr=False)
+
+    def __post_init__(self):
+        if not 0 < self.alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1]: {self.alpha}")
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._mean if self._count else None
+
+    @property
+    def deviation(self) -> Optional[float]:
+        if not self._count:
+            return None
+        return max(math.sqrt(self._variance), self.min_deviation_ms)
+
+    def push(self, response_ms: int):
+        """応答時間を1件入れ、基準を上回ったかを `above` に記録する
+
+        Args:
+            response_ms: 応答時間（ミリ秒）
+        """
+        value = float(response_ms)
+        if self._count and self._count >= self.warmup:
+            limit = self._mean + self.deviations * self.deviation
+            self.above = value > limit
+            if self.above:
+                value = limit
+        if self._count == 0:
+            self._mean = value
+        else:
+            difference = value - self._mean
+            increment = self.alpha * difference
+            self._mean += increment
+            self._variance = (1 - self.alpha) * (
+                self._variance + difference * increment
+            )
+        self._count += 1
+
+
+def create_baseline(
+    deviations: Optional[float], alpha: float = DEFAULT_ALPHA
+) -> Optional[EwmaBaseline]:
+    """基準を作る。deviations が None なら None を返す
+
+    Args:
+        deviations: 平均からこの標準偏差の倍数を超えると長いとみなす
+        alpha: 新しい応答時間の重み
+    """
+    if deviations is None:
+        return None
+    if deviations <= 0:
+        raise ValueError(f"deviations must be positive: {deviations}")
+    return EwmaBaseline(deviations, alpha)
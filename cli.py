@@ -0,0 +1,366 @@
+"""監視ログ解析のコマンドラインツール
+
+使用例::
+
+    $ python -m cli answer2 --consecutive-timeout-threshold 3 samplelog2.csv
+    $ cat samplelog3.csv | python -m cli answer3 -N 3 -t 200 -m 3 --format jsonl -
+    $ python -m cli answer1 --quarantine rejected.tsv merged.csv
+    $ python -m cli answer2 -N 3 --dedup 60 merged.csv
+
+起動を速くするため、各設問のモジュールはサブコマンド実行時に読み込む
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+
+
+def _open_log(args: argparse.Namespace):
+    log = _read_paths(args)
+    if args.dedup is None:
+        return log
+    return _drop_duplicates(args, log)
+
+
+def _drop_duplicates(args: argparse.Namespace, log):
+    from dedup import DuplicateFilter
+
+    duplicates = DuplicateFilter(args.dedup)
+    yield from duplicates.filter(log)
+    print(f"{duplicates.dropped} duplicate records dropped", file=sys.stderr)
+
+
+def _read_paths(args: argparse.Namespace):
+    from itertools import chain
+    from dataset import LogDataset, filter_time_range
+    from prefetch import read_log_prefetched
+    from util import read_log
+
+    since, until = args.since, args.until
+
+    def within(log):
+        if since is None and until is None:
+            return log
+        return filter_time_range(log, since, until)
+
+    if args.quarantine is not None:
+        return _open_log_lenient(args, since, until, within)
+
+    def read(path: str):
+        if path == "-":
+            yield from within(read_log(sys.stdin))
+        elif os.path.isdir(path):
+            yield from LogDataset(path).read(since, until)
+        else:
+            with open(path, "rb") as f:
+                yield from within(read_log_prefetched(f))
+
+    return chain.from_iterable(read(path) for path in args.paths)
+
+
+def _open_log_lenient(args: argparse.Namespace, since, until, within):
+    from dataset import LogDataset
+    from quarantine import LenientLogReader
+
+    def read(reader: LenientLogReader, path: str):
+        if path == "-":
+            yield from within(reader.read(sys.stdin.buffer, path))
+        elif os.path.isdir(path):
+            for log_file in LogDataset(path).files(since, until):
+                with open(log_file.path, "rb") as f:
+                    yield from within(reader.read(f, log_file.path))
+        else:
+            with open(path, "rb") as f:
+                yield from within(reader.read(f, path))
+
+    with open(args.quarantine, "w") as quarantine:
+        reader = LenientLogReader(quarantine)
+        for path in args.paths:
+            yield from read(reader, path)
+    print(f"{reader.summary()}, quarantined to {args.quarantine}", file=sys.stderr)
+
+
+def _open_store(args: argparse.Namespace):
+    """--store があれば故障履歴データベースと、閉じた期間をそこへ書き出す関数を返す"""
+    if args.store is None:
+        return None, None
+    from incident_store import IncidentStore
+    from sinks import PeriodRecorder
+
+    store = IncidentStore(args.store)
+    return store, PeriodRecorder(store.write)
+
+
+def _write_results(args: argparse.Namespace, store, *state_maps: dict):
+    from itertools import chain
+    from sinks import (
+        BinaryResultSink,
+        CsvResultSink,
+        JsonLinesResultSink,
+        iter_failure_periods,
+        sort_failure_periods,
+    )
+
+    periods = chain.from_iterable(iter_failure_periods(m) for m in state_maps)
+    periods = sort_failure_periods(periods, args.sort)
+    if store is not None:
+        # 途中で閉じた期間は検出中に書き込み済み。ここでは最後の状態を書き込む
+        store.write_all(periods)
+        store.close()
+    elif args.format == "binary":
+        sys.stdout.flush()
+        BinaryResultSink(sys.stdout.buffer).write_all(periods)
+        sys.stdout.buffer.flush()
+    elif args.format == "csv":
+        CsvResultSink(sys.stdout).write_all(periods)
+    else:
+        JsonLinesResultSink(sys.stdout).write_all(periods)
+
+
+def _run_answer1(args: argparse.Namespace):
+    from answer1 import detect_failure_duration, print_failure_duration
+
+    log = _open_log(args)
+    if args.format == "text" and args.store is None:
+        print_failure_duration(log)
+        return
+    store, on_transition = _open_store(args)
+    contexts = detect_failure_duration(log, on_transition)
+    _write_results(args, store, {ip: c.state for ip, c in contexts.items()})
+
+
+def _run_answer2(args: argparse.Namespace):
+    from answer2 import detect_failure_duration, print_failure_duration
+
+    log = _open_log(args)
+    if args.format == "text" and args.store is None:
+        print_failure_duration(log, args.consecutive_timeout_threshold)
+        return
+    store, on_transition = _open_store(args)
+    contexts = detect_failure_duration(
+        log, args.consecutive_timeout_threshold, on_transition
+    )
+    _write_results(args, store, {ip: c.state for ip, c in contexts.items()})
+
+
+def _run_answer3(args: argparse.Namespace):
+    from answer3 import (
+        detect_failure_or_overload_duration,
+        print_failure_or_overload_duration,
+    )
+
+    log = _open_log(args)
+    thresholds = (
+        args.consecutive_timeout_threshold,
+        args.overload_timeout_threshold,
+        args.consecutive_overload_threshold,
+        args.overload_window,
+        args.overload_aggregate,
+        args.overload_baseline,
+        args.overload_baseline_alpha,
+    )
+    if args.format == "text" and args.store is None:
+        print_failure_or_overload_duration(log, *thresholds)
+        return
+    store, on_transition = _open_store(args)
+    contexts = detect_failure_or_overload_duration(
+        log, *thresholds, on_transition=on_transition
+    )
+    _write_results(args, store, {ip: c.state for ip, c in contexts.items()})
+
+
+def _run_answer4(args: argparse.Namespace):
+    from answer4 import (
+        detect_failure_or_overload_duration,
+        print_failure_or_overload_duration,
+    )
+
+    log = _open_log(args)
+    thresholds = (
+        args.consecutive_timeout_threshold,
+        args.overload_timeout_threshold,
+        args.consecutive_overload_threshold,
+    )
+    if args.format == "text" and args.store is None:
+        print_failure_or_overload_duration(log, *thresholds)
+        return
+    store, on_transition = _open_store(args)
+    ip_state_map, network_state_map = detect_failure_or_overload_duration(
+        log, *thresholds, on_transition
+    )
+    _write_results(args, store, ip_state_map, network_state_map)
+
+
+def _add_common_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        metavar="PATH",
+        help="監視ログのパス（- で標準入力、ディレクトリなら中のファイルすべて）",
+    )
+    parser.add_argument(
+        "--since",
+        type=_timestamp,
+        metavar="YYYYMMDDhhmmss",
+        help="この時刻以降の記録だけを読む",
+    )
+    parser.add_argument(
+        "--until",
+        type=_timestamp,
+        metavar="YYYYMMDDhhmmss",
+        help="この時刻より前の記録だけを読む",
+    )
+    parser.add_argument(
+        "--quarantine",
+        metavar="FILE",
+        help="不正な行で止まらず、バイト位置と理由を付けて FILE に書き出す",
+    )
+    parser.add_argument(
+        "--dedup",
+        type=_positive_int,
+        metavar="SECONDS",
+        help="直近 SECONDS 秒に同じ確認日時・同じサーバの記録があれば捨てる",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "csv", "jsonl", "binary"],
+        default="text",
+        help="出力形式",
+    )
+    parser.add_argument(
+        "--sort",
+        choices=["server", "time"],
+        help="アドレス順または時刻順に並べ替える（text 以外）",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="DATABASE",
+        help="出力する代わりに SQLite の故障履歴データベースへ保存する",
+    )
+
+
+def _add_timeout_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "-N",
+        "--consecutive-timeout-threshold",
+        type=int,
+        required=True,
+        help="連続してタイムアウトすると故障とみなす回数",
+    )
+
+
+def _add_overload_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "-t",
+        "--overload-timeout-threshold",
+        type=int,
+        required=True,
+        help="超過すると過負荷とみなす応答時間（ミリ秒）",
+    )
+    parser.add_argument(
+        "-m",
+        "--consecutive-overload-threshold",
+        type=int,
+        required=True,
+        help="連続して応答時間が長いと過負荷とみなす回数",
+    )
+
+
+def _timestamp(value: str) -> int:
+    from util import parse_timestamp
+
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid timestamp: {value}")
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive: {value}")
+    return number
+
+
+def _add_overload_window_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--overload-window",
+        type=_positive_int,
+        metavar="SECONDS",
+        help="連続回数の代わりに直近 SECONDS 秒の応答時間で過負荷を判定する",
+    )
+    parser.add_argument(
+        "--overload-aggregate",
+        choices=["average", "max"],
+        default="average",
+        help="--overload-window の集計方法",
+    )
+
+
+def _positive_float(value: str) -> float:
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be positive: {value}")
+    return number
+
+
+def _unit_interval(value: str) -> float:
+    number = float(value)
+    if not 0 < number <= 1:
+        raise argparse.ArgumentTypeError(f"must be in (0, 1]: {value}")
+    return number
+
+
+def _add_overload_baseline_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--overload-baseline",
+        type=_positive_float,
+        metavar="DEVIATIONS",
+        help="-t の代わりに、サーバごとの応答時間の指数移動平均から標準偏差の DEVIATIONS 倍を超えたら長いとみなす",
+    )
+    parser.add_argument(
+        "--overload-baseline-alpha",
+        type=_unit_interval,
+        default=0.05,
+        metavar="ALPHA",
+        help="--overload-baseline の指数移動平均での新しい応答時間の重み（0 より大きく 1 以下）",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m cli", description="監視ログ解析")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    answer1 = subparsers.add_parser("answer1", help="設問1: 故障期間")
+    _add_common_arguments(answer1)
+    answer1.set_defaults(run=_run_answer1)
+
+    answer2 = subparsers.add_parser("answer2", help="設問2: N回連続タイムアウトでの故障期間")
+    _add_timeout_argument(answer2)
+    _add_common_arguments(answer2)
+    answer2.set_defaults(run=_run_answer2)
+
+    answer3 = subparsers.add_parser("answer3", help="設問3: 故障期間と過負荷期間")
+    _add_timeout_argument(answer3)
+    _add_overload_arguments(answer3)
+    _add_overload_window_arguments(answer3)
+    _add_overload_baseline_arguments(answer3)
+    _add_common_arguments(answer3)
+    answer3.set_defaults(run=_run_answer3)
+
+    answer4 = subparsers.add_parser("answer4", help="設問4: サブネットの故障期間")
+    _add_timeout_argument(answer4)
+    _add_overload_arguments(answer4)
+    _add_common_arguments(answer4)
+    answer4.set_defaults(run=_run_answer4)
+
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
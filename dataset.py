@@ -0,0 +1,161 @@
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from typing import Optional
+from prefetch import read_log_prefetched
+from util import LogRecord, parse_timestamp
+import os
+import re
+
+_DAY = 24 * 60 * 60
+_HOUR = 60 * 60
+_TAIL_SIZE = 4096
+
+_DATE_IN_NAME = re.compile(r"(?<!\d)(\d{4})-?(\d{2})-?(\d{2})(?:[T_-]?(\d{2}))?(?!\d)")
+
+
+@dataclass
+class LogFile:
+    """監視ログファイルとその記録の時間範囲
+
+    Attributes:
+        path: パス
+        start: 範囲の開始（UNIX時間・秒）
+        end: 範囲の終了（UNIX時間・秒。この時刻は含まない）
+    """
+
+    path: str
+    start: int
+    end: int
+
+    def overlaps(self, since: Optional[int], until: Optional[int]) -> bool:
+        return (since is None or since < self.end) and (
+            until is None or self.start < until
+        )
+
+
+def span_from_name(name: str) -> Optional[tuple[int, int]]:
+    """ファイル名の日付（YYYYMMDD、YYYY-MM-DD）と時（HH）から時間範囲を求める
+
+    日付だけなら1日分、時もあれば1時間分とみなす。読み取れなければ None
+
+    Args:
+        name: ファイル名
+    """
+    match = _DATE_IN_NAME.search(name)
+    if match is None:
+        return None
+    year, month, day, hour = match.groups()
+    try:
+        start = parse_timestamp(f"{year}{month}{day}{hour or '00'}0000")
+    except ValueError:
+        return None
+    return start, start + (_DAY if hour is None else _HOUR)
+
+
+def _parse_line_timestamp(line: bytes) -> int:
+    return parse_timestamp(line.split(b",", 1)[0].decode("ascii"))
+
+
+def span_from_content(path: str) -> Optional[tuple[int, int]]:
+    """ファイルの最初と最後の行から時間範囲を求める。記録がないか、
+    先頭または末尾の行が監視ログの形式でなければ（README など）None
+
+    全体は読まず、先頭の1行と末尾の `_TAIL_SIZE` バイトだけを読む
+
+    Args:
+        path: 監視ログのパス
+    """
+    with open(path, "rb") as f:
+        first = f.readline().strip()
+        if not first:
+            return None
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - _TAIL_SIZE, 0))
+        last = f.read().rstrip().rsplit(b"\n", 1)[-1]
+    try:
+        return _parse_line_timestamp(first), _parse_line_timestamp(last) + 1
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def filter_time_range(
+    log: Iterable[LogRecord], since: Optional[int], until: Optional[int]
+) -> Iterator[LogRecord]:
+    """[since, until) の記録だけを返す
+
+    Args:
+        log: 読み込まれた監視ログ
+        since: 範囲の開始（UNIX時間・秒）。None なら制限しない
+        until: 範囲の終了（UNIX時間・秒）。None なら制限しない
+    """
+    for record in log:
+        if (since is None or since <= record.datetime) and (
+            until is None or record.datetime < until
+        ):
+            yield record
+
+
+@dataclass
+class LogDataset:
+    """ディレクトリ以下の日付・時刻ごとの監視ログファイルをまとめて読む
+
+    各ファイルの時間範囲は、ファイル名に日付があればそこから、
+    なければ最初と最後の行から求め、範囲外のファイルは開かない。
+    ファイル同士の時間範囲は重ならないものとする
+
+    Attributes:
+        directory: 監視ログを置いたディレクトリ（サブディレクトリも探す）
+        pattern: 監視ログとみなすファイル名のパターン
+    """
+
+    directory: str
+    pattern: str = "*"
+
+    def _paths(self) -> Iterator[str]:
+        for root, directories, names in os.walk(self.directory):
+            directories[:] = sorted(d for d in directories if not d.startswith("."))
+            for name in sorted(names):
+                if not name.startswith(".") and fnmatch(name, self.pattern):
+                    yield os.path.join(root, name)
+
+    def files(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> list[LogFile]:
+        """[since, until) と重なるファイルを開始時刻順に返す
+
+        Args:
+            since: 範囲の開始（UNIX時間・秒）。None なら制限しない
+            until: 範囲の終了（UNIX時間・秒）。None なら制限しない
+        """
+        files = []
+        for path in self._paths():
+            span = span_from_name(os.path.basename(path))
+            if span is None:
+                span = span_from_content(path)
+            if span is None:
+                continue
+            log_file = LogFile(path, *span)
+            if log_file.overlaps(since, until):
+                files.append(log_file)
+        return sorted(files, key=lambda log_file: (log_file.start, log_file.path))
+
+    def read(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[LogRecord]:
+        """[since, until) の記録を古いファイルから順に読み込む
+
+        Args:
+            since: 範囲の開始（UNIX時間・秒）。None なら制限しない
+            until: 範囲の終了（UNIX時間・秒）。None なら制限しない
+        """
+        for log_file in self.files(since, until):
+            with open(log_file.path, "rb") as f:
+                log = read_log_prefetched(f)
+                if (since is None or since <= log_file.start) and (
+                    until is None or log_file.end <= until
+                ):
+                    yield from log
+                else:
+                    yield from filter_time_range(log, since, until)
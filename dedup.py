@@ -0,0 +1,74 @@
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from ipaddress import IPv4Interface
+from typing import Optional
+from util import LogRecord
+
+DEFAULT_WINDOW = 60
+DEFAULT_MAX_KEYS = 1 << 16
+
+
+@dataclass
+class DuplicateFilter:
+    """同じ確認日時・同じサーバの記録を2件目以降捨てる
+
+    見た (確認日時, サーバ) を新旧2つの集合に入れ、新しい集合が `window` 秒分
+    または `max_keys` 件になったら古い集合を捨てて入れ替える。
+    保持するのは多くても `2 * max_keys` 件なので、メモリは一定。
+    重複を見逃すのは入れ替えで古い集合から消えたときだけで、
+    重複でない記録を捨てることはない
+
+    Attributes:
+        window: 重複を探す時間の幅（秒）
+        max_keys: 1つの集合に入れる数の上限
+        dropped: 捨てた記録の数
+    """
+
+    window: int = DEFAULT_WINDOW
+    max_keys: int = DEFAULT_MAX_KEYS
+    dropped: int = 0
+    _current: set[tuple[int, IPv4Interface]] = field(default_factory=set, repr=False)
+    _previous: set[tuple[int, IPv4Interface]] = field(default_factory=set, repr=False)
+    _rotate_datetime: Optional[int] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.window <= 0:
+            raise ValueError(f"window must be positive: {self.window}")
+        if self.max_keys <= 0:
+            raise ValueError(f"max_keys must be positive: {self.max_keys}")
+
+    def _rotate(self, datetime: int):
+        self._previous = self._current
+        self._current = set()
+        self._rotate_datetime = datetime + self.window
+
+    def is_duplicate(self, record: LogRecord) -> bool:
+        """記録が直近に見たものと重複しているか。重複していなければ見たものとして覚える
+
+        Args:
+            record: 記録
+        """
+        key = (record.datetime, record.ipv4interface)
+        if key in self._current or key in self._previous:
+            self.dropped += 1
+            return True
+        if (
+            self._rotate_datetime is None
+            or record.datetime >= self._rotate_datetime
+            or len(self._current) >= self.max_keys
+        ):
+            self._rotate(record.datetime)
+        self._current.add(key)
+        return False
+
+    def filter(self, log: Iterable[LogRecord]) -> Iterator[LogRecord]:
+        """重複した記録を除いた監視ログを返す
+
+        Args:
+            log: 読み込まれた監視ログ
+        """
+        is_duplicate = self.is_duplicate
+        for record in log:
+            if not is_duplicate(record):
+                yield record
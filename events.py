@@ -0,0 +1,178 @@
+from __future__ import annotations
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from ipaddress import IPv4Interface
+from threading import Event, Lock, Thread
+from typing import Optional
+from pipeline import FailureOrOverloadDetector
+from sinks import Address
+from subnet_columns import ServerColumns
+from util import LogRecord
+import answer3
+
+FAIL = "fail"
+FAIL_RECOVERY = "fail_recovery"
+OVERLOAD = "overload"
+OVERLOAD_RECOVERY = "overload_recovery"
+
+DEFAULT_WINDOW = 1.0
+DEFAULT_MIN_MEMBERS = 2
+
+
+@dataclass
+class StateEvent:
+    """故障・復旧・過負荷の発生
+
+    Attributes:
+        kind: "fail"、"fail_recovery"、"overload"、"overload_recovery" のいずれか
+        address: サーバアドレス。まとめたものはサブネット
+        datetime: 発生時刻（UNIX時間・秒）。まとめたものは最も早い時刻
+        servers: まとめたサーバ（まとめていなければ空）
+    """
+
+    kind: str
+    address: Address
+    datetime: int
+    servers: tuple[IPv4Interface, ...] = ()
+
+
+def coalesce_events(
+    events: Iterable[StateEvent], min_members: int = DEFAULT_MIN_MEMBERS
+) -> list[StateEvent]:
+    """同じサブネットのサーバの同じ種類の発生を、サブネットの発生1件にまとめる
+
+    サブネットの分け方は設問4と同じ。まとめたものは、そのサブネットで最初に
+    発生した位置に置く
+
+    Args:
+        events: 発生した順の出来事
+        min_members: この数以上の異なるサーバで起きたらまとめる
+    """
+    events = list(events)
+    rows = [i for i, event in enumerate(events) if type(event.address) is IPv4Interface]
+    columns = ServerColumns.from_interfaces(events[i].address for i in rows)
+    groups: dict[tuple[str, int], list[int]] = {}
+    for i, key in zip(rows, columns.network_keys):
+        groups.setdefault((events[i].kind, key), []).append(i)
+    first_of: dict[int, tuple[int, list[int]]] = {}
+    for (_, key), members in groups.items():
+        servers = {events[i].address for i in members}
+        if len(servers) >= min_members:
+            for i in members:
+                first_of[i] = (key, members)
+    coalesced = []
+    for i, event in enumerate(events):
+        group = first_of.get(i)
+        if group is None:
+            coalesced.append(event)
+            continue
+        key, members = group
+        if i != members[0]:
+            continue
+        coalesced.append(
+            StateEvent(
+                event.kind,
+                columns.network(key),
+                min(events[member].datetime for member in members),
+                tuple(dict.fromkeys(events[member].address for member in members)),
+            )
+        )
+    return coalesced
+
+
+class CoalescingEventSink:
+    """出来事を溜め、`window` 秒ごとに別スレッドでまとめて渡す
+
+    `emit` は溜めるだけなので、受け取る側が遅くても監視ログの処理は止まらない。
+    受け取る側で例外が起きたら以降は渡さず、`close` で送出する
+
+    Attributes:
+        consumer: まとめた出来事のリストを受け取る関数
+        window: 溜める秒数
+        min_members: この数以上の異なるサーバで起きたらサブネットの出来事にまとめる
+        batches: 渡した回数
+    """
+
+    def __init__(
+        self,
+        consumer: Callable[[list[StateEvent]], None],
+        window: float = DEFAULT_WINDOW,
+        min_members: int = DEFAULT_MIN_MEMBERS,
+    ):
+        self.consumer = consumer
+        self.window = window
+        self.min_members = min_members
+        self.batches = 0
+        self._pending: list[StateEvent] = []
+        self._lock = Lock()
+        self._closed = Event()
+        self._error: Optional[BaseException] = None
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def emit(self, event: StateEvent):
+        with self._lock:
+            self._pending.append(event)
+
+    def _run(self):
+        while not self._closed.wait(self.window):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        with self._lock:
+            events, self._pending = self._pending, []
+        if not events or self._error is not None:
+            return
+        try:
+            self.consumer(coalesce_events(events, self.min_members))
+            self.batches += 1
+        except BaseException as e:
+            self._error = e
+
+    def close(self):
+        """溜まっている出来事を渡してスレッドを止める"""
+        self._closed.set()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> CoalescingEventSink:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _state_event(ip: IPv4Interface, state: object) -> Optional[StateEvent]:
+    if isinstance(state, answer3.RecordFailedState):
+        return StateEvent(FAIL, ip, state.last_fail_datetime)
+    if isinstance(state, answer3.RecordFailRecoveredState):
+        return StateEvent(FAIL_RECOVERY, ip, state.fail_recovery_datetime)
+    if isinstance(state, answer3.RecordOverloadState):
+        return StateEvent(OVERLOAD, ip, state.last_overload_datetime)
+    if isinstance(state, answer3.RecordOverloadRecorveredState):
+        return StateEvent(OVERLOAD_RECOVERY, ip, state.overload_recovery_datetime)
+    return None
+
+
+@dataclass
+class EventDetector(FailureOrOverloadDetector):
+    """状態が変わったら出来事を `sink` に渡す設問3の検出器
+
+    Attributes:
+        sink: 出来事の渡し先。None なら渡さない
+    """
+
+    sink: Optional[CoalescingEventSink] = field(default=None, repr=False)
+
+    def push_newer_record(self, record: LogRecord):
+        context = self._ip_context_map.get(record.ipv4interface)
+        before = None if context is None else context.state
+        super().push_newer_record(record)
+        after = self._ip_context_map[record.ipv4interface].state
+        if after is before or self.sink is None:
+            return
+        event = _state_event(record.ipv4interface, after)
+        if event is not None:
+            self.sink.emit(event)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from ipaddress import IPv4Interface
+from typing import Optional
+from pipeline import FailureOrOverloadDetector
+from sinks import FailurePeriod, iter_failure_periods
+from util import LogRecord
+import answer3
+
+DEFAULT_MAX_EVICTED_PERIODS = 1024
+
+EvictionCallback = Callable[[IPv4Interface, answer3.RecordAbstractState], None]
+
+
+def is_evictable(state: answer3.RecordAbstractState) -> bool:
+    """捨ててもよい状態か
+
+    故障・過負荷の状態や、連続タイムアウト・連続過負荷を数えている途中の状態は捨てない
+
+    Args:
+        state: サーバ状態
+    """
+    return (
+        isinstance(state, answer3.RecordHealthyState)
+        and not state.last_timeout_datetime_chain
+        and not state.last_overload_datetime_chain
+    )
+
+
+@dataclass
+class EvictingFailureOrOverloadDetector(FailureOrOverloadDetector):
+    """しばらく見ていない健康なサーバを捨てる設問3の検出器
+
+    長時間動かし続けても、保持するサーバ数が稼働中のサーバ数程度に収まる。
+    故障・過負荷中のサーバは捨てない。
+    復旧済みのサーバを捨てるときは、`on_evict` がなければその故障期間・過負荷期間を
+    新しいものから `max_evicted_periods` 件だけ `evicted_periods` に残す。
+    全件が必要なら `on_evict` で書き出す
+
+    Attributes:
+        ttl: 最後の記録からこの秒数が過ぎた健康なサーバを捨てる
+        capacity: 保持するサーバ数の上限。超えると最後の記録が古い健康なサーバから捨てる
+        on_evict: 捨てるサーバのアドレスと最後の状態を受け取る関数
+        evicted_count: 捨てたサーバの数
+        max_evicted_periods: `evicted_periods` に残す件数の上限
+        evicted_periods: 捨てたサーバの直近の故障期間・過負荷期間（`on_evict` がないとき）
+        evicted_period_count: `evicted_periods` に入れた故障期間・過負荷期間の総数
+            （上限を超えて押し出したものも数える）
+    """
+
+    ttl: Optional[int] = None
+    capacity: Optional[int] = None
+    on_evict: Optional[EvictionCallback] = None
+    evicted_count: int = 0
+    max_evicted_periods: int = DEFAULT_MAX_EVICTED_PERIODS
+    evicted_periods: deque[FailurePeriod] = field(init=False)
+    evicted_period_count: int = 0
+    _pinned_ips: set[IPv4Interface] = field(default_factory=set)
+    _last_seen_map: OrderedDict[IPv4Interface, int] = field(default_factory=OrderedDict)
+    _next_sweep_datetime: Optional[int] = None
+
+    def __post_init__(self):
+        self.evicted_periods = deque(maxlen=self.max_evicted_periods)
+
+    def push_newer_record(self, record: LogRecord):
+        super().push_newer_record(record)
+        # 状態が変わるのは記録を受け取ったサーバだけなので、捨てられないサーバをここで数えておく
+        if is_evictable(self._ip_context_map[record.ipv4interface].state):
+            self._pinned_ips.discard(record.ipv4interface)
+        else:
+            self._pinned_ips.add(record.ipv4interface)
+        self._last_seen_map[record.ipv4interface] = record.datetime
+        self._last_seen_map.move_to_end(record.ipv4interface)
+        if self.capacity is not None and len(self._last_seen_map) > self.capacity:
+            self._evict_over_capacity()
+        if self.ttl is not None:
+            if self._next_sweep_datetime is None:
+                self._next_sweep_datetime = record.datetime + self.ttl
+            elif record.datetime >= self._next_sweep_datetime:
+                self._evict_idle(record.datetime)
+                self._next_sweep_datetime = record.datetime + self.ttl
+
+    def _evict(self, ip: IPv4Interface) -> bool:
+        context = self._ip_context_map[ip]
+        if not is_evictable(context.state):
+            self._last_seen_map.move_to_end(ip)
+            return False
+        del self._ip_context_map[ip]
+        del self._last_seen_map[ip]
+        self.evicted_count += 1
+        if self.on_evict is not None:
+            self.on_evict(ip, context.state)
+        else:
+            for period in iter_failure_periods({ip: context.state}):
+                self.evicted_periods.append(period)
+                self.evicted_period_count += 1
+        return True
+
+    def _evict_over_capacity(self):
+        # 捨てられるサーバがなければ走査しない
+        while len(self._last_seen_map) > max(self.capacity, len(self._pinned_ips)):
+            self._evict(next(iter(self._last_seen_map)))
+
+    def _evict_idle(self, now: int):
+        expired_ips = []
+        for ip, last_seen in self._last_seen_map.items():
+            if now - last_seen <= self.ttl:
+                break
+            expired_ips.append(ip)
+        for ip in expired_ips:
+            self._evict(ip)
@@ -1,11 +1,10 @@
-from util import read_log
+from util import read_log, parse_timestamp
 from answer1 import (
     detect_failure_duration,
     print_failure_duration,
     ServerContext,
     RecordFailedState,
 )
-from datetime import datetime
 from io import StringIO
 from ipaddress import IPv4Interface
 
@@ -17,6 +16,6 @@ server_context_map = detect_failure_duration(log)
 
 assert server_context_map == {
     IPv4Interface("10.20.30.1/16"): ServerContext(
-        RecordFailedState(last_fail_datetime=datetime(2020, 10, 19, 13, 33, 24))
+        RecordFailedState(last_fail_datetime=parse_timestamp("20201019133324"))
     )
 }
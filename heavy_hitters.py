@@ -0,0 +1,142 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from heapq import heapify, heappop, heappush
+from itertools import count
+from typing import Hashable
+from pipeline import Detector
+from util import LogRecord
+
+
+@dataclass
+class HeavyHitter:
+    """上位のキーと推定値
+
+    真の値は `count - error` 以上 `count` 以下にある
+
+    Attributes:
+        key: キー
+        count: 推定値（上限）
+        error: 推定誤差の上限
+    """
+
+    key: Hashable
+    count: int
+    error: int
+
+    @property
+    def guaranteed_count(self) -> int:
+        return self.count - self.error
+
+
+@dataclass
+class SpaceSaving:
+    """Space-Saving アルゴリズムによる重み付きの上位キー推定
+
+    保持するカウンタは `capacity` 個までで、キーの種類数によらずメモリは一定。
+    監視されていないキーの真の値は `max_error` 以下である
+
+    Attributes:
+        capacity: 保持するカウンタの数
+        total: 加算した重みの合計
+    """
+
+    capacity: int
+    total: int = 0
+    _counters: dict[Hashable, list[int]] = field(default_factory=dict, repr=False)
+    _heap: list[tuple[int, int, Hashable]] = field(default_factory=list, repr=False)
+    _sequence: count = field(default_factory=count, repr=False)
+
+    def __post_init__(self):
+        if self.capacity < 1:
+            raise ValueError("capacity must be positive")
+
+    def add(self, key: Hashable, weight: int = 1):
+        """キーに重みを加算する
+
+        Args:
+            key: キー
+            weight: 重み（正の整数）
+        """
+        if weight <= 0:
+            return
+        self.total += weight
+        counter = self._counters.get(key)
+        if counter is None:
+            if len(self._counters) < self.capacity:
+                counter = self._counters[key] = [0, 0]
+            else:
+                min_count, min_key = self._pop_min()
+                del self._counters[min_key]
+                counter = self._counters[key] = [min_count, min_count]
+        counter[0] += weight
+        heappush(self._heap, (counter[0], next(self._sequence), key))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def _pop_min(self) -> tuple[int, Hashable]:
+        while True:
+            heap_count, _, key = heappop(self._heap)
+            counter = self._counters.get(key)
+            if counter is not None and counter[0] == heap_count:
+                return heap_count, key
+
+    def _rebuild_heap(self):
+        self._heap = [
+            (counter[0], next(self._sequence), key)
+            for key, counter in self._counters.items()
+        ]
+        heapify(self._heap)
+
+    @property
+    def max_error(self) -> int:
+        """監視されていないキーの真の値の上限"""
+        if len(self._counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self._counters.values())
+
+    def top(self, k: int) -> list[HeavyHitter]:
+        """推定値の大きい順に k 件返す
+
+        Args:
+            k: 件数
+        """
+        ranked = sorted(
+            self._counters.items(), key=lambda item: item[1][0], reverse=True
+        )
+        return [
+            HeavyHitter(key=key, count=counter[0], error=counter[1])
+            for key, counter in ranked[:k]
+        ]
+
+
+@dataclass
+class TopOffendersDetector(Detector):
+    """タイムアウト回数と過負荷時間の上位サーバを固定メモリで推定する検出器
+
+    過負荷時間は応答時間が `overload_timeout_threshold` を超えた分（ミリ秒）の合計
+
+    Attributes:
+        overload_timeout_threshold: 超過すると過負荷とみなす応答時間（ミリ秒）
+        capacity: 指標ごとに保持するサーバの数
+    """
+
+    overload_timeout_threshold: int
+    capacity: int = 1024
+    timeout: SpaceSaving = field(init=False)
+    overload_ms: SpaceSaving = field(init=False)
+
+    def __post_init__(self):
+        self.timeout = SpaceSaving(self.capacity)
+        self.overload_ms = SpaceSaving(self.capacity)
+
+    def push_newer_record(self, record: LogRecord):
+        if record.is_timed_out:
+            self.timeout.add(record.ipv4interface)
+        elif record.response_ms > self.overload_timeout_threshold:
+            self.overload_ms.add(
+                record.ipv4interface,
+                record.response_ms - self.overload_timeout_threshold,
+            )
+
+    def result(self) -> tuple[SpaceSaving, SpaceSaving]:
+        return self.timeout, self.overload_ms
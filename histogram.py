@@ -0,0 +1,171 @@
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass, field
+from ipaddress import IPv4Interface
+from typing import Optional
+from pipeline import Detector
+from util import LogRecord
+
+
+@dataclass
+class LatencyHistogram:
+    """応答時間の対数バケットヒストグラム（HDR Histogram 方式）
+
+    2の冪ごとの区間を `2 ** (significant_bits - 1)` 個のバケットに等分するので、
+    相対誤差は `2 ** -(significant_bits - 1)` 以下に収まり、
+    メモリは記録した件数によらず一定になる
+
+    Attributes:
+        significant_bits: 各区間の精度（ビット数）
+        highest_trackable_ms: 記録できる最大の応答時間（ミリ秒）。超えた値はこの値として数える
+        count: タイムアウト以外の記録件数
+        timeout_count: タイムアウトの件数
+        total_ms: 応答時間の合計
+        min_ms: 最小の応答時間
+        max_ms: 最大の応答時間
+    """
+
+    significant_bits: int = 5
+    highest_trackable_ms: int = 2**20
+    count: int = 0
+    timeout_count: int = 0
+    total_ms: int = 0
+    min_ms: Optional[int] = None
+    max_ms: Optional[int] = None
+    _counts: array = field(init=False, repr=False)
+
+    def __post_init__(self):
+        bucket_count = self._bucket_index(self.highest_trackable_ms) + 1
+        self._counts = array("Q", bytes(8 * bucket_count))
+
+    @property
+    def _half_sub_bucket_count(self):
+        return 1 << (self.significant_bits - 1)
+
+    def _bucket_index(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self.significant_bits)
+        return self._half_sub_bucket_count * shift + (value >> shift)
+
+    def _highest_equivalent_value(self, index: int) -> int:
+        shift = max(0, index // self._half_sub_bucket_count - 1)
+        lowest = (index - self._half_sub_bucket_count * shift) << shift
+        return lowest + (1 << shift) - 1
+
+    def record(self, response_ms: Optional[int]):
+        """応答時間を1件記録する
+
+        Args:
+            response_ms: 応答時間（ミリ秒）。None はタイムアウト
+        """
+        if response_ms is None:
+            self.timeout_count += 1
+            return
+        value = min(response_ms, self.highest_trackable_ms)
+        self._counts[self._bucket_index(value)] += 1
+        self.count += 1
+        self.total_ms += response_ms
+        if self.min_ms is None or response_ms < self.min_ms:
+            self.min_ms = response_ms
+        if self.max_ms is None or response_ms > self.max_ms:
+            self.max_ms = response_ms
+
+    def push_newer_record(self, record: LogRecord):
+        self.record(record.response_ms)
+
+    def merge(self, other: LatencyHistogram):
+        """別のシャードやファイルで作ったヒストグラムを足し合わせる
+
+        Args:
+            other: 同じ設定のヒストグラム
+        """
+        if (self.significant_bits, self.highest_trackable_ms) != (
+            other.significant_bits,
+            other.highest_trackable_ms,
+        ):
+            raise ValueError("cannot merge histograms with different settings")
+        for index, count in enumerate(other._counts):
+            if count:
+                self._counts[index] += count
+        self.count += other.count
+        self.timeout_count += other.timeout_count
+        self.total_ms += other.total_ms
+        if other.min_ms is not None and (
+            self.min_ms is None or other.min_ms < self.min_ms
+        ):
+            self.min_ms = other.min_ms
+        if other.max_ms is not None and (
+            self.max_ms is None or other.max_ms > self.max_ms
+        ):
+            self.max_ms = other.max_ms
+
+    @property
+    def mean_ms(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        return self.total_ms / self.count
+
+    def value_at_percentile(self, percentile: float) -> Optional[int]:
+        """パーセンタイル値を返す（タイムアウトは含めない）
+
+        Args:
+            percentile: 0 から 100 までのパーセンタイル
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, -(-self.count * percentile // 100))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest_equivalent_value(index), self.max_ms)
+        return self.max_ms
+
+
+LatencyHistogramMap = dict[IPv4Interface, LatencyHistogram]
+
+
+@dataclass
+class LatencyHistogramDetector(Detector):
+    """サーバごとの応答時間ヒストグラムを作る検出器
+
+    `pipeline.Pipeline` に登録すると故障検出と同じ走査で更新される
+
+    Attributes:
+        significant_bits: 各区間の精度（ビット数）
+        highest_trackable_ms: 記録できる最大の応答時間（ミリ秒）
+    """
+
+    significant_bits: int = 5
+    highest_trackable_ms: int = 2**20
+    _ip_histogram_map: LatencyHistogramMap = field(default_factory=dict)
+
+    def push_newer_record(self, record: LogRecord):
+        histogram = self._ip_histogram_map.get(record.ipv4interface)
+        if histogram is None:
+            histogram = LatencyHistogram(
+                self.significant_bits, self.highest_trackable_ms
+            )
+            self._ip_histogram_map[record.ipv4interface] = histogram
+        histogram.record(record.response_ms)
+
+    def result(self) -> LatencyHistogramMap:
+        return self._ip_histogram_map
+
+
+def merge_latency_histogram_maps(*maps: LatencyHistogramMap) -> LatencyHistogramMap:
+    """シャードごとのヒストグラムをサーバ単位で足し合わせる
+
+    Args:
+        maps: `LatencyHistogramDetector` の結果
+    """
+    merged: LatencyHistogramMap = {}
+    for histogram_map in maps:
+        for ip, histogram in histogram_map.items():
+            target = merged.get(ip)
+            if target is None:
+                target = LatencyHistogram(
+                    histogram.significant_bits, histogram.highest_trackable_ms
+                )
+                merged[ip] = target
+            target.merge(histogram)
+    return merged
@@ -0,0 +1,285 @@
+from __future__ import annotations
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import lru_cache
+from ipaddress import IPv4Interface, IPv4Network
+from sqlite3 import Connection, connect
+from typing import Optional, Union
+from sinks import FailurePeriod
+
+DEFAULT_BATCH_SIZE = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS networks (
+    id INTEGER PRIMARY KEY,
+    network TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS servers (
+    id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE,
+    network_id INTEGER NOT NULL REFERENCES networks (id)
+);
+CREATE TABLE IF NOT EXISTS failure_periods (
+    server_id INTEGER NOT NULL REFERENCES servers (id),
+    started_at INTEGER NOT NULL,
+    recovered_at INTEGER,
+    PRIMARY KEY (server_id, started_at)
+);
+CREATE TABLE IF NOT EXISTS overload_periods (
+    server_id INTEGER NOT NULL REFERENCES servers (id),
+    started_at INTEGER NOT NULL,
+    recovered_at INTEGER,
+    PRIMARY KEY (server_id, started_at)
+);
+CREATE TABLE IF NOT EXISTS network_failure_periods (
+    network_id INTEGER NOT NULL REFERENCES networks (id),
+    started_at INTEGER NOT NULL,
+    recovered_at INTEGER,
+    PRIMARY KEY (network_id, started_at)
+);
+CREATE INDEX IF NOT EXISTS failure_periods_start ON failure_periods (started_at);
+CREATE INDEX IF NOT EXISTS overload_periods_start ON overload_periods (started_at);
+CREATE INDEX IF NOT EXISTS network_failure_periods_start
+    ON network_failure_periods (started_at);
+"""
+
+_INSERT_NETWORK = "INSERT OR IGNORE INTO networks (network) VALUES (?)"
+_SELECT_NETWORK_ID = "SELECT id FROM networks WHERE network = ?"
+_INSERT_SERVER = "INSERT OR IGNORE INTO servers (address, network_id) VALUES (?, ?)"
+_SELECT_SERVER_ID = "SELECT id FROM servers WHERE address = ?"
+_UPSERT_PERIOD = """
+INSERT INTO {table} ({key}, started_at, recovered_at) VALUES (?, ?, ?)
+ON CONFLICT ({key}, started_at) DO UPDATE SET recovered_at = excluded.recovered_at
+WHERE excluded.recovered_at IS NOT NULL
+"""
+_UPSERT_FAILURE = _UPSERT_PERIOD.format(table="failure_periods", key="server_id")
+_UPSERT_OVERLOAD = _UPSERT_PERIOD.format(table="overload_periods", key="server_id")
+_UPSERT_NETWORK_FAILURE = _UPSERT_PERIOD.format(
+    table="network_failure_periods", key="network_id"
+)
+_SERVER_PERIODS = dict(
+    address="s.address",
+    join="servers AS s ON s.id = p.server_id",
+    key="p.server_id",
+    lookup="SELECT id FROM servers WHERE address = :address",
+)
+_NETWORK_PERIODS = dict(
+    address="n.network",
+    join="networks AS n ON n.id = p.network_id",
+    key="p.network_id",
+    lookup="SELECT id FROM networks WHERE network = :address",
+)
+
+
+@lru_cache(maxsize=None)
+def _select_periods(
+    table: str, by_address: bool, since: bool, until: bool, *, server: bool
+) -> str:
+    """条件ごとに別の SQL を作り、主キー (id, started_at) の範囲検索が使われるようにする
+
+    `:address IS NULL OR ...` のような条件は索引を使えなくするので書かない
+    """
+    columns = _SERVER_PERIODS if server else _NETWORK_PERIODS
+    conditions = []
+    if by_address:
+        conditions.append(f"{columns['key']} = ({columns['lookup']})")
+    if until:
+        conditions.append("p.started_at < :until")
+    if since:
+        conditions.append("(p.recovered_at IS NULL OR p.recovered_at > :since)")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+SELECT {columns['address']}, p.started_at, p.recovered_at FROM {table} AS p
+JOIN {columns['join']}
+{where}
+ORDER BY p.started_at
+"""
+
+
+@dataclass
+class IncidentPeriod:
+    """保存された故障期間または過負荷期間
+
+    Attributes:
+        address: サーバアドレスまたはサブネット
+        start: 開始時刻（UNIX時間・秒）
+        end: 復旧時刻（UNIX時間・秒）。復旧していなければ None
+    """
+
+    address: Union[IPv4Interface, IPv4Network]
+    start: int
+    end: Optional[int]
+
+
+class IncidentStore:
+    """故障期間・過負荷期間を SQLite に保存する
+
+    `sinks.ResultSink` と同じく `write` / `write_all` / `flush` で書き込む。
+    書き込みは `batch_size` 件ごとに1トランザクションの `executemany` でまとめて行う。
+    同じ開始時刻の期間を再度書き込むと、復旧時刻が分かっていれば更新する
+
+    検出中に閉じた期間も残すには、`sinks.PeriodRecorder(store.write)` を
+    各設問の検出関数の `on_transition` に渡す（コマンドラインの --store はそうしている）
+    """
+
+    def __init__(
+        self,
+        database: Union[str, Connection] = ":memory:",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self.connection = (
+            database if isinstance(database, Connection) else connect(database)
+        )
+        self.batch_size = batch_size
+        self._server_ids: dict[IPv4Interface, int] = {}
+        self._network_ids: dict[IPv4Network, int] = {}
+        self._failures: list[tuple[IPv4Interface, int, Optional[int]]] = []
+        self._overloads: list[tuple[IPv4Interface, int, Optional[int]]] = []
+        self._network_failures: list[tuple[IPv4Network, int, Optional[int]]] = []
+        self._pending = 0
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def _network_id(self, network: IPv4Network) -> int:
+        network_id = self._network_ids.get(network)
+        if network_id is None:
+            self.connection.execute(_INSERT_NETWORK, (str(network),))
+            (network_id,) = self.connection.execute(
+                _SELECT_NETWORK_ID, (str(network),)
+            ).fetchone()
+            self._network_ids[network] = network_id
+        return network_id
+
+    def _server_id(self, server: IPv4Interface) -> int:
+        server_id = self._server_ids.get(server)
+        if server_id is None:
+            network_id = self._network_id(server.network)
+            self.connection.execute(_INSERT_SERVER, (str(server), network_id))
+            (server_id,) = self.connection.execute(
+                _SELECT_SERVER_ID, (str(server),)
+            ).fetchone()
+            self._server_ids[server] = server_id
+        return server_id
+
+    def write(self, period: FailurePeriod):
+        if isinstance(period.address, IPv4Network):
+            if period.fail is not None:
+                self._network_failures.append(
+                    (period.address, period.fail, period.fail_recovery)
+                )
+                self._pending += 1
+        else:
+            if period.fail is not None:
+                self._failures.append(
+                    (period.address, period.fail, period.fail_recovery)
+                )
+                self._pending += 1
+            if period.overload is not None:
+                self._overloads.append(
+                    (period.address, period.overload, period.overload_recovery)
+                )
+                self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def write_all(self, periods: Iterable[FailurePeriod]):
+        for period in periods:
+            self.write(period)
+        self.flush()
+
+    def flush(self):
+        if self._pending == 0:
+            return
+        with self.connection:
+            self.connection.executemany(
+                _UPSERT_FAILURE,
+                [(self._server_id(a), s, e) for a, s, e in self._failures],
+            )
+            self.connection.executemany(
+                _UPSERT_OVERLOAD,
+                [(self._server_id(a), s, e) for a, s, e in self._overloads],
+            )
+            self.connection.executemany(
+                _UPSERT_NETWORK_FAILURE,
+                [(self._network_id(a), s, e) for a, s, e in self._network_failures],
+            )
+        self._failures = []
+        self._overloads = []
+        self._network_failures = []
+        self._pending = 0
+
+    def _select(
+        self,
+        table: str,
+        server: bool,
+        address,
+        since: Optional[int],
+        until: Optional[int],
+    ) -> list[IncidentPeriod]:
+        self.flush()
+        query = _select_periods(
+            table,
+            address is not None,
+            since is not None,
+            until is not None,
+            server=server,
+        )
+        parse = IPv4Interface if server else IPv4Network
+        rows = self.connection.execute(
+            query,
+            {
+                "address": None if address is None else str(address),
+                "since": since,
+                "until": until,
+            },
+        )
+        return [IncidentPeriod(parse(a), start, end) for a, start, end in rows]
+
+    def failure_periods(
+        self,
+        server: Optional[IPv4Interface] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> list[IncidentPeriod]:
+        """[since, until) と重なるサーバの故障期間を開始時刻順に返す
+
+        Args:
+            server: サーバアドレス。None なら全サーバ
+            since: 範囲の開始（UNIX時間・秒）
+            until: 範囲の終了（UNIX時間・秒）
+        """
+        return self._select("failure_periods", True, server, since, until)
+
+    def overload_periods(
+        self,
+        server: Optional[IPv4Interface] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> list[IncidentPeriod]:
+        """[since, until) と重なるサーバの過負荷期間を開始時刻順に返す
+
+        Args:
+            server: サーバアドレス。None なら全サーバ
+            since: 範囲の開始（UNIX時間・秒）
+            until: 範囲の終了（UNIX時間・秒）
+        """
+        return self._select("overload_periods", True, server, since, until)
+
+    def network_failure_periods(
+        self,
+        network: Optional[IPv4Network] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> list[IncidentPeriod]:
+        """[since, until) と重なるサブネットの故障期間を開始時刻順に返す
+
+        Args:
+            network: サブネット。None なら全サブネット
+            since: 範囲の開始（UNIX時間・秒）
+            until: 範囲の終了（UNIX時間・秒）
+        """
+        return self._select("network_failure_periods", False, network, since, until)
+
+    def close(self):
+        self.flush()
+        self.connection.close()
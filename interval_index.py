@@ -0,0 +1,164 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from ipaddress import IPv4Interface, IPv4Network
+from sys import maxsize
+from typing import Optional, Union
+from incident_store import IncidentStore
+from sinks import FailurePeriod
+
+Address = Union[IPv4Interface, IPv4Network]
+
+HEALTHY = "healthy"
+FAILED = "failed"
+OVERLOADED = "overloaded"
+
+_OPEN = maxsize
+
+
+@dataclass
+class IntervalIndex:
+    """重ならない期間の列を開始時刻順に持ち、二分探索で引く
+
+    1台のサーバの故障期間（または過負荷期間）は互いに重ならないので、
+    開始時刻順に並べれば終了時刻も同じ順に並ぶ。`add` は重なりを切り詰めてこれを保つ
+
+    Attributes:
+        starts: 開始時刻（昇順）
+        ends: 終了時刻（昇順。復旧していない期間は `sys.maxsize`）
+    """
+
+    starts: list[int] = field(default_factory=list)
+    ends: list[int] = field(default_factory=list)
+
+    def add(self, start: int, end: Optional[int]):
+        """期間を追加する。開始時刻が同じ期間があれば終了時刻を更新する
+
+        復旧していないまま残った期間の後に新しい期間が始まった場合のように、
+        期間が重なるときは前の期間を後の期間の開始時刻で終わらせる
+
+        Args:
+            start: 開始時刻
+            end: 終了時刻。復旧していなければ None
+        """
+        end = _OPEN if end is None else end
+        i = bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start:
+            self.ends[i] = end
+        else:
+            self.starts.insert(i, start)
+            self.ends.insert(i, end)
+        if i > 0 and self.ends[i - 1] > start:
+            self.ends[i - 1] = start
+        if i + 1 < len(self.starts) and self.ends[i] > self.starts[i + 1]:
+            self.ends[i] = self.starts[i + 1]
+
+    def find(self, t: int) -> Optional[tuple[int, Optional[int]]]:
+        """時刻 t を含む期間を返す
+
+        Args:
+            t: 時刻
+        """
+        i = bisect_right(self.starts, t) - 1
+        if i >= 0 and t < self.ends[i]:
+            return self.starts[i], _to_optional(self.ends[i])
+        return None
+
+    def overlapping(self, since: int, until: int) -> list[tuple[int, Optional[int]]]:
+        """[since, until) と重なる期間を返す
+
+        Args:
+            since: 範囲の開始
+            until: 範囲の終了
+        """
+        first = bisect_right(self.ends, since)
+        last = bisect_left(self.starts, until)
+        return [
+            (self.starts[i], _to_optional(self.ends[i])) for i in range(first, last)
+        ]
+
+
+def _to_optional(end: int) -> Optional[int]:
+    return None if end == _OPEN else end
+
+
+@dataclass
+class StateIndex:
+    """サーバ・サブネットごとの故障期間と過負荷期間から、ある時刻の状態を引く
+
+    期間が閉じるたびに `add_period` で追加していける。検出中に閉じた期間も含めるには
+    `sinks.PeriodRecorder(index.add_period)` を検出関数の `on_transition` に渡す
+    """
+
+    _failures: dict[Address, IntervalIndex] = field(default_factory=dict)
+    _overloads: dict[Address, IntervalIndex] = field(default_factory=dict)
+
+    def add_failure(self, address: Address, start: int, end: Optional[int]):
+        self._failures.setdefault(address, IntervalIndex()).add(start, end)
+
+    def add_overload(self, address: Address, start: int, end: Optional[int]):
+        self._overloads.setdefault(address, IntervalIndex()).add(start, end)
+
+    def add_period(self, period: FailurePeriod):
+        if period.fail is not None:
+            self.add_failure(period.address, period.fail, period.fail_recovery)
+        if period.overload is not None:
+            self.add_overload(period.address, period.overload, period.overload_recovery)
+
+    def add_periods(self, periods: Iterable[FailurePeriod]):
+        for period in periods:
+            self.add_period(period)
+
+    @staticmethod
+    def from_store(store: IncidentStore) -> StateIndex:
+        """故障履歴データベースから作る
+
+        Args:
+            store: 故障履歴データベース
+        """
+        index = StateIndex()
+        for failures in (store.failure_periods(), store.network_failure_periods()):
+            for period in failures:
+                index.add_failure(period.address, period.start, period.end)
+        for period in store.overload_periods():
+            index.add_overload(period.address, period.start, period.end)
+        return index
+
+    def state_at(self, address: Address, t: int) -> str:
+        """時刻 t の状態（"healthy"、"failed"、"overloaded"）を返す
+
+        Args:
+            address: サーバアドレスまたはサブネット
+            t: 時刻（UNIX時間・秒）
+        """
+        failures = self._failures.get(address)
+        if failures is not None and failures.find(t) is not None:
+            return FAILED
+        overloads = self._overloads.get(address)
+        if overloads is not None and overloads.find(t) is not None:
+            return OVERLOADED
+        return HEALTHY
+
+    def periods_between(
+        self, address: Address, since: int, until: int
+    ) -> list[tuple[str, int, Optional[int]]]:
+        """[since, until) と重なる故障期間・過負荷期間を開始時刻順に返す
+
+        Args:
+            address: サーバアドレスまたはサブネット
+            since: 範囲の開始（UNIX時間・秒）
+            until: 範囲の終了（UNIX時間・秒）
+        """
+        periods = []
+        for state, index_map in (
+            (FAILED, self._failures),
+            (OVERLOADED, self._overloads),
+        ):
+            index = index_map.get(address)
+            if index is not None:
+                periods.extend(
+                    (state, start, end)
+                    for start, end in index.overlapping(since, until)
+                )
+        return sorted(periods, key=lambda period: period[1])
@@ -0,0 +1,230 @@
+from __future__ import annotations
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ipaddress import IPv4Interface
+from threading import Thread
+from typing import Optional
+from pipeline import FailureOrOverloadDetector
+from util import LogRecord
+import answer3
+import answer4
+import time
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+STATE_NAMES = {
+    answer3.RecordHealthyState: "healthy",
+    answer3.RecordFailedState: "failed",
+    answer3.RecordFailRecoveredState: "recovered",
+    answer3.RecordOverloadState: "overload",
+    answer3.RecordOverloadRecorveredState: "overload_recovered",
+    answer4.RecordHealthyState: "healthy",
+    answer4.RecordFailedState: "failed",
+    answer4.RecordFailRecoveredState: "recovered",
+    answer4.RecordOverloadState: "overload",
+    answer4.RecordOverloadRecorveredState: "overload_recovered",
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    """ラベルの値の組ごとに数値を持つ指標
+
+    更新は辞書への代入だけで、ロックは取らない。
+    読み出す側（別スレッド）は辞書をまとめて複製してから文字列にする
+    """
+
+    type_name = ""
+    suffix = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {} if labelnames else {(): 0}
+        self._function: Optional[Callable[[], float]] = None
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> list[tuple[tuple[str, ...], float]]:
+        if self._function is not None:
+            return [((), self._function())]
+        while True:
+            try:
+                return list(self._values.items())
+            except RuntimeError:
+                # 複製中に記録側がラベルを追加した。もう一度複製する
+                continue
+
+    def expose(self) -> list[str]:
+        lines = [
+            f"# TYPE {self.name} {self.type_name}",
+            f"# HELP {self.name} {self.help}",
+        ]
+        for labels, value in self._samples():
+            if labels:
+                pairs = ",".join(
+                    f'{name}="{_escape(label)}"'
+                    for name, label in zip(self.labelnames, labels)
+                )
+                lines.append(f"{self.name}{self.suffix}{{{pairs}}} {value}")
+            else:
+                lines.append(f"{self.name}{self.suffix} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    """増えるだけの指標"""
+
+    type_name = "counter"
+    suffix = "_total"
+
+    def inc(self, amount: float = 1, *labels: str):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """増減する指標"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, amount: float = 1, *labels: str):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_function(self, function: Callable[[], float]):
+        """読み出すたびに呼ぶ関数を設定する（キューの長さなど）
+
+        Args:
+            function: 現在の値を返す関数
+        """
+        self._function = function
+
+
+@dataclass
+class MetricsRegistry:
+    """指標をまとめ、OpenMetrics のテキスト形式で書き出す"""
+
+    _metrics: dict[str, _Metric] = field(default_factory=dict)
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name!r} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def metric(self, name: str) -> _Metric:
+        return self._metrics[name]
+
+    def exposition(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.expose())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(
+    registry: MetricsRegistry, port: int = 0, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """指標を `GET /metrics` で返す HTTP サーバを別スレッドで起動する
+
+    止めるときは返り値の `shutdown` と `server_close` を呼ぶ
+
+    Args:
+        registry: 公開する指標
+        port: 待ち受けるポート。0 なら空いているポート（`server_address` で分かる）
+        host: 待ち受けるアドレス
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.exposition().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@dataclass
+class InstrumentedFailureOrOverloadDetector(FailureOrOverloadDetector):
+    """処理件数や状態ごとのサーバ数を指標に記録する設問3の検出器
+
+    状態が変わるのは記録を受け取ったサーバだけなので、1件ごとの更新は定数時間
+
+    Attributes:
+        registry: 指標の登録先
+        clock: 現在時刻（UNIX時間・秒）を返す関数。監視ログの遅れの計算に使う
+        utc_offset: 監視ログの確認日時の UTC からのずれ（秒）。
+            確認日時はタイムゾーンを持たず UTC として変換されるので、
+            日本時間で書かれた監視ログなら 9 * 3600 を渡す
+    """
+
+    registry: MetricsRegistry = field(default_factory=MetricsRegistry)
+    clock: Callable[[], float] = time.time
+    utc_offset: int = 0
+
+    def __post_init__(self):
+        self._records = self.registry.counter(
+            "monitor_records", "Processed log records."
+        )
+        self._lag = self.registry.gauge(
+            "monitor_parse_lag_seconds",
+            "Seconds between now and the latest processed record.",
+        )
+        self._servers = self.registry.gauge(
+            "monitor_servers", "Servers by current state.", ("state",)
+        )
+        self._failed = self.registry.gauge(
+            "monitor_network_failed_servers",
+            "Currently failed servers by network.",
+            ("network",),
+        )
+        self._transitions = self.registry.counter(
+            "monitor_state_transitions", "State transitions by new state.", ("state",)
+        )
+
+    def push_newer_record(self, record: LogRecord):
+        ip: IPv4Interface = record.ipv4interface
+        context = self._ip_context_map.get(ip)
+        before = None if context is None else type(context.state)
+        super().push_newer_record(record)
+        after = type(self._ip_context_map[ip].state)
+        self._records.inc()
+        self._lag.set(self.clock() - (record.datetime - self.utc_offset))
+        if before is after:
+            return
+        state = STATE_NAMES.get(after, after.__name__)
+        self._servers.inc(1, state)
+        self._transitions.inc(1, state)
+        if before is not None:
+            self._servers.inc(-1, STATE_NAMES.get(before, before.__name__))
+        if after is answer3.RecordFailedState:
+            self._failed.inc(1, str(ip.network))
+        elif before is answer3.RecordFailedState:
+            self._failed.inc(-1, str(ip.network))
@@ -0,0 +1,179 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from functools import partial
+from ipaddress import IPv4Interface
+from typing import Any, Optional
+from baseline import DEFAULT_ALPHA, create_baseline
+from sliding_window import AVERAGE, create_sliding_window
+from util import LogRecord
+import answer2
+import answer3
+import answer4
+
+
+class Detector(ABC):
+    """監視ログを1行ずつ受け取る検出器"""
+
+    @abstractmethod
+    def push_newer_record(self, record: LogRecord):
+        ...
+
+    @abstractmethod
+    def result(self) -> Any:
+        ...
+
+
+def _bind(on_transition: Optional[Callable], ip: IPv4Interface) -> Optional[Callable]:
+    return None if on_transition is None else partial(on_transition, ip)
+
+
+@dataclass
+class FailureDetector(Detector):
+    """設問2の故障検出器
+
+    結果は `answer2.detect_failure_duration` と同じ
+
+    Attributes:
+        consecutive_timeout_threshold: 連続してタイムアウトすると故障とみなす回数
+        on_transition: 状態が変わるたびにサーバアドレスと新しい状態を受け取る関数
+    """
+
+    consecutive_timeout_threshold: int
+    on_transition: Optional[answer2.TransitionCallback] = field(
+        default=None, repr=False, compare=False
+    )
+    _ip_context_map: answer2.ServerContextMap = field(default_factory=dict)
+
+    def push_newer_record(self, record: LogRecord):
+        context = self._ip_context_map.get(record.ipv4interface)
+        if context is None:
+            context = answer2.ServerContext(
+                self.consecutive_timeout_threshold,
+                on_transition=_bind(self.on_transition, record.ipv4interface),
+            )
+            self._ip_context_map[record.ipv4interface] = context
+        context.push_newer_record(record)
+
+    def result(self) -> answer2.ServerContextMap:
+        return self._ip_context_map
+
+
+@dataclass
+class FailureOrOverloadDetector(Detector):
+    """設問3の故障・過負荷検出器
+
+    結果は `answer3.detect_failure_or_overload_duration` と同じ
+
+    Attributes:
+        consecutive_timeout_threshold: 連続してタイムアウトすると故障とみなす回数
+        overload_timeout_threshold: 超過すると過負荷とみなす応答時間（ミリ秒）
+        consecutive_overload_threshold: 連続して応答時間が長いと過負荷とみなす回数
+        overload_window_seconds: 指定すると直近この秒数の応答時間で過負荷を判定する
+        overload_window_aggregate: 直近の応答時間の集計方法（"average" または "max"）
+        overload_baseline_deviations: 指定するとサーバごとの応答時間の基準から
+            この標準偏差の倍数を超えたら長いとみなす
+        overload_baseline_alpha: 基準の指数移動平均での新しい応答時間の重み
+        on_transition: 状態が変わるたびにサーバアドレスと新しい状態を受け取る関数
+    """
+
+    consecutive_timeout_threshold: int
+    overload_timeout_threshold: int
+    consecutive_overload_threshold: int
+    overload_window_seconds: Optional[int] = None
+    overload_window_aggregate: str = AVERAGE
+    overload_baseline_deviations: Optional[float] = None
+    overload_baseline_alpha: float = DEFAULT_ALPHA
+    on_transition: Optional[answer3.TransitionCallback] = field(
+        default=None, repr=False, compare=False
+    )
+    _ip_context_map: dict[IPv4Interface, answer3.ServerContext] = field(
+        default_factory=dict
+    )
+
+    def push_newer_record(self, record: LogRecord):
+        context = self._ip_context_map.get(record.ipv4interface)
+        if context is None:
+            context = answer3.ServerContext(
+                self.consecutive_timeout_threshold,
+                self.overload_timeout_threshold,
+                self.consecutive_overload_threshold,
+                overload_window=create_sliding_window(
+                    self.overload_window_seconds, self.overload_window_aggregate
+                ),
+                overload_baseline=create_baseline(
+                    self.overload_baseline_deviations, self.overload_baseline_alpha
+                ),
+                on_transition=_bind(self.on_transition, record.ipv4interface),
+            )
+            self._ip_context_map[record.ipv4interface] = context
+        context.push_newer_record(record)
+
+    def result(self) -> dict[IPv4Interface, answer3.ServerContext]:
+        return self._ip_context_map
+
+
+@dataclass
+class NetworkFailureDetector(Detector):
+    """設問4のサブネット故障検出器
+
+    結果は `answer4.detect_failure_or_overload_duration` と同じ
+
+    Attributes:
+        consecutive_timeout_threshold: 連続してタイムアウトすると故障とみなす回数
+        overload_timeout_threshold: 超過すると過負荷とみなす応答時間（ミリ秒）
+        consecutive_overload_threshold: 連続して応答時間が長いと過負荷とみなす回数
+    """
+
+    consecutive_timeout_threshold: int
+    overload_timeout_threshold: int
+    consecutive_overload_threshold: int
+    _ip_context_map: dict[IPv4Interface, answer4.RecordFailureContext] = field(
+        default_factory=dict
+    )
+
+    def push_newer_record(self, record: LogRecord):
+        context = self._ip_context_map.get(record.ipv4interface)
+        if context is None:
+            context = answer4.RecordFailureContext(
+                self.consecutive_timeout_threshold,
+                self.overload_timeout_threshold,
+                self.consecutive_overload_threshold,
+            )
+            self._ip_context_map[record.ipv4interface] = context
+        context.push_newer_record(record)
+
+    def result(self):
+        return answer4.calc_state_map_from_record_failure_context(self._ip_context_map)
+
+
+@dataclass
+class Pipeline:
+    """監視ログを1回だけ走査し、登録された全検出器に各行を渡す
+
+    Attributes:
+        detectors: 検出器名と検出器の対応
+    """
+
+    detectors: dict[str, Detector] = field(default_factory=dict)
+
+    def register(self, name: str, detector: Detector) -> Pipeline:
+        if name in self.detectors:
+            raise ValueError(f"detector {name!r} is already registered")
+        self.detectors[name] = detector
+        return self
+
+    def run(self, log: Iterable[LogRecord]) -> dict[str, Any]:
+        """監視ログを走査し、検出器名ごとの結果を返す
+
+        Args:
+            log: 読み込まれた監視ログ
+        """
+        push_newer_records = [
+            detector.push_newer_record for detector in self.detectors.values()
+        ]
+        for record in log:
+            for push_newer_record in push_newer_records:
+                push_newer_record(record)
+        return {name: detector.result() for name, detector in self.detectors.items()}
@@ -0,0 +1,100 @@
+from __future__ import annotations
+from codecs import getincrementaldecoder
+from collections.abc import Iterable, Iterator
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import BinaryIO, Union
+from util import LogRecord, read_log
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+DEFAULT_MAX_BUFFERS = 4
+
+_END = b""
+
+
+def _read_ahead(
+    f: BinaryIO,
+    buffer_size: int,
+    queue: Queue[Union[bytes, BaseException]],
+    stop: Event,
+):
+    def put(item: Union[bytes, BaseException]):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    try:
+        while not stop.is_set():
+            buffer = f.read(buffer_size)
+            put(buffer)
+            if buffer == _END:
+                return
+    except BaseException as e:
+        put(e)
+
+
+def iter_lines_prefetched(
+    f: BinaryIO,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    max_buffers: int = DEFAULT_MAX_BUFFERS,
+    encoding: str = "utf-8",
+) -> Iterator[str]:
+    """別スレッドで先読みしながらファイルを1行ずつ返す
+
+    読み込みは `buffer_size` バイトずつ行い、先読みするのは `max_buffers` 個までなので、
+    メモリは `buffer_size * max_buffers` 程度に収まる
+
+    Args:
+        f: バイナリモードで開いた監視ログ
+        buffer_size: 1回に読み込むバイト数
+        max_buffers: 先読みしておくバッファの数
+        encoding: 文字コード
+    """
+    queue: Queue[Union[bytes, BaseException]] = Queue(maxsize=max_buffers)
+    stop = Event()
+    thread = Thread(target=_read_ahead, args=(f, buffer_size, queue, stop), daemon=True)
+    thread.start()
+    decoder = getincrementaldecoder(encoding)()
+    remainder = ""
+    try:
+        while True:
+            buffer = queue.get()
+            if isinstance(buffer, BaseException):
+                raise buffer
+            text = remainder + decoder.decode(buffer, final=buffer == _END)
+            lines = text.split("\n")
+            remainder = lines.pop()
+            for line in lines:
+                yield line + "\n"
+            if buffer == _END:
+                break
+        if remainder:
+            yield remainder
+    finally:
+        stop.set()
+        try:
+            while True:
+                queue.get_nowait()
+        except Empty:
+            pass
+        thread.join()
+
+
+def read_log_prefetched(
+    f: BinaryIO,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    max_buffers: int = DEFAULT_MAX_BUFFERS,
+) -> Iterable[LogRecord]:
+    """別スレッドで先読みしながら監視ログを読み込む
+
+    結果は `util.read_log` と同じ
+
+    Args:
+        f: バイナリモードで開いた監視ログ
+        buffer_size: 1回に読み込むバイト数
+        max_buffers: 先読みしておくバッファの数
+    """
+    return read_log(iter_lines_prefetched(f, buffer_size, max_buffers))
@@ -0,0 +1,201 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from ipaddress import IPv4Interface
+from typing import Optional
+from pipeline import Detector
+from util import LogRecord
+
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def _write_varint(data: bytearray, value: int):
+    # ジグザグ符号化してから7ビットずつ書く
+    value = value << 1 if value >= 0 else (~value << 1) | 1
+    while value >= 0x80:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _read_varint(data: bytearray, position: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1 if not value & 1 else ~(value >> 1)), position
+
+
+@dataclass
+class _Block:
+    """同じサーバの連続した記録を圧縮したもの
+
+    時刻は前回の間隔との差（delta-of-delta）、応答時間は前回との差を可変長整数で持つ。
+    応答時間の値の最下位ビットがタイムアウトの印で、タイムアウトなら差は書かない。
+    間隔が一定で応答時間の変化が小さければ1件2〜3バイトになる
+    """
+
+    start: int
+    end: int = 0
+    count: int = 0
+    data: bytearray = field(default_factory=bytearray)
+    _last_timestamp: int = 0
+    _last_delta: int = 0
+    _last_response_ms: int = 0
+
+    def __post_init__(self):
+        self._last_timestamp = self.start
+
+    def append(self, timestamp: int, response_ms: Optional[int]):
+        delta = timestamp - self._last_timestamp
+        _write_varint(self.data, delta - self._last_delta)
+        if response_ms is None:
+            _write_varint(self.data, 1)
+        else:
+            _write_varint(self.data, (response_ms - self._last_response_ms) << 1)
+            self._last_response_ms = response_ms
+        self._last_timestamp = timestamp
+        self._last_delta = delta
+        self.end = timestamp
+        self.count += 1
+
+    def __iter__(self) -> Iterator[tuple[int, Optional[int]]]:
+        data = self.data
+        position = 0
+        timestamp = self.start
+        delta = 0
+        response_ms = 0
+        for _ in range(self.count):
+            delta_of_delta, position = _read_varint(data, position)
+            delta += delta_of_delta
+            timestamp += delta
+            value, position = _read_varint(data, position)
+            if value & 1:
+                yield timestamp, None
+            else:
+                response_ms += value >> 1
+                yield timestamp, response_ms
+
+
+@dataclass
+class ProbeSeries:
+    """1台のサーバの記録を追記順に圧縮して持つ
+
+    `block_size` 件ごとに区切り、区切りの開始時刻で範囲を二分探索する
+
+    Attributes:
+        block_size: 1区切りの記録数
+    """
+
+    block_size: int = DEFAULT_BLOCK_SIZE
+    _blocks: list[_Block] = field(default_factory=list)
+    _starts: list[int] = field(default_factory=list)
+
+    def append(self, timestamp: int, response_ms: Optional[int]):
+        if not self._blocks or self._blocks[-1].count >= self.block_size:
+            self._blocks.append(_Block(timestamp))
+            self._starts.append(timestamp)
+        self._blocks[-1].append(timestamp, response_ms)
+
+    def drop_before(self, timestamp: int):
+        """最後の記録が timestamp より前の区切りを捨てる"""
+        i = 0
+        while i < len(self._blocks) - 1 and self._blocks[i].end < timestamp:
+            i += 1
+        del self._blocks[:i]
+        del self._starts[:i]
+
+    def between(
+        self, since: Optional[int] = None, until: Optional[int] = None
+    ) -> Iterator[tuple[int, Optional[int]]]:
+        """[since, until) の (時刻, 応答時間) を古い順に返す。必要な区切りだけを展開する
+
+        Args:
+            since: 範囲の開始（UNIX時間・秒）。None なら制限しない
+            until: 範囲の終了（UNIX時間・秒）。None なら制限しない
+        """
+        first = 0 if since is None else max(bisect_right(self._starts, since) - 1, 0)
+        last = len(self._blocks) if until is None else bisect_left(self._starts, until)
+        for block in self._blocks[first:last]:
+            if since is not None and block.end < since:
+                continue
+            for timestamp, response_ms in block:
+                if since is not None and timestamp < since:
+                    continue
+                if until is not None and timestamp >= until:
+                    return
+                yield timestamp, response_ms
+
+    def __len__(self) -> int:
+        return sum(block.count for block in self._blocks)
+
+    @property
+    def nbytes(self) -> int:
+        """圧縮した記録のバイト数"""
+        return sum(len(block.data) for block in self._blocks)
+
+
+@dataclass
+class ProbeHistory(Detector):
+    """サーバごとの生の記録を圧縮して保持する
+
+    `ServerContext` を動かす検出器と同じ `Pipeline` に登録して使う
+
+    Attributes:
+        retention: 最新の記録からこの秒数より古い記録を区切り単位で捨てる。None なら捨てない
+        block_size: 1区切りの記録数
+    """
+
+    retention: Optional[int] = None
+    block_size: int = DEFAULT_BLOCK_SIZE
+    _series_map: dict[IPv4Interface, ProbeSeries] = field(default_factory=dict)
+    _next_sweep_datetime: Optional[int] = None
+
+    def push_newer_record(self, record: LogRecord):
+        series = self._series_map.get(record.ipv4interface)
+        if series is None:
+            series = self._series_map[record.ipv4interface] = ProbeSeries(
+                self.block_size
+            )
+        series.append(record.datetime, record.response_ms)
+        if self.retention is None:
+            return
+        if self._next_sweep_datetime is None:
+            self._next_sweep_datetime = record.datetime + self.retention
+        elif record.datetime >= self._next_sweep_datetime:
+            for server_series in self._series_map.values():
+                server_series.drop_before(record.datetime - self.retention)
+            self._next_sweep_datetime = record.datetime + self.retention
+
+    def records(
+        self,
+        server: IPv4Interface,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> Iterator[LogRecord]:
+        """サーバの [since, until) の記録を古い順に返す
+
+        Args:
+            server: サーバアドレス
+            since: 範囲の開始（UNIX時間・秒）。None なら制限しない
+            until: 範囲の終了（UNIX時間・秒）。None なら制限しない
+        """
+        series = self._series_map.get(server)
+        if series is None:
+            return
+        for timestamp, response_ms in series.between(since, until):
+            yield LogRecord(timestamp, server, response_ms)
+
+    @property
+    def nbytes(self) -> int:
+        """圧縮した記録の合計バイト数"""
+        return sum(series.nbytes for series in self._series_map.values())
+
+    def result(self) -> dict[IPv4Interface, ProbeSeries]:
+        return self._series_map
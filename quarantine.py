@@ -0,0 +1,118 @@
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+from csv import reader as csv_reader
+from dataclasses import dataclass, field
+from functools import lru_cache
+from ipaddress import IPv4Interface
+from typing import Optional, TextIO
+from util import LogRecord, TimeoutResponse, parse_timestamp
+
+_ADDRESS_CHARACTERS = frozenset("0123456789./")
+
+
+@lru_cache(maxsize=4096)
+def _parse_interface(s: str) -> IPv4Interface:
+    return IPv4Interface(s)
+
+
+def _parse_response_ms(s: str) -> Optional[int]:
+    if s == TimeoutResponse:
+        return None
+    return int(s)
+
+
+def _split(line: str) -> list[str]:
+    if '"' in line:
+        # 引用符があるときだけ read_log と同じ csv で分ける
+        return next(csv_reader([line]), [])
+    return line.split(",")
+
+
+def _check(fields: list[str]) -> tuple[Optional[LogRecord], str]:
+    """1行を変換する。変換できなければ (None, 理由) を返す"""
+    if len(fields) < 3:
+        return None, "field_count"
+    timestamp, address, response_ms = fields[0], fields[1], fields[2]
+    try:
+        datetime = parse_timestamp(timestamp)
+    except ValueError:
+        return None, "datetime"
+    if not address or not _ADDRESS_CHARACTERS.issuperset(address):
+        return None, "ipv4interface"
+    try:
+        ipv4interface = _parse_interface(address)
+    except ValueError:
+        return None, "ipv4interface"
+    if response_ms.isascii() and response_ms.isdigit():
+        return LogRecord(datetime, ipv4interface, int(response_ms)), ""
+    try:
+        return LogRecord(datetime, ipv4interface, _parse_response_ms(response_ms)), ""
+    except ValueError:
+        return None, "response_ms"
+
+
+@dataclass
+class LenientLogReader:
+    """不正な行を飛ばしながら監視ログを読み込む
+
+    時刻の桁数やアドレスに使える文字を先に確かめ、通らない行は変換せずに捨てる。
+    捨てた行は読み込んだファイルとバイト位置、理由を付けて `quarantine` に1行ずつ書き出す。
+    バイト位置はファイルごとに0から数えるので、ファイルと組にして行を特定する。
+    正しい行からは `read_log` と同じ記録ができる
+
+    Attributes:
+        quarantine: 捨てた行の書き出し先（「ファイル<TAB>バイト位置<TAB>理由<TAB>行」）。
+            None なら書き出さない
+        records: 読み込んだ記録の数
+        rejected: 捨てた行の数
+        reasons: 理由ごとの捨てた行の数
+    """
+
+    quarantine: Optional[TextIO] = None
+    records: int = 0
+    rejected: int = 0
+    reasons: dict[str, int] = field(default_factory=dict)
+
+    def read(
+        self, f: Iterable[bytes], source: Optional[str] = None, offset: int = 0
+    ) -> Iterator[LogRecord]:
+        """監視ログを読み込む
+
+        Args:
+            f: バイナリモードで開いた監視ログ
+            source: 捨てた行に付けるファイル名。None なら `f.name`（なければ "-"）
+            offset: 最初の行のバイト位置
+        """
+        if source is None:
+            source = getattr(f, "name", "-")
+        for raw in f:
+            position = offset
+            offset += len(raw)
+            try:
+                line = raw.decode().rstrip("\r\n")
+            except UnicodeDecodeError:
+                self._reject(source, position, "encoding", raw)
+                continue
+            if not line:
+                continue
+            record, reason = _check(_split(line))
+            if record is None:
+                self._reject(source, position, reason, raw)
+                continue
+            self.records += 1
+            yield record
+
+    def _reject(self, source: str, position: int, reason: str, raw: bytes):
+        self.rejected += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        if self.quarantine is not None:
+            line = raw.rstrip(b"\r\n").decode(errors="backslashreplace")
+            self.quarantine.write(f"{source}\t{position}\t{reason}\t{line}\n")
+
+    def summary(self) -> str:
+        """読み込んだ数と捨てた数（理由ごと）の1行の要約"""
+        reasons = ", ".join(
+            f"{reason}: {count}" for reason, count in sorted(self.reasons.items())
+        )
+        summary = f"{self.records} records, {self.rejected} rejected"
+        return f"{summary} ({reasons})" if reasons else summary
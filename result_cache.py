@@ -0,0 +1,235 @@
+from __future__ import annotations
+from dataclasses import dataclass, fields, is_dataclass
+from hashlib import blake2b
+from typing import Any, BinaryIO, Optional
+from pipeline import Detector
+from prefetch import read_log_prefetched
+from util import read_log
+import os
+import pickle
+
+DEFAULT_MAX_BYTES = 64 << 20
+DEFAULT_SAMPLE_SIZE = 64 << 10
+
+_SUFFIX = ".pickle"
+_SCAN_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    """監視ログファイルの同一性
+
+    全体を読まずに済むよう、先頭と末尾 `sample_size` バイトだけをハッシュする
+
+    Attributes:
+        size: ファイルサイズ（バイト）
+        mtime_ns: 最終更新時刻（ナノ秒）
+        head_hash: 先頭のハッシュ
+        tail_hash: 末尾のハッシュ
+    """
+
+    size: int
+    mtime_ns: int
+    head_hash: str
+    tail_hash: str
+
+
+def _hash_range(f, start: int, end: int) -> str:
+    f.seek(start)
+    return blake2b(f.read(end - start), digest_size=16).hexdigest()
+
+
+def fingerprint(path: str, sample_size: int = DEFAULT_SAMPLE_SIZE) -> FileFingerprint:
+    """ファイルの同一性を求める
+
+    Args:
+        path: 監視ログのパス
+        sample_size: ハッシュする先頭・末尾のバイト数
+    """
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        return FileFingerprint(
+            stat.st_size,
+            stat.st_mtime_ns,
+            _hash_range(f, 0, min(stat.st_size, sample_size)),
+            _hash_range(f, max(stat.st_size - sample_size, 0), stat.st_size),
+        )
+
+
+def _detector_key(detector: Detector) -> str:
+    if not is_dataclass(detector):
+        raise TypeError(f"{type(detector).__name__} is not a dataclass")
+    parameters = ", ".join(
+        f"{f.name}={getattr(detector, f.name)!r}"
+        for f in fields(detector)
+        if f.init and not f.name.startswith("_")
+    )
+    return f"{type(detector).__module__}.{type(detector).__qualname__}({parameters})"
+
+
+@dataclass
+class _Entry:
+    fingerprint: FileFingerprint
+    consumed: int
+    consumed_head_hash: str
+    consumed_tail_hash: str
+    detector: Detector
+
+
+class _Prefix:
+    """ファイルの先頭から `limit` バイトまでだけを読ませる"""
+
+    def __init__(self, f: BinaryIO, limit: int):
+        self._f = f
+        self._remaining = limit - f.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+def _line_boundary(f: BinaryIO, start: int, end: int) -> int:
+    """[start, end) の最後の改行の直後の位置を返す。改行がなければ start"""
+    position = end
+    while position > start:
+        chunk_start = max(position - _SCAN_SIZE, start)
+        f.seek(chunk_start)
+        newline = f.read(position - chunk_start).rfind(b"\n")
+        if newline >= 0:
+            return chunk_start + newline + 1
+        position = chunk_start
+    return start
+
+
+class ResultCache:
+    """監視ログファイルと検出器の引数ごとに、検出結果をディスクに保存する
+
+    キーはファイルのパスと検出器の種類・引数。
+    ファイルが変わっていなければ保存した結果を返し、
+    追記されていれば保存した検出器の状態から追記分だけを読む。
+    保存する状態は最後の改行までを読んだものなので、
+    書きかけの行があっても続きから正しく読み直せる。
+    合計サイズが `max_bytes` を超えたら、最も長く使われていないものから削除する
+
+    検出器は pickle で保存するので、信頼できるディレクトリだけを使うこと
+
+    Attributes:
+        directory: 保存先ディレクトリ
+        max_bytes: 保存する合計サイズの上限（バイト）
+        sample_size: ファイルの同一性を調べる先頭・末尾のバイト数
+        hits: 保存した結果をそのまま返した回数
+        resumes: 追記分だけを読んだ回数
+        misses: 全体を読んだ回数
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        sample_size: int = DEFAULT_SAMPLE_SIZE,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sample_size = sample_size
+        self.hits = 0
+        self.resumes = 0
+        self.misses = 0
+
+    def _entry_path(self, path: str, detector: Detector) -> str:
+        key = blake2b(
+            f"{_detector_key(detector)}\0{os.path.realpath(path)}".encode(),
+            digest_size=16,
+        )
+        return os.path.join(self.directory, key.hexdigest() + _SUFFIX)
+
+    def _load(self, path: str) -> Optional[_Entry]:
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError):
+            os.remove(path)
+            return None
+
+    def _consumed_hashes(self, f: BinaryIO, consumed: int) -> tuple[str, str]:
+        return (
+            _hash_range(f, 0, min(consumed, self.sample_size)),
+            _hash_range(f, max(consumed - self.sample_size, 0), consumed),
+        )
+
+    def _is_prefix(self, f: BinaryIO, entry: _Entry, size: int) -> bool:
+        return entry.consumed <= size and self._consumed_hashes(f, entry.consumed) == (
+            entry.consumed_head_hash,
+            entry.consumed_tail_hash,
+        )
+
+    def run(self, path: str, detector: Detector) -> Any:
+        """監視ログファイルを検出器に通した結果を返す
+
+        Args:
+            path: 監視ログのパス
+            detector: 記録をまだ受け取っていない検出器。種類と引数がキーになる
+        """
+        current = fingerprint(path, self.sample_size)
+        entry_path = self._entry_path(path, detector)
+        entry = self._load(entry_path)
+        with open(path, "rb") as f:
+            if entry is not None and entry.fingerprint == current:
+                self.hits += 1
+                os.utime(entry_path)
+                detector = entry.detector
+                consumed = entry.consumed
+            else:
+                offset = 0
+                if entry is not None and self._is_prefix(f, entry, current.size):
+                    self.resumes += 1
+                    detector = entry.detector
+                    offset = entry.consumed
+                else:
+                    self.misses += 1
+                consumed = _line_boundary(f, offset, current.size)
+                f.seek(offset)
+                for record in read_log_prefetched(_Prefix(f, consumed)):
+                    detector.push_newer_record(record)
+                # 読んでいる間に書き換えられていたら、どこまで読んだか分からないので保存しない
+                if fingerprint(path, self.sample_size) == current:
+                    self._store(
+                        entry_path,
+                        _Entry(
+                            current,
+                            consumed,
+                            *self._consumed_hashes(f, consumed),
+                            detector,
+                        ),
+                    )
+            # 改行で終わっていない最後の行は、保存した状態には含めずに結果にだけ反映する
+            f.seek(consumed)
+            tail = f.read(current.size - consumed).decode()
+        for record in read_log([tail] if tail else []):
+            detector.push_newer_record(record)
+        return detector.result()
+
+    def _store(self, entry_path: str, entry: _Entry):
+        temporary_path = entry_path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, entry_path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
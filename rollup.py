@@ -0,0 +1,203 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from csv import writer as csv_writer
+from dataclasses import dataclass, field
+from ipaddress import IPv4Interface, IPv4Network
+from typing import Optional, TextIO, Union
+from histogram import LatencyHistogram
+from pipeline import Detector
+from util import LogRecord, to_datetime
+
+RollupKey = Union[IPv4Interface, IPv4Network]
+
+DEFAULT_RESOLUTIONS = (60, 5 * 60, 60 * 60)
+
+
+def floor_timestamp(timestamp: int, resolution: int) -> int:
+    """時刻を集計単位の区切りに切り捨てる
+
+    Args:
+        timestamp: 時刻（UNIX時間・秒）
+        resolution: 集計単位（秒）
+    """
+    return timestamp - timestamp % resolution
+
+
+def format_resolution(seconds: int) -> str:
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+
+@dataclass
+class RollupRow:
+    """集計済みの1行
+
+    Attributes:
+        resolution: 集計単位（秒）
+        start: 集計区間の開始時刻（UNIX時間・秒）
+        key: サーバアドレスまたはサブネット
+        count: タイムアウト以外の件数
+        timeout_count: タイムアウトの件数
+        min_ms: 最小の応答時間
+        mean_ms: 平均の応答時間
+        max_ms: 最大の応答時間
+        p99_ms: 99パーセンタイルの応答時間
+    """
+
+    resolution: int
+    start: int
+    key: RollupKey
+    count: int
+    timeout_count: int
+    min_ms: Optional[int]
+    mean_ms: Optional[float]
+    max_ms: Optional[int]
+    p99_ms: Optional[int]
+
+    @staticmethod
+    def from_histogram(
+        resolution: int, start: int, key: RollupKey, h: LatencyHistogram
+    ) -> RollupRow:
+        return RollupRow(
+            resolution=resolution,
+            start=start,
+            key=key,
+            count=h.count,
+            timeout_count=h.timeout_count,
+            min_ms=h.min_ms,
+            mean_ms=h.mean_ms,
+            max_ms=h.max_ms,
+            p99_ms=h.value_at_percentile(99),
+        )
+
+
+class RollupWriter(ABC):
+    @abstractmethod
+    def write_rows(self, rows: list[RollupRow]):
+        ...
+
+
+@dataclass
+class ListRollupWriter(RollupWriter):
+    """集計結果をメモリ上に溜める
+
+    Attributes:
+        rows: 書き出された集計結果
+    """
+
+    rows: list[RollupRow] = field(default_factory=list)
+
+    def write_rows(self, rows: list[RollupRow]):
+        self.rows.extend(rows)
+
+
+@dataclass
+class CsvRollupWriter(RollupWriter):
+    """集計結果を区間が閉じるたびにCSVへ追記する
+
+    形式は1行ずつ：
+    <集計単位>,<開始時刻>,<サーバアドレスまたはサブネット>,<件数>,<タイムアウト件数>,<最小>,<平均>,<最大>,<p99>
+
+    Attributes:
+        f: 書き込み先
+    """
+
+    f: TextIO
+
+    def write_rows(self, rows: list[RollupRow]):
+        csv_writer(self.f).writerows(
+            (
+                format_resolution(row.resolution),
+                to_datetime(row.start).strftime("%Y%m%d%H%M%S"),
+                row.key,
+                row.count,
+                row.timeout_count,
+                "" if row.min_ms is None else row.min_ms,
+                "" if row.mean_ms is None else f"{row.mean_ms:.3f}",
+                "" if row.max_ms is None else row.max_ms,
+                "" if row.p99_ms is None else row.p99_ms,
+            )
+            for row in rows
+        )
+        self.f.flush()
+
+
+@dataclass
+class _RollupLevel:
+    resolution: int
+    start: Optional[int] = None
+    histograms: dict[RollupKey, LatencyHistogram] = field(default_factory=dict)
+
+
+@dataclass
+class RollupDetector(Detector):
+    """サーバごと・サブネットごとの応答時間を時間区間で集計する
+
+    監視ログは時刻順に並んでいるものとする。
+    最も細かい区間だけを監視ログから集計し、区間が閉じるたびに書き出して
+    1つ粗い区間へ足し合わせる（粗い区間は監視ログを読み直さない）
+
+    Attributes:
+        writer: 集計結果の書き出し先
+        resolutions: 集計単位（秒。細かい順。各単位は1つ前の単位で割り切れること）
+    """
+
+    writer: RollupWriter = field(default_factory=ListRollupWriter)
+    resolutions: tuple[int, ...] = DEFAULT_RESOLUTIONS
+    _levels: list[_RollupLevel] = field(init=False)
+
+    def __post_init__(self):
+        for finer, coarser in zip(self.resolutions, self.resolutions[1:]):
+            if coarser % finer:
+                raise ValueError(f"{coarser} is not a multiple of {finer}")
+        self._levels = [_RollupLevel(resolution) for resolution in self.resolutions]
+
+    def push_newer_record(self, record: LogRecord):
+        finest = self._levels[0]
+        start = floor_timestamp(record.datetime, finest.resolution)
+        if finest.start != start:
+            if finest.start is not None:
+                self._close(0, record.datetime)
+            finest.start = start
+        for key in (record.ipv4interface, record.ipv4interface.network):
+            histogram = finest.histograms.get(key)
+            if histogram is None:
+                histogram = finest.histograms[key] = LatencyHistogram()
+            histogram.record(record.response_ms)
+
+    def _close(self, index: int, now: Optional[int]):
+        level = self._levels[index]
+        self.writer.write_rows(
+            [
+                RollupRow.from_histogram(level.resolution, level.start, key, histogram)
+                for key, histogram in level.histograms.items()
+            ]
+        )
+        if index + 1 < len(self._levels):
+            coarser = self._levels[index + 1]
+            start = floor_timestamp(level.start, coarser.resolution)
+            if coarser.start is not None and coarser.start != start:
+                self._close(index + 1, level.start)
+            coarser.start = start
+            for key, histogram in level.histograms.items():
+                target = coarser.histograms.get(key)
+                if target is None:
+                    target = coarser.histograms[key] = LatencyHistogram()
+                target.merge(histogram)
+            if now is not None and floor_timestamp(now, coarser.resolution) != start:
+                self._close(index + 1, now)
+        level.start = None
+        level.histograms = {}
+
+    def flush(self):
+        """集計途中の区間をすべて書き出す"""
+        for index, level in enumerate(self._levels):
+            if level.start is not None:
+                self._close(index, None)
+
+    def result(self) -> RollupWriter:
+        self.flush()
+        return self.writer
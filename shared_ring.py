@@ -0,0 +1,232 @@
+from __future__ import annotations
+from collections.abc import Iterable, Iterator
+from ipaddress import IPv4Interface
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from struct import Struct
+from typing import Optional
+from prefetch import read_log_prefetched
+from util import LogRecord
+import sys
+import time
+
+DEFAULT_CAPACITY = 1 << 16
+DEFAULT_PUBLISH_INTERVAL = 256
+
+# 記録1件: 時刻（UNIX時間・秒）、IPv4アドレス、応答時間（タイムアウトは -1）、プレフィックス長
+_RECORD = Struct("<qIiB3x")
+# 先頭: 容量、書き込んだ件数、読み込んだ件数、書き込み終了フラグ、読み込み終了フラグ
+_CAPACITY = Struct("<Q")
+_INDEX = Struct("<Q")
+_CLOSED = Struct("<?")
+_CAPACITY_OFFSET = 0
+_WRITE_OFFSET = 8
+_READ_OFFSET = 16
+_CLOSED_OFFSET = 24
+_READER_CLOSED_OFFSET = 25
+_HEADER_SIZE = 32
+
+_TIMED_OUT = -1
+_MAX_WAIT = 0.001
+
+
+def _wait(wait: float) -> float:
+    time.sleep(wait)
+    return min(wait * 2 or 0.00001, _MAX_WAIT)
+
+
+class SharedRingBuffer:
+    """プロセス間で監視ログの記録を受け渡す共有メモリ上のリングバッファ
+
+    記録は固定長のバイナリで書き込むので、pickle せずに受け渡せる。
+    書き込むプロセスと読み込むプロセスが1つずつの場合だけを扱い、
+    それぞれが自分の位置だけを更新するのでロックは使わない。
+    パースするプロセスが複数あるときはプロセスごとにバッファを作る
+
+    位置の公開は `publish_interval` 件ごとにまとめて行う
+
+    Attributes:
+        name: 共有メモリの名前。別プロセスからはこの名前で `attach` する
+        capacity: 保持できる記録の数
+    """
+
+    def __init__(self, memory: SharedMemory):
+        self._memory = memory
+        self._buffer = memory.buf
+        (self.capacity,) = _CAPACITY.unpack_from(self._buffer, _CAPACITY_OFFSET)
+        self._interfaces: dict[tuple[int, int], IPv4Interface] = {}
+
+    @staticmethod
+    def create(capacity: int = DEFAULT_CAPACITY) -> SharedRingBuffer:
+        """共有メモリを確保して作る。使い終わったら `unlink` する
+
+        Args:
+            capacity: 保持できる記録の数
+        """
+        memory = SharedMemory(create=True, size=_HEADER_SIZE + capacity * _RECORD.size)
+        memory.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+        _CAPACITY.pack_into(memory.buf, _CAPACITY_OFFSET, capacity)
+        return SharedRingBuffer(memory)
+
+    @staticmethod
+    def attach(name: str) -> SharedRingBuffer:
+        """別プロセスが作ったバッファにつなぐ
+
+        つないだだけのプロセスは共有メモリを管理しない。
+        終了時に resource_tracker が作ったプロセスの共有メモリを解放しないように、登録を外す
+
+        Args:
+            name: 共有メモリの名前
+        """
+        if sys.version_info >= (3, 13):
+            return SharedRingBuffer(SharedMemory(name=name, track=False))
+        memory = SharedMemory(name=name)
+        resource_tracker.unregister(memory._name, "shared_memory")
+        return SharedRingBuffer(memory)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    @property
+    def pending(self) -> int:
+        """書き込まれてまだ読み込まれていない記録の数"""
+        return self._load(_WRITE_OFFSET) - self._load(_READ_OFFSET)
+
+    def _load(self, offset: int) -> int:
+        return _INDEX.unpack_from(self._buffer, offset)[0]
+
+    def _store(self, offset: int, index: int):
+        _INDEX.pack_into(self._buffer, offset, index)
+
+    def write(
+        self,
+        records: Iterable[LogRecord],
+        publish_interval: int = DEFAULT_PUBLISH_INTERVAL,
+        timeout: Optional[float] = None,
+    ):
+        """記録を書き込む。バッファが一杯なら読み込まれるまで待つ
+
+        読み込む側が `close_reader` したら `BrokenPipeError`、
+        `timeout` 秒待っても読み込まれなければ `TimeoutError` を送出する
+
+        Args:
+            records: 書き込む記録
+            publish_interval: 何件ごとに書き込み位置を公開するか
+            timeout: 一杯のときに待つ秒数。None なら読み込まれるまで待つ
+        """
+        buffer = self._buffer
+        capacity = self.capacity
+        write_index = self._load(_WRITE_OFFSET)
+        read_index = self._load(_READ_OFFSET)
+        unpublished = 0
+        for record in records:
+            if write_index - read_index >= capacity:
+                self._store(_WRITE_OFFSET, write_index)
+                unpublished = 0
+                self._wait_for_reader(write_index - capacity, timeout)
+                read_index = self._load(_READ_OFFSET)
+            interface = record.ipv4interface
+            _RECORD.pack_into(
+                buffer,
+                _HEADER_SIZE + write_index % capacity * _RECORD.size,
+                record.datetime,
+                int(interface),
+                _TIMED_OUT if record.response_ms is None else record.response_ms,
+                interface.network.prefixlen,
+            )
+            write_index += 1
+            unpublished += 1
+            if unpublished >= publish_interval:
+                self._store(_WRITE_OFFSET, write_index)
+                unpublished = 0
+        self._store(_WRITE_OFFSET, write_index)
+
+    def _wait_for_reader(self, read_index: int, timeout: Optional[float]):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait = 0.0
+        while self._load(_READ_OFFSET) <= read_index:
+            if _CLOSED.unpack_from(self._buffer, _READER_CLOSED_OFFSET)[0]:
+                raise BrokenPipeError("reader has been closed")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError("reader did not consume records in time")
+            wait = _wait(wait)
+
+    def close_writer(self):
+        """これ以上書き込まないことを読み込む側に知らせる"""
+        _CLOSED.pack_into(self._buffer, _CLOSED_OFFSET, True)
+
+    def close_reader(self):
+        """これ以上読み込まないことを書き込む側に知らせる"""
+        _CLOSED.pack_into(self._buffer, _READER_CLOSED_OFFSET, True)
+
+    def _interface(self, address: int, prefixlen: int) -> IPv4Interface:
+        interface = self._interfaces.get((address, prefixlen))
+        if interface is None:
+            interface = IPv4Interface((address, prefixlen))
+            self._interfaces[(address, prefixlen)] = interface
+        return interface
+
+    def read(
+        self, publish_interval: int = DEFAULT_PUBLISH_INTERVAL
+    ) -> Iterator[LogRecord]:
+        """書き込まれた記録を順に読み込む。`close_writer` されて読み切ったら終わる
+
+        Args:
+            publish_interval: 何件ごとに読み込み位置を公開するか
+        """
+        buffer = self._buffer
+        capacity = self.capacity
+        read_index = self._load(_READ_OFFSET)
+        wait = 0.0
+        while True:
+            write_index = self._load(_WRITE_OFFSET)
+            if read_index == write_index:
+                closed = _CLOSED.unpack_from(buffer, _CLOSED_OFFSET)[0]
+                # 終了フラグを見た後にもう一度確かめ、その間の書き込みを取りこぼさない
+                if closed and read_index == self._load(_WRITE_OFFSET):
+                    return
+                wait = _wait(wait)
+                continue
+            wait = 0.0
+            while read_index < write_index:
+                timestamp, address, response_ms, prefixlen = _RECORD.unpack_from(
+                    buffer, _HEADER_SIZE + read_index % capacity * _RECORD.size
+                )
+                read_index += 1
+                # 取り出した枠は、記録を渡す前に書き込む側へ返す
+                if read_index == write_index or read_index % publish_interval == 0:
+                    self._store(_READ_OFFSET, read_index)
+                yield LogRecord(
+                    timestamp,
+                    self._interface(address, prefixlen),
+                    None if response_ms == _TIMED_OUT else response_ms,
+                )
+
+    def close(self):
+        """このプロセスでの共有メモリの対応づけを解除する"""
+        self._buffer = None
+        self._memory.close()
+
+    def unlink(self):
+        """共有メモリを解放する。`create` したプロセスで呼ぶ"""
+        # 同じ resource_tracker を使うプロセス（fork した子など）が `attach` で
+        # 登録を外していても、解放時の登録解除が失敗しないように登録し直す
+        resource_tracker.register(self._memory._name, "shared_memory")
+        self._memory.unlink()
+
+
+def write_log_file(name: str, path: str):
+    """監視ログファイルを読み込んでバッファに書き込む。パースするプロセスの処理
+
+    Args:
+        name: 共有メモリの名前
+        path: 監視ログのパス
+    """
+    ring = SharedRingBuffer.attach(name)
+    try:
+        with open(path, "rb") as f:
+            ring.write(read_log_prefetched(f))
+    finally:
+        ring.close_writer()
+        ring.close()
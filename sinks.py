@@ -0,0 +1,268 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from ipaddress import IPv4Interface, IPv4Network
+from json import dumps
+from struct import Struct
+from typing import BinaryIO, Optional, TextIO, Union
+from util import format_timestamp
+
+Address = Union[IPv4Interface, IPv4Network]
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+
+@dataclass
+class FailurePeriod:
+    """サーバまたはサブネットの故障期間・過負荷期間
+
+    Attributes:
+        address: サーバアドレスまたはサブネット
+        fail: 故障時刻
+        fail_recovery: 故障からの復旧時刻
+        overload: 過負荷時刻
+        overload_recovery: 過負荷からの復旧時刻
+    """
+
+    address: Address
+    fail: Optional[int] = None
+    fail_recovery: Optional[int] = None
+    overload: Optional[int] = None
+    overload_recovery: Optional[int] = None
+
+    @property
+    def start(self) -> Optional[int]:
+        return self.fail if self.fail is not None else self.overload
+
+
+def _first_attribute(state: object, *names: str) -> Optional[int]:
+    for name in names:
+        value = getattr(state, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def iter_failure_periods(state_map: dict[Address, object]) -> Iterator[FailurePeriod]:
+    """設問1〜4の状態から故障期間・過負荷期間を1件ずつ取り出す
+
+    健康状態（一度も故障・過負荷になっていない）のものは出力しない
+
+    Args:
+        state_map: アドレスと状態の対応
+    """
+    for address, state in state_map.items():
+        period = FailurePeriod(
+            address=address,
+            fail=getattr(state, "last_fail_datetime", None),
+            fail_recovery=_first_attribute(
+                state,
+                "recovery_datetime",
+                "fail_recovery_datetime",
+                "fail_recovered_datetime",
+            ),
+            overload=getattr(state, "last_overload_datetime", None),
+            overload_recovery=getattr(state, "overload_recovery_datetime", None),
+        )
+        if period.start is not None:
+            yield period
+
+
+def is_closed(period: FailurePeriod) -> bool:
+    """故障期間・過負荷期間が復旧済みか"""
+    return (period.fail is None or period.fail_recovery is not None) and (
+        period.overload is None or period.overload_recovery is not None
+    )
+
+
+class PeriodRecorder:
+    """状態が変わるたびに、閉じた（復旧した）期間を書き出す
+
+    各設問の `ServerContext` の `on_transition` に渡す。
+    最後の状態だけでなく、途中で閉じた期間もすべて書き出せる
+
+    Attributes:
+        writers: 期間を受け取る関数（`IncidentStore.write`、`StateIndex.add_period` など）
+    """
+
+    def __init__(self, *writers: Callable[[FailurePeriod], None]):
+        self.writers = writers
+
+    def __call__(self, address: Address, state: object):
+        for period in iter_failure_periods({address: state}):
+            if is_closed(period):
+                for write in self.writers:
+                    write(period)
+
+
+def sort_failure_periods(
+    periods: Iterable[FailurePeriod], sort_by: Optional[str]
+) -> Iterable[FailurePeriod]:
+    """故障期間を並べ替える
+
+    Args:
+        periods: 故障期間
+        sort_by: "server"（アドレス順）、"time"（故障・過負荷時刻順）、None（そのまま）
+    """
+    if sort_by is None:
+        return periods
+    if sort_by == "server":
+        return sorted(
+            periods, key=lambda p: (isinstance(p.address, IPv4Network), p.address)
+        )
+    if sort_by == "time":
+        return sorted(periods, key=lambda p: p.start)
+    raise ValueError(f"unknown sort key: {sort_by!r}")
+
+
+class ResultSink(ABC):
+    """故障期間をまとめて書き出す出力先
+
+    行ごとには書き込まず、`buffer_size` 程度溜まったらまとめて書き込む
+    """
+
+    _empty: Union[str, bytes]
+
+    def __init__(
+        self, f: Union[TextIO, BinaryIO], buffer_size: int = DEFAULT_BUFFER_SIZE
+    ):
+        self.f = f
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._buffered = 0
+
+    def write(self, period: FailurePeriod):
+        chunk = self._encode(period)
+        self._chunks.append(chunk)
+        self._buffered += len(chunk)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def write_all(self, periods: Iterable[FailurePeriod]):
+        for period in periods:
+            self.write(period)
+        self.flush()
+
+    def flush(self):
+        if self._chunks:
+            self.f.write(self._empty.join(self._chunks))
+            self._chunks = []
+            self._buffered = 0
+
+    @abstractmethod
+    def _encode(self, period: FailurePeriod) -> Union[str, bytes]:
+        ...
+
+
+def _format_optional_timestamp(timestamp: Optional[int]) -> str:
+    return "" if timestamp is None else format_timestamp(timestamp)
+
+
+class CsvResultSink(ResultSink):
+    """CSV形式
+
+    形式は1行ずつ：
+    <アドレス>,<故障時刻>,<故障復旧時刻>,<過負荷時刻>,<過負荷復旧時刻>
+    """
+
+    _empty = ""
+
+    def _encode(self, period: FailurePeriod) -> str:
+        return (
+            f"{period.address},{_format_optional_timestamp(period.fail)},"
+            f"{_format_optional_timestamp(period.fail_recovery)},"
+            f"{_format_optional_timestamp(period.overload)},"
+            f"{_format_optional_timestamp(period.overload_recovery)}\n"
+        )
+
+
+class JsonLinesResultSink(ResultSink):
+    """JSON Lines形式
+
+    アドレスはサーバなら "server"、サブネットなら "network" に入る
+    """
+
+    _empty = ""
+
+    def _encode(self, period: FailurePeriod) -> str:
+        def iso(timestamp: Optional[int]):
+            return None if timestamp is None else format_timestamp(timestamp)
+
+        key = "network" if isinstance(period.address, IPv4Network) else "server"
+        return (
+            dumps(
+                {
+                    key: str(period.address),
+                    "fail": iso(period.fail),
+                    "fail_recovery": iso(period.fail_recovery),
+                    "overload": iso(period.overload),
+                    "overload_recovery": iso(period.overload_recovery),
+                }
+            )
+            + "\n"
+        )
+
+
+_BINARY_RECORD = Struct("<IBB4q")
+_NETWORK_FLAG = 1 << 7
+
+
+class BinaryResultSink(ResultSink):
+    """固定長のバイナリ形式
+
+    1件 `_BINARY_RECORD.size` バイト：
+    アドレス（uint32）、プレフィックス長（uint8）、フラグ（uint8）、
+    故障・故障復旧・過負荷・過負荷復旧時刻（int64 UNIX時間）。
+    フラグの下位4ビットは各時刻の有無、最上位ビットはサブネットかどうか
+    """
+
+    _empty = b""
+
+    def _encode(self, period: FailurePeriod) -> bytes:
+        timestamps = (
+            period.fail,
+            period.fail_recovery,
+            period.overload,
+            period.overload_recovery,
+        )
+        flags = sum(1 << i for i, t in enumerate(timestamps) if t is not None)
+        if isinstance(period.address, IPv4Network):
+            flags |= _NETWORK_FLAG
+            address = period.address.network_address
+            prefixlen = period.address.prefixlen
+        else:
+            address = period.address.ip
+            prefixlen = period.address.network.prefixlen
+        return _BINARY_RECORD.pack(
+            int(address),
+            prefixlen,
+            flags,
+            *(0 if t is None else t for t in timestamps),
+        )
+
+
+def read_binary_failure_periods(
+    f: BinaryIO, buffer_size: int = DEFAULT_BUFFER_SIZE
+) -> Iterator[FailurePeriod]:
+    """`BinaryResultSink` で書き出したものを読み込む
+
+    Args:
+        f: バイナリモードで開いたファイル
+        buffer_size: 1回に読み込むバイト数の目安
+    """
+    block_size = max(1, buffer_size // _BINARY_RECORD.size) * _BINARY_RECORD.size
+    while block := f.read(block_size):
+        yield from _unpack_failure_periods(block)
+
+
+def _unpack_failure_periods(block: bytes) -> Iterator[FailurePeriod]:
+    for address, prefixlen, flags, *timestamps in _BINARY_RECORD.iter_unpack(block):
+        if flags & _NETWORK_FLAG:
+            parsed_address = IPv4Network((address, prefixlen))
+        else:
+            parsed_address = IPv4Interface((address, prefixlen))
+        yield FailurePeriod(
+            parsed_address,
+            *(t if flags & (1 << i) else None for i, t in enumerate(timestamps)),
+        )
@@ -0,0 +1,101 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+AVERAGE = "average"
+MAX = "max"
+
+
+class SlidingWindow(ABC):
+    """直近 `seconds` 秒の応答時間を集計する窓
+
+    各記録は1回ずつ追加・削除されるので、1件あたりの更新はならし O(1)。
+    保持するのは窓に入っている記録だけ
+    """
+
+    seconds: int
+
+    @abstractmethod
+    def push(self, timestamp: int, response_ms: int):
+        ...
+
+    @property
+    @abstractmethod
+    def value(self) -> Optional[float]:
+        ...
+
+
+@dataclass
+class WindowAverage(SlidingWindow):
+    """直近 `seconds` 秒の平均応答時間
+
+    Attributes:
+        seconds: 窓の長さ（秒）
+    """
+
+    seconds: int
+    _records: deque[tuple[int, int]] = field(default_factory=deque, repr=False)
+    _total: int = field(default=0, repr=False)
+
+    def push(self, timestamp: int, response_ms: int):
+        self._records.append((timestamp, response_ms))
+        self._total += response_ms
+        oldest = timestamp - self.seconds
+        while self._records and self._records[0][0] <= oldest:
+            self._total -= self._records.popleft()[1]
+
+    @property
+    def value(self) -> Optional[float]:
+        if not self._records:
+            return None
+        return self._total / len(self._records)
+
+
+@dataclass
+class WindowMax(SlidingWindow):
+    """直近 `seconds` 秒の最大応答時間
+
+    応答時間が単調減少になるように両端キューを保つ
+
+    Attributes:
+        seconds: 窓の長さ（秒）
+    """
+
+    seconds: int
+    _records: deque[tuple[int, int]] = field(default_factory=deque, repr=False)
+
+    def push(self, timestamp: int, response_ms: int):
+        while self._records and self._records[-1][1] <= response_ms:
+            self._records.pop()
+        self._records.append((timestamp, response_ms))
+        oldest = timestamp - self.seconds
+        while self._records and self._records[0][0] <= oldest:
+            self._records.popleft()
+
+    @property
+    def value(self) -> Optional[float]:
+        if not self._records:
+            return None
+        return self._records[0][1]
+
+
+def create_sliding_window(
+    seconds: Optional[int], aggregate: str = AVERAGE
+) -> Optional[SlidingWindow]:
+    """窓を作る。seconds が None なら None を返す
+
+    Args:
+        seconds: 窓の長さ（秒）
+        aggregate: "average" または "max"
+    """
+    if seconds is None:
+        return None
+    if seconds <= 0:
+        raise ValueError(f"window must be positive: {seconds}")
+    if aggregate == AVERAGE:
+        return WindowAverage(seconds)
+    if aggregate == MAX:
+        return WindowMax(seconds)
+    raise ValueError(f"unknown aggregate: {aggregate!r}")
@@ -0,0 +1,106 @@
+from __future__ import annotations
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from ipaddress import IPv4Interface, IPv4Network
+from itertools import compress
+from typing import Optional
+
+_ALL_ONES = (1 << 32) - 1
+_MASKS = [_ALL_ONES ^ (_ALL_ONES >> prefixlen) for prefixlen in range(33)]
+# キーはネットワークアドレスを6ビットずらしてプレフィックス長を下に詰めた整数
+_PREFIX_BITS = 6
+_PREFIX_MASK = (1 << _PREFIX_BITS) - 1
+
+
+def _network_key(address: int, prefixlen: int) -> int:
+    return (address & _MASKS[prefixlen]) << _PREFIX_BITS | prefixlen
+
+
+@dataclass
+class NetworkSummary:
+    """サブネットごとの集計
+
+    Attributes:
+        network: サブネット
+        members: サーバ数
+        failed: 故障中のサーバ数
+        worst_ms: 最も長い応答時間（ミリ秒）。分からなければ None
+    """
+
+    network: IPv4Network
+    members: int
+    failed: int
+    worst_ms: Optional[int] = None
+
+
+@dataclass
+class ServerColumns:
+    """サーバを32ビットのアドレスとプレフィックス長の列で持つ
+
+    サブネットはアドレスをマスクした整数のキーで表すので、
+    サーバごとに `IPv4Network` を作らずにまとめられる
+
+    Attributes:
+        servers: サーバアドレス（行の順）
+        addresses: アドレスの整数
+        prefixlens: プレフィックス長
+        network_keys: サブネットのキー
+    """
+
+    servers: list[IPv4Interface]
+    addresses: array = field(default_factory=lambda: array("I"))
+    prefixlens: array = field(default_factory=lambda: array("B"))
+    network_keys: list[int] = field(default_factory=list)
+
+    @staticmethod
+    def from_interfaces(servers: Iterable[IPv4Interface]) -> ServerColumns:
+        servers = list(servers)
+        addresses = array("I", map(int, servers))
+        prefixlens = array("B", [server.network.prefixlen for server in servers])
+        return ServerColumns(
+            servers,
+            addresses,
+            prefixlens,
+            list(map(_network_key, addresses, prefixlens)),
+        )
+
+    @staticmethod
+    def network(key: int) -> IPv4Network:
+        return IPv4Network((key >> _PREFIX_BITS, key & _PREFIX_MASK))
+
+    def groups(self) -> dict[int, list[int]]:
+        """サブネットのキーごとの行番号（最初に現れた順）"""
+        groups: dict[int, list[int]] = {}
+        for row, key in enumerate(self.network_keys):
+            rows = groups.get(key)
+            if rows is None:
+                groups[key] = [row]
+            else:
+                rows.append(row)
+        return groups
+
+    def summarize(
+        self, failed: Sequence[bool], worst_ms: Optional[Sequence[int]] = None
+    ) -> list[NetworkSummary]:
+        """サブネットごとのサーバ数・故障中のサーバ数・最長応答時間を求める
+
+        Args:
+            failed: 行ごとの故障中かどうか
+            worst_ms: 行ごとの最長応答時間（ミリ秒）
+        """
+        keys = self.network_keys
+        members = Counter(keys)
+        failed_members = Counter(compress(keys, failed))
+        worst: dict[int, int] = {}
+        if worst_ms is not None:
+            for key, value in zip(keys, worst_ms):
+                if value is not None and value > worst.get(key, -1):
+                    worst[key] = value
+        return [
+            NetworkSummary(
+                self.network(key), count, failed_members[key], worst.get(key)
+            )
+            for key, count in members.items()
+        ]
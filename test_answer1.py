@@ -1,4 +1,4 @@
-from util import read_log
+from util import read_log, parse_timestamp
 from answer1 import (
     detect_failure_duration,
     print_failure_duration,
@@ -8,7 +8,6 @@ from answer1 import (
     RecordRecoveredState,
 )
 from contextlib import redirect_stdout
-from datetime import datetime
 from ipaddress import ip_interface
 from io import StringIO
 from unittest import TestCase
@@ -24,14 +23,14 @@ class Answer2Test(TestCase):
             {
                 ip_interface("10.20.30.1/16"): ServerContext(
                     RecordRecoveredState(
-                        last_fail_datetime=datetime(2020, 10, 19, 13, 32, 24),
-                        recovery_datetime=datetime(2020, 10, 19, 13, 33, 24),
+                        last_fail_datetime=parse_timestamp("20201019133224"),
+                        recovery_datetime=parse_timestamp("20201019133324"),
                     )
                 ),
                 ip_interface("10.20.30.2/16"): ServerContext(RecordHealthyState()),
                 ip_interface("192.168.1.1/24"): ServerContext(
                     RecordFailedState(
-                        last_fail_datetime=datetime(2020, 10, 19, 13, 33, 34)
+                        last_fail_datetime=parse_timestamp("20201019133334")
                     )
                 ),
             },
@@ -1,4 +1,4 @@
-from util import read_log
+from util import read_log, parse_timestamp
 from answer2 import (
     detect_failure_duration,
     print_failure_duration,
@@ -8,7 +8,6 @@ from answer2 import (
     RecordRecoveredState,
 )
 from contextlib import redirect_stdout
-from datetime import datetime
 from ipaddress import IPv4Interface
 from io import StringIO
 from unittest import TestCase
@@ -29,20 +28,20 @@ class Answer2Test(TestCase):
                 IPv4Interface("10.20.30.1/16"): ServerContext(
                     CONSECUTIVE_TIMEOUT_THRESHOLD,
                     RecordRecoveredState(
-                        last_fail_datetime=datetime(2020, 10, 19, 13, 32, 24),
-                        recovery_datetime=datetime(2020, 10, 19, 13, 35, 24),
+                        last_fail_datetime=parse_timestamp("20201019133224"),
+                        recovery_datetime=parse_timestamp("20201019133524"),
                     ),
                 ),
                 IPv4Interface("10.20.30.2/16"): ServerContext(
                     CONSECUTIVE_TIMEOUT_THRESHOLD,
                     RecordHealthyState(
-                        last_timeout_datetime_chain=[datetime(2020, 10, 19, 13, 35, 25)]
+                        last_timeout_datetime_chain=[parse_timestamp("20201019133525")]
                     ),
                 ),
                 IPv4Interface("192.168.1.1/24"): ServerContext(
                     CONSECUTIVE_TIMEOUT_THRESHOLD,
                     RecordFailedState(
-                        last_fail_datetime=datetime(2020, 10, 19, 13, 33, 34)
+                        last_fail_datetime=parse_timestamp("20201019133334")
                     ),
                 ),
             },
@@ -58,3 +57,15 @@ class Answer2Test(TestCase):
             captured_stdout,
             "10.20.30.1/16, 2020-10-19T13:32:24, 2020-10-19T13:35:24\n192.168.1.1/24, 2020-10-19T13:33:34,\n",
         )
+
+    def test_push_newer_records(self):
+        with open("samplelog2.csv") as f:
+            log = list(read_log(f))
+        server = IPv4Interface("10.20.30.1/16")
+        records = [record for record in log if record.ipv4interface == server]
+        one_by_one = ServerContext(2)
+        for record in records:
+            one_by_one.push_newer_record(record)
+        batched = ServerContext(2)
+        batched.push_newer_records(records)
+        self.assertEqual(batched, one_by_one)
@@ -1,4 +1,4 @@
-from util import read_log
+from util import read_log, parse_timestamp
 from answer3 import (
     detect_failure_or_overload_duration,
     print_failure_or_overload_duration,
@@ -10,7 +10,6 @@ from answer3 import (
     RecordOverloadRecorveredState,
 )
 from contextlib import redirect_stdout
-from datetime import datetime
 from ipaddress import IPv4Interface
 from io import StringIO
 from unittest import TestCase
@@ -38,8 +37,8 @@ class Answer3Test(TestCase):
                     OVERLOAD_TIMEOUT_THRESHOLD,
                     CONSECUTIVE_OVERLOAD_THRESHOLD,
                     RecordFailRecoveredState(
-                        last_fail_datetime=datetime(2020, 10, 19, 13, 32, 24),
-                        fail_recovery_datetime=datetime(2020, 10, 19, 13, 35, 24),
+                        last_fail_datetime=parse_timestamp("20201019133224"),
+                        fail_recovery_datetime=parse_timestamp("20201019133524"),
                     ),
                 ),
                 IPv4Interface("10.20.30.2/16"): ServerContext(
@@ -47,7 +46,7 @@ class Answer3Test(TestCase):
                     OVERLOAD_TIMEOUT_THRESHOLD,
                     CONSECUTIVE_OVERLOAD_THRESHOLD,
                     RecordHealthyState(
-                        last_timeout_datetime_chain=[datetime(2020, 10, 19, 13, 35, 25)]
+                        last_timeout_datetime_chain=[parse_timestamp("20201019133525")]
                     ),
                 ),
                 IPv4Interface("192.168.1.1/24"): ServerContext(
@@ -55,7 +54,7 @@ class Answer3Test(TestCase):
                     OVERLOAD_TIMEOUT_THRESHOLD,
                     CONSECUTIVE_OVERLOAD_THRESHOLD,
                     RecordFailedState(
-                        last_fail_datetime=datetime(2020, 10, 19, 13, 33, 34)
+                        last_fail_datetime=parse_timestamp("20201019133334")
                     ),
                 ),
                 IPv4Interface("192.168.1.2/24"): ServerContext(
@@ -63,8 +62,8 @@ class Answer3Test(TestCase):
                     OVERLOAD_TIMEOUT_THRESHOLD,
                     CONSECUTIVE_OVERLOAD_THRESHOLD,
                     RecordOverloadRecorveredState(
-                        last_overload_datetime=datetime(2020, 10, 19, 13, 32, 35),
-                        overload_recovery_datetime=datetime(2020, 10, 19, 13, 35, 35),
+                        last_overload_datetime=parse_timestamp("20201019133235"),
+                        overload_recovery_datetime=parse_timestamp("20201019133535"),
                     ),
                 ),
                 IPv4Interface("192.168.1.3/24"): ServerContext(
@@ -72,7 +71,7 @@ class Answer3Test(TestCase):
                     OVERLOAD_TIMEOUT_THRESHOLD,
                     CONSECUTIVE_OVERLOAD_THRESHOLD,
                     RecordOverloadState(
-                        last_overload_datetime=datetime(2020, 10, 19, 13, 33, 36),
+                        last_overload_datetime=parse_timestamp("20201019133336"),
                     ),
                 ),
             },
@@ -0,0 +1,124 @@
+from util import LogRecord, format_timestamp, parse_timestamp
+from baseline import EwmaBaseline, create_baseline
+from answer3 import (
+    RecordOverloadRecorveredState,
+    RecordOverloadState,
+    detect_failure_or_overload_duration,
+    print_failure_or_overload_duration,
+)
+from pipeline import FailureOrOverloadDetector
+from contextlib import redirect_stdout
+from io import StringIO
+from ipaddress import IPv4Interface
+from unittest import TestCase
+
+FAST = IPv4Interface("10.20.30.1/16")
+SLOW = IPv4Interface("192.168.1.1/24")
+START = parse_timestamp("20201019000000")
+
+
+def make_log(fast: list[int], slow: list[int]) -> list[LogRecord]:
+    log = []
+    for i, (fast_ms, slow_ms) in enumerate(zip(fast, slow)):
+        log.append(LogRecord(START + i * 60, FAST, fast_ms))
+        log.append(LogRecord(START + i * 60 + 1, SLOW, slow_ms))
+    return log
+
+
+class EwmaBaselineTest(TestCase):
+    def test_mean_and_deviation(self):
+        baseline = EwmaBaseline(3, alpha=0.5, warmup=2)
+        self.assertIsNone(baseline.mean)
+        for response_ms in [10, 20]:
+            baseline.push(response_ms)
+        self.assertEqual(baseline.mean, 15)
+        self.assertEqual(baseline.deviation, 5)
+        self.assertFalse(baseline.above)
+
+    def test_above_is_clipped(self):
+        baseline = EwmaBaseline(3, warmup=3)
+        for response_ms in [100, 102, 98, 101]:
+            baseline.push(response_ms)
+        mean = baseline.mean
+        baseline.push(1000)
+        self.assertTrue(baseline.above)
+        # 上限に切り詰めて入れるので、外れ値1件では基準はほとんど動かない
+        self.assertLess(baseline.mean - mean, 1)
+        baseline.push(100)
+        self.assertFalse(baseline.above)
+
+    def test_level_shift(self):
+        baseline = EwmaBaseline(4)
+        for i in range(30):
+            baseline.push(5 + i % 3)
+        above = []
+        for _ in range(50):
+            baseline.push(60)
+            above.append(baseline.above)
+        self.assertTrue(all(above[:5]))
+        self.assertFalse(above[-1])
+
+    def test_invalid(self):
+        self.assertIsNone(create_baseline(None))
+        with self.assertRaises(ValueError):
+            create_baseline(0)
+        with self.assertRaises(ValueError):
+            create_baseline(3, alpha=1.5)
+
+
+class AdaptiveOverloadTest(TestCase):
+    def setUp(self):
+        fast = [5 + i % 3 for i in range(40)]
+        fast[30:33] = [60, 70, 65]
+        slow = [400 + i % 7 * 5 for i in range(40)]
+        self.log = make_log(fast, slow)
+
+    def test_per_server_baseline(self):
+        ip_context_map = detect_failure_or_overload_duration(
+            self.log, 3, 200, 3, overload_baseline_deviations=4
+        )
+        fast_state = ip_context_map[FAST].state
+        self.assertIsInstance(fast_state, RecordOverloadRecorveredState)
+        self.assertEqual(fast_state.last_overload_datetime, START + 30 * 60)
+        self.assertEqual(fast_state.overload_recovery_datetime, START + 33 * 60)
+        self.assertNotIsInstance(ip_context_map[SLOW].state, RecordOverloadState)
+        self.assertNotIsInstance(
+            ip_context_map[SLOW].state, RecordOverloadRecorveredState
+        )
+
+    def test_fixed_threshold_differs(self):
+        ip_context_map = detect_failure_or_overload_duration(self.log, 3, 200, 3)
+        self.assertNotIsInstance(
+            ip_context_map[FAST].state, RecordOverloadRecorveredState
+        )
+        self.assertIsInstance(ip_context_map[SLOW].state, RecordOverloadState)
+
+    def test_level_shift_recovers(self):
+        fast = [5 + i % 3 for i in range(20)] + [60] * 40
+        slow = [400 + i % 7 * 5 for i in range(60)]
+        ip_context_map = detect_failure_or_overload_duration(
+            make_log(fast, slow), 3, 200, 3, overload_baseline_deviations=4
+        )
+        fast_state = ip_context_map[FAST].state
+        self.assertIsInstance(fast_state, RecordOverloadRecorveredState)
+        self.assertEqual(fast_state.last_overload_datetime, START + 20 * 60)
+
+    def test_print(self):
+        with redirect_stdout(StringIO()) as f:
+            print_failure_or_overload_duration(
+                self.log[:66], 3, 200, 3, overload_baseline_deviations=4
+            )
+        self.assertEqual(
+            f.getvalue(), f"{FAST},,, {format_timestamp(START + 30 * 60)},\n"
+        )
+
+    def test_pipeline(self):
+        detector = FailureOrOverloadDetector(3, 200, 3, overload_baseline_deviations=4)
+        for record in self.log:
+            detector.push_newer_record(record)
+        self.assertEqual(
+            detector.result(),
+            detect_failure_or_overload_duration(
+                self.log, 3, 200, 3, overload_baseline_deviations=4
+            ),
+        )
@@ -0,0 +1,82 @@
+from cli import main
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from unittest import TestCase
+import json
+import subprocess
+import sys
+
+
+class CliTest(TestCase):
+    def test_answer2_text(self):
+        with redirect_stdout(StringIO()) as f:
+            main(["answer2", "-N", "1", "samplelog1.csv"])
+            captured_stdout = f.getvalue()
+        self.assertEqual(
+            captured_stdout,
+            "10.20.30.1/16, 2020-10-19T13:32:24, 2020-10-19T13:33:24\n192.168.1.1/24, 2020-10-19T13:33:34,\n",
+        )
+
+    def test_answer3_jsonl(self):
+        with redirect_stdout(StringIO()) as f:
+            main(
+                ["answer3", "-N", "3", "-t", "200", "-m", "3"]
+                + ["--format", "jsonl", "samplelog3.csv"]
+            )
+            captured_stdout = f.getvalue()
+        rows = [json.loads(line) for line in captured_stdout.splitlines()]
+        self.assertEqual(
+            rows[0],
+            {
+                "server": "10.20.30.1/16",
+                "fail": "2020-10-19T13:32:24",
+                "fail_recovery": "2020-10-19T13:35:24",
+                "overload": None,
+                "overload_recovery": None,
+            },
+        )
+        self.assertEqual(len(rows), 4)
+
+    def test_answer4_text_includes_networks(self):
+        with redirect_stdout(StringIO()) as f:
+            main(["answer4", "-N", "2", "-t", "200", "-m", "3", "samplelog4.csv"])
+            captured_stdout = f.getvalue()
+        self.assertEqual(
+            captured_stdout.splitlines()[-1],
+            "192.168.10.0/24, 2020-10-19T13:33:45,",
+        )
+
+    def test_timeout_while_overloaded(self):
+        # 10.20.30.1/16 は過負荷のままタイムアウトする
+        with redirect_stdout(StringIO()) as f:
+            main(["answer3", "-N", "3", "-t", "200", "-m", "1", "samplelog3.csv"])
+            captured_stdout = f.getvalue()
+        self.assertEqual(
+            captured_stdout.splitlines()[0],
+            "10.20.30.1/16,,, 2020-10-19T13:31:24, 2020-10-19T13:35:24",
+        )
+        with redirect_stdout(StringIO()) as f:
+            main(["answer4", "-N", "3", "-t", "200", "-m", "1", "samplelog3.csv"])
+            captured_stdout = f.getvalue()
+        self.assertEqual(captured_stdout, "192.168.1.1/24, 2020-10-19T13:33:34,\n")
+
+    def test_overload_baseline_alpha_out_of_range(self):
+        with redirect_stderr(StringIO()) as f, self.assertRaises(SystemExit):
+            main(
+                ["answer3", "-N", "3", "--overload-baseline", "3"]
+                + ["--overload-baseline-alpha", "1.5", "samplelog3.csv"]
+            )
+        self.assertIn("must be in (0, 1]: 1.5", f.getvalue())
+
+    def test_lazy_import(self):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import cli, sys; print(any(m in sys.modules for m in ['util', 'answer1', 'answer2', 'answer3', 'answer4', 'json']))",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout, "False\n")
@@ -0,0 +1,118 @@
+from util import read_log, parse_timestamp
+from dataset import LogDataset, span_from_name, span_from_content
+from cli import main
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+
+
+class SpanTest(TestCase):
+    def test_span_from_name(self):
+        self.assertEqual(
+            span_from_name("access-2020-10-19.csv"),
+            (parse_timestamp("20201019000000"), parse_timestamp("20201020000000")),
+        )
+        self.assertEqual(
+            span_from_name("20201019_13.csv"),
+            (parse_timestamp("20201019130000"), parse_timestamp("20201019140000")),
+        )
+        self.assertIsNone(span_from_name("samplelog3.csv"))
+        self.assertIsNone(span_from_name("20201019133124.csv"))
+        self.assertIsNone(span_from_name("20201399.csv"))
+
+    def test_span_from_non_log_content(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "README.txt")
+            for content in [b"notes\n", b"\xff\xfe,\n"]:
+                with open(path, "wb") as f:
+                    f.write(content)
+                self.assertIsNone(span_from_content(path))
+
+    def test_span_from_content(self):
+        self.assertEqual(
+            span_from_content("samplelog3.csv"),
+            (parse_timestamp("20201019133124"), parse_timestamp("20201019133537")),
+        )
+
+
+class LogDatasetTest(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        with open("samplelog3.csv") as f:
+            self.lines = f.read().splitlines(keepends=True)
+        os.mkdir(os.path.join(self.directory.name, "2020-10-19"))
+        self.write("2020-10-19/log-2020101913.csv", self.lines[:10])
+        self.write(
+            "2020-10-19/log-2020101914.csv",
+            [line.replace("20201019133", "20201019143", 1) for line in self.lines],
+        )
+        self.write("undated.csv", self.lines[10:])
+        # 監視ログでないファイルは読まない
+        self.write("README.txt", ["notes\n"])
+        self.dataset = LogDataset(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name: str, lines: list[str]):
+        with open(os.path.join(self.directory.name, name), "w") as f:
+            f.writelines(lines)
+
+    def test_files(self):
+        names = [
+            os.path.basename(log_file.path)
+            for log_file in self.dataset.files(
+                parse_timestamp("20201019133300"), parse_timestamp("20201019140000")
+            )
+        ]
+        self.assertEqual(names, ["log-2020101913.csv", "undated.csv"])
+
+    def test_read(self):
+        with open("samplelog3.csv") as f:
+            log = list(read_log(f))
+        records = list(
+            self.dataset.read(
+                parse_timestamp("20201019133200"), parse_timestamp("20201019143200")
+            )
+        )
+        self.assertEqual(records[: len(log) - 5], log[5:])
+        self.assertEqual(
+            [record.datetime for record in records[len(log) - 5 :]],
+            [parse_timestamp(f"2020101914312{s}") for s in "45"]
+            + [parse_timestamp(f"2020101914313{s}") for s in "456"],
+        )
+
+    def test_cli(self):
+        with redirect_stdout(StringIO()) as f:
+            main(
+                ["answer2", "-N", "3", "--until", "20201019140000"]
+                + [self.directory.name]
+            )
+            captured_stdout = f.getvalue()
+        self.assertEqual(
+            captured_stdout,
+            "10.20.30.1/16, 2020-10-19T13:32:24, 2020-10-19T13:35:24\n"
+            "192.168.1.1/24, 2020-10-19T13:33:34,\n",
+        )
+
+    def test_cli_quarantine(self):
+        quarantine = os.path.join(self.directory.name, ".rejected.tsv")
+        with redirect_stdout(StringIO()) as f, redirect_stderr(StringIO()):
+            main(
+                ["answer2", "-N", "3", "--until", "20201019140000"]
+                + ["--quarantine", quarantine, self.directory.name]
+            )
+            captured_stdout = f.getvalue()
+        self.assertEqual(
+            captured_stdout,
+            "10.20.30.1/16, 2020-10-19T13:32:24, 2020-10-19T13:35:24\n"
+            "192.168.1.1/24, 2020-10-19T13:33:34,\n",
+        )
+
+    def test_cli_invalid_time_range(self):
+        for option in ["--since", "--until"]:
+            with redirect_stderr(StringIO()) as f, self.assertRaises(SystemExit):
+                main(["answer2", "-N", "3", option, "2020-10-19", self.directory.name])
+            self.assertIn("invalid timestamp: 2020-10-19", f.getvalue())
@@ -0,0 +1,55 @@
+from util import read_log, LogRecord
+from dedup import DuplicateFilter
+from answer2 import detect_failure_duration
+from cli import main
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from ipaddress import IPv4Interface
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+
+
+class DuplicateFilterTest(TestCase):
+    def setUp(self):
+        with open("samplelog2.csv") as f:
+            self.log = list(read_log(f))
+
+    def test_merged_log(self):
+        merged = []
+        for i, record in enumerate(self.log):
+            merged.extend([record] * (1 + i % 3))
+        duplicates = DuplicateFilter()
+        self.assertEqual(list(duplicates.filter(merged)), self.log)
+        self.assertEqual(duplicates.dropped, len(merged) - len(self.log))
+        self.assertNotEqual(
+            detect_failure_duration(merged, 2), detect_failure_duration(self.log, 2)
+        )
+
+    def test_bounded(self):
+        server = IPv4Interface("10.20.30.1/16")
+        duplicates = DuplicateFilter(window=10, max_keys=4)
+        log = [LogRecord(t, server, 1) for t in range(1000)]
+        self.assertEqual(list(duplicates.filter(log + log[-3:])), log)
+        self.assertLessEqual(len(duplicates._current) + len(duplicates._previous), 8)
+        # 時間の幅より古い記録は覚えていない
+        self.assertFalse(duplicates.is_duplicate(log[0]))
+        self.assertEqual(duplicates.dropped, 3)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            DuplicateFilter(window=0)
+
+    def test_cli(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "merged.csv")
+            with open("samplelog2.csv") as f:
+                lines = [line.rstrip("\n") + "\n" for line in f]
+            with open(path, "w") as f:
+                f.writelines(line for line in lines for _ in range(2))
+            with redirect_stdout(StringIO()) as out, redirect_stderr(StringIO()) as err:
+                main(["answer2", "-N", "2", "--dedup", "60", path])
+            with redirect_stdout(StringIO()) as expected:
+                main(["answer2", "-N", "2", "samplelog2.csv"])
+        self.assertEqual(out.getvalue(), expected.getvalue())
+        self.assertEqual(err.getvalue(), f"{len(lines)} duplicate records dropped\n")
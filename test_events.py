@@ -0,0 +1,111 @@
+from util import read_log, parse_timestamp
+from events import (
+    CoalescingEventSink,
+    EventDetector,
+    StateEvent,
+    coalesce_events,
+)
+from answer3 import detect_failure_or_overload_duration
+from ipaddress import IPv4Interface, IPv4Network
+from threading import Event
+from unittest import TestCase
+import time
+
+
+class CoalesceEventsTest(TestCase):
+    def test_coalesce(self):
+        a1 = IPv4Interface("10.0.0.1/24")
+        a2 = IPv4Interface("10.0.0.2/24")
+        b1 = IPv4Interface("10.0.1.1/24")
+        network = IPv4Network("10.0.9.0/24")
+        events = [
+            StateEvent("fail", b1, 5),
+            StateEvent("fail", a2, 3),
+            StateEvent("overload", a1, 4),
+            StateEvent("fail", network, 6),
+            StateEvent("fail", a1, 2),
+        ]
+        self.assertEqual(
+            coalesce_events(events),
+            [
+                StateEvent("fail", b1, 5),
+                StateEvent("fail", IPv4Network("10.0.0.0/24"), 2, (a2, a1)),
+                StateEvent("overload", a1, 4),
+                StateEvent("fail", network, 6),
+            ],
+        )
+        self.assertEqual(coalesce_events(events, min_members=3), events)
+
+
+class CoalescingEventSinkTest(TestCase):
+    def test_storm_is_batched(self):
+        batches = []
+        servers = [IPv4Interface((0x0A000000 + i, 24)) for i in range(1, 201)]
+        with CoalescingEventSink(batches.append, window=60) as sink:
+            for i, server in enumerate(servers):
+                sink.emit(StateEvent("fail", server, 100 + i))
+        self.assertEqual(
+            batches,
+            [[StateEvent("fail", IPv4Network("10.0.0.0/24"), 100, tuple(servers))]],
+        )
+
+    def test_emit_does_not_wait_for_consumer(self):
+        release = Event()
+        batches = []
+
+        def consumer(events):
+            release.wait(5)
+            batches.append(events)
+
+        sink = CoalescingEventSink(consumer, window=0.001)
+        server = IPv4Interface("10.0.0.1/24")
+        sink.emit(StateEvent("fail", server, 1))
+        while sink._pending:
+            time.sleep(0.001)
+        for i in range(1000):
+            sink.emit(StateEvent("overload", server, i))
+        release.set()
+        sink.close()
+        self.assertEqual(sum(map(len, batches)), 1001)
+
+    def test_consumer_error_is_raised_on_close(self):
+        def consumer(events):
+            raise OSError("broken")
+
+        sink = CoalescingEventSink(consumer, window=60)
+        sink.emit(StateEvent("fail", IPv4Interface("10.0.0.1/24"), 1))
+        with self.assertRaises(OSError):
+            sink.close()
+
+
+class EventDetectorTest(TestCase):
+    def test_events(self):
+        with open("samplelog3.csv") as f:
+            log = list(read_log(f))
+        batches = []
+        with CoalescingEventSink(batches.append, window=60) as sink:
+            detector = EventDetector(3, 200, 3, sink=sink)
+            for record in log:
+                detector.push_newer_record(record)
+        self.assertEqual(
+            detector.result(), detect_failure_or_overload_duration(log, 3, 200, 3)
+        )
+        (events,) = batches
+        self.assertEqual(
+            [(event.kind, str(event.address), event.servers) for event in events],
+            [
+                ("fail", "10.20.30.1/16", ()),
+                (
+                    "overload",
+                    "192.168.1.0/24",
+                    (
+                        IPv4Interface("192.168.1.2/24"),
+                        IPv4Interface("192.168.1.3/24"),
+                    ),
+                ),
+                ("fail_recovery", "10.20.30.1/16", ()),
+                ("fail", "192.168.1.1/24", ()),
+                ("overload_recovery", "192.168.1.2/24", ()),
+            ],
+        )
+        self.assertEqual(events[0].datetime, parse_timestamp("20201019133224"))
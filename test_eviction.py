@@ -0,0 +1,98 @@
+from util import read_log, LogRecord, parse_timestamp
+from eviction import EvictingFailureOrOverloadDetector
+from sinks import FailurePeriod
+from answer3 import (
+    detect_failure_or_overload_duration,
+    RecordFailedState,
+    RecordFailRecoveredState,
+)
+from ipaddress import IPv4Interface
+from unittest import TestCase
+
+
+class EvictingFailureOrOverloadDetectorTest(TestCase):
+    def test_without_limits(self):
+        with open("samplelog3.csv") as f:
+            log = list(read_log(f))
+        detector = EvictingFailureOrOverloadDetector(3, 200, 3)
+        for record in log:
+            detector.push_newer_record(record)
+        self.assertEqual(
+            detector.result(), detect_failure_or_overload_duration(log, 3, 200, 3)
+        )
+        self.assertEqual(detector.evicted_count, 0)
+
+    def test_capacity(self):
+        with open("samplelog3.csv") as f:
+            log = list(read_log(f))
+        evicted = []
+        detector = EvictingFailureOrOverloadDetector(
+            3, 200, 3, capacity=2, on_evict=lambda ip, state: evicted.append(ip)
+        )
+        for record in log:
+            detector.push_newer_record(record)
+        self.assertGreater(detector.evicted_count, 0)
+        self.assertEqual(len(evicted), detector.evicted_count)
+        self.assertIsInstance(
+            detector.result()[IPv4Interface("192.168.1.1/24")].state,
+            RecordFailedState,
+        )
+
+    def test_ttl(self):
+        start = parse_timestamp("20201019130000")
+        failed = IPv4Interface("10.20.30.1/16")
+        recovered = IPv4Interface("10.20.30.2/16")
+        detector = EvictingFailureOrOverloadDetector(1, 200, 1, ttl=10 * 60)
+        detector.push_newer_record(LogRecord(start, failed))
+        detector.push_newer_record(LogRecord(start, recovered))
+        detector.push_newer_record(LogRecord(start + 60, recovered, 5))
+        self.assertIsInstance(
+            detector.result()[recovered].state, RecordFailRecoveredState
+        )
+        for minute in range(2, 30):
+            detector.push_newer_record(
+                LogRecord(start + minute * 60, IPv4Interface("10.20.30.3/16"), 1)
+            )
+        self.assertEqual(
+            set(detector.result()), {failed, IPv4Interface("10.20.30.3/16")}
+        )
+        self.assertEqual(detector.evicted_count, 1)
+        self.assertEqual(
+            list(detector.evicted_periods),
+            [FailurePeriod(recovered, fail=start, fail_recovery=start + 60)],
+        )
+
+    def test_capacity_filled_with_failed_servers(self):
+        start = parse_timestamp("20201019130000")
+        detector = EvictingFailureOrOverloadDetector(1, 200, 1, capacity=2)
+        for i in range(1, 4):
+            detector.push_newer_record(
+                LogRecord(start, IPv4Interface(f"10.20.30.{i}/16"))
+            )
+        self.assertEqual(len(detector.result()), 3)
+        detector.push_newer_record(
+            LogRecord(start + 60, IPv4Interface("10.20.30.1/16"), 1)
+        )
+        detector.push_newer_record(
+            LogRecord(start + 60, IPv4Interface("10.20.30.4/16"), 1)
+        )
+        self.assertEqual(
+            set(detector.result()),
+            {IPv4Interface("10.20.30.2/16"), IPv4Interface("10.20.30.3/16")},
+        )
+        self.assertEqual(len(detector.evicted_periods), 1)
+
+    def test_evicted_periods_are_bounded(self):
+        start = parse_timestamp("20201019130000")
+        detector = EvictingFailureOrOverloadDetector(
+            1, 200, 1, capacity=1, max_evicted_periods=3
+        )
+        for i in range(1, 11):
+            server = IPv4Interface(f"10.20.30.{i}/16")
+            detector.push_newer_record(LogRecord(start + i * 60, server))
+            detector.push_newer_record(LogRecord(start + i * 60 + 1, server, 1))
+        self.assertEqual(detector.evicted_period_count, 9)
+        self.assertEqual(
+            [period.address for period in detector.evicted_periods],
+            [IPv4Interface(f"10.20.30.{i}/16") for i in range(7, 10)],
+        )
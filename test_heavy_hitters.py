@@ -0,0 +1,60 @@
+from util import read_log
+from heavy_hitters import SpaceSaving, TopOffendersDetector, HeavyHitter
+from pipeline import Pipeline, FailureDetector
+from collections import Counter
+from ipaddress import IPv4Interface
+from random import Random
+from unittest import TestCase
+
+
+class SpaceSavingTest(TestCase):
+    def test_exact_under_capacity(self):
+        space_saving = SpaceSaving(10)
+        for key in "aababcabcd":
+            space_saving.add(key)
+        self.assertEqual(
+            space_saving.top(2),
+            [HeavyHitter("a", 4, 0), HeavyHitter("b", 3, 0)],
+        )
+        self.assertEqual(space_saving.max_error, 0)
+
+    def test_error_bounds(self):
+        random = Random(0)
+        keys = [int(random.paretovariate(1.2)) for _ in range(20000)]
+        exact = Counter(keys)
+        space_saving = SpaceSaving(32)
+        for key in keys:
+            space_saving.add(key)
+        self.assertLessEqual(len(space_saving._counters), 32)
+        self.assertLessEqual(len(space_saving._heap), 4 * 32)
+        self.assertLessEqual(space_saving.max_error, space_saving.total // 32)
+        for hitter in space_saving.top(5):
+            self.assertLessEqual(hitter.guaranteed_count, exact[hitter.key])
+            self.assertLessEqual(exact[hitter.key], hitter.count)
+        self.assertEqual(
+            [hitter.key for hitter in space_saving.top(3)],
+            [key for key, _ in exact.most_common(3)],
+        )
+
+
+class TopOffendersDetectorTest(TestCase):
+    def test_pipeline(self):
+        with open("samplelog3.csv") as f:
+            result = (
+                Pipeline()
+                .register("failure", FailureDetector(3))
+                .register("top", TopOffendersDetector(200, capacity=8))
+                .run(read_log(f))
+            )
+        timeout, overload_ms = result["top"]
+        self.assertEqual(
+            timeout.top(2),
+            [
+                HeavyHitter(IPv4Interface("10.20.30.1/16"), 3, 0),
+                HeavyHitter(IPv4Interface("192.168.1.1/24"), 3, 0),
+            ],
+        )
+        self.assertEqual(
+            overload_ms.top(1),
+            [HeavyHitter(IPv4Interface("192.168.1.2/24"), 452, 0)],
+        )
@@ -0,0 +1,82 @@
+from util import read_log
+from histogram import (
+    LatencyHistogram,
+    LatencyHistogramDetector,
+    merge_latency_histogram_maps,
+)
+from pipeline import Pipeline, FailureDetector
+from ipaddress import IPv4Interface
+from unittest import TestCase
+
+
+class LatencyHistogramTest(TestCase):
+    def test_value_at_percentile(self):
+        histogram = LatencyHistogram()
+        for response_ms in range(1, 1001):
+            histogram.record(response_ms)
+        histogram.record(None)
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.timeout_count, 1)
+        for percentile, exact in [(50, 500), (95, 950), (99, 990), (100, 1000)]:
+            value = histogram.value_at_percentile(percentile)
+            self.assertLessEqual(abs(value - exact), exact / 16)
+
+    def test_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for response_ms in [2, 5, 15]:
+            histogram.record(response_ms)
+        self.assertEqual(histogram.value_at_percentile(50), 5)
+        self.assertEqual(histogram.value_at_percentile(100), 15)
+
+    def test_fixed_memory(self):
+        histogram = LatencyHistogram()
+        size = len(histogram._counts)
+        for response_ms in range(0, 10**7, 997):
+            histogram.record(response_ms)
+        self.assertEqual(len(histogram._counts), size)
+        self.assertEqual(histogram.max_ms, 9999910)
+
+    def test_merge(self):
+        whole = LatencyHistogram()
+        left = LatencyHistogram()
+        right = LatencyHistogram()
+        for response_ms in range(500):
+            whole.record(response_ms)
+            (left if response_ms % 2 else right).record(response_ms)
+        left.merge(right)
+        self.assertEqual(left, whole)
+
+    def test_merge_different_settings(self):
+        with self.assertRaises(ValueError):
+            LatencyHistogram(5).merge(LatencyHistogram(6))
+
+
+class LatencyHistogramDetectorTest(TestCase):
+    def test_pipeline(self):
+        with open("samplelog3.csv") as f:
+            result = (
+                Pipeline()
+                .register("failure", FailureDetector(3))
+                .register("latency", LatencyHistogramDetector())
+                .run(read_log(f))
+            )
+        histogram = result["latency"][IPv4Interface("192.168.1.1/24")]
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.timeout_count, 3)
+        self.assertEqual(histogram.value_at_percentile(50), 10)
+
+    def test_merge_latency_histogram_maps(self):
+        detector1 = LatencyHistogramDetector()
+        detector2 = LatencyHistogramDetector()
+        with open("samplelog1.csv") as f:
+            for record in read_log(f):
+                detector1.push_newer_record(record)
+        with open("samplelog2.csv") as f:
+            for record in read_log(f):
+                detector2.push_newer_record(record)
+        merged = merge_latency_histogram_maps(detector1.result(), detector2.result())
+        ip = IPv4Interface("10.20.30.1/16")
+        self.assertEqual(
+            merged[ip].count,
+            detector1.result()[ip].count + detector2.result()[ip].count,
+        )
@@ -0,0 +1,173 @@
+from util import read_log, parse_timestamp
+from incident_store import IncidentStore, IncidentPeriod, _select_periods
+from sinks import FailurePeriod, PeriodRecorder, iter_failure_periods
+from answer4 import detect_failure_or_overload_duration
+import answer1
+import answer2
+import answer3
+from cli import main
+from ipaddress import IPv4Interface, IPv4Network
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+
+TWICE_FAILED_LOG = [
+    "20201019130000,10.20.30.1/16,5\n",
+    "20201019130100,10.20.30.1/16,-\n",
+    "20201019130200,10.20.30.1/16,-\n",
+    "20201019130300,10.20.30.1/16,7\n",
+    "20201019140000,10.20.30.1/16,-\n",
+    "20201019140100,10.20.30.1/16,-\n",
+    "20201019140200,10.20.30.1/16,6\n",
+]
+
+
+class IncidentStoreTest(TestCase):
+    def setUp(self):
+        with open("samplelog4.csv") as f:
+            ip_state_map, network_state_map = detect_failure_or_overload_duration(
+                read_log(f), 3, 200, 3
+            )
+        self.store = IncidentStore(batch_size=2)
+        self.store.write_all(iter_failure_periods(ip_state_map))
+        self.store.write_all(iter_failure_periods(network_state_map))
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_failure_periods(self):
+        self.assertEqual(
+            self.store.failure_periods(IPv4Interface("10.20.30.1/16")),
+            [
+                IncidentPeriod(
+                    IPv4Interface("10.20.30.1/16"),
+                    parse_timestamp("20201019133224"),
+                    parse_timestamp("20201019133524"),
+                )
+            ],
+        )
+        self.assertEqual(len(self.store.failure_periods()), 5)
+
+    def test_time_range(self):
+        periods = self.store.failure_periods(
+            since=parse_timestamp("20201019133530"),
+            until=parse_timestamp("20201019133600"),
+        )
+        self.assertEqual(
+            [period.address for period in periods],
+            [
+                IPv4Interface("192.168.1.1/24"),
+                IPv4Interface("192.168.10.1/24"),
+                IPv4Interface("192.168.10.2/24"),
+            ],
+        )
+        self.assertEqual(
+            self.store.overload_periods(until=parse_timestamp("20201019133300")),
+            [
+                IncidentPeriod(
+                    IPv4Interface("192.168.1.2/24"),
+                    parse_timestamp("20201019133235"),
+                    parse_timestamp("20201019133535"),
+                )
+            ],
+        )
+
+    def test_query_uses_primary_key(self):
+        plan = self.store.connection.execute(
+            "EXPLAIN QUERY PLAN "
+            + _select_periods("failure_periods", True, True, True, server=True),
+            {"address": "10.20.30.1/16", "since": 0, "until": 1},
+        ).fetchall()
+        self.assertIn(
+            "SEARCH p USING INDEX sqlite_autoindex_failure_periods_1"
+            " (server_id=? AND started_at<?)",
+            [row[3] for row in plan],
+        )
+
+    def test_network_failure_periods(self):
+        self.assertEqual(
+            self.store.network_failure_periods(),
+            [
+                IncidentPeriod(
+                    IPv4Network("192.168.10.0/24"),
+                    parse_timestamp("20201019133345"),
+                    None,
+                )
+            ],
+        )
+
+    def test_recovery_updates_open_period(self):
+        server = IPv4Interface("192.168.1.1/24")
+        fail = parse_timestamp("20201019133334")
+        recovery = parse_timestamp("20201019140000")
+        self.store.write_all([FailurePeriod(server, fail, recovery)])
+        self.store.write_all([FailurePeriod(server, fail)])
+        self.assertEqual(
+            self.store.failure_periods(server),
+            [IncidentPeriod(server, fail, recovery)],
+        )
+
+
+class PeriodRecorderTest(TestCase):
+    def test_every_closed_period_is_stored(self):
+        server = IPv4Interface("10.20.30.1/16")
+        expected = [
+            IncidentPeriod(
+                server,
+                parse_timestamp("20201019130100"),
+                parse_timestamp("20201019130300"),
+            ),
+            IncidentPeriod(
+                server,
+                parse_timestamp("20201019140000"),
+                parse_timestamp("20201019140200"),
+            ),
+        ]
+        detectors = [
+            lambda log, on_transition: answer1.detect_failure_duration(
+                log, on_transition
+            ),
+            lambda log, on_transition: answer2.detect_failure_duration(
+                log, 2, on_transition
+            ),
+            lambda log, on_transition: answer3.detect_failure_or_overload_duration(
+                log, 2, 200, 2, on_transition=on_transition
+            ),
+            lambda log, on_transition: detect_failure_or_overload_duration(
+                log, 2, 200, 2, on_transition
+            )[0],
+        ]
+        for detect in detectors:
+            store = IncidentStore()
+            contexts = detect(read_log(TWICE_FAILED_LOG), PeriodRecorder(store.write))
+            self.assertEqual(len(contexts), 1)
+            self.assertEqual(store.failure_periods(server), expected)
+            store.close()
+
+
+class IncidentStoreCliTest(TestCase):
+    def test_store(self):
+        with TemporaryDirectory() as directory:
+            database = os.path.join(directory, "incidents.sqlite3")
+            main(
+                ["answer3", "-N", "3", "-t", "200", "-m", "3"]
+                + ["--store", database, "samplelog3.csv"]
+            )
+            store = IncidentStore(database)
+            self.assertEqual(len(store.failure_periods()), 2)
+            self.assertEqual(len(store.overload_periods()), 2)
+            store.close()
+
+    def test_store_keeps_earlier_periods(self):
+        with TemporaryDirectory() as directory:
+            log = os.path.join(directory, "log.csv")
+            with open(log, "w") as f:
+                f.writelines(TWICE_FAILED_LOG)
+            database = os.path.join(directory, "incidents.sqlite3")
+            main(["answer2", "-N", "2", "--store", database, log])
+            store = IncidentStore(database)
+            self.assertEqual(
+                [period.start for period in store.failure_periods()],
+                [parse_timestamp("20201019130100"), parse_timestamp("20201019140000")],
+            )
+            store.close()
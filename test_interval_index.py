@@ -0,0 +1,124 @@
+from util import read_log, parse_timestamp
+from interval_index import IntervalIndex, StateIndex, HEALTHY, FAILED, OVERLOADED
+from incident_store import IncidentStore
+from sinks import PeriodRecorder, iter_failure_periods
+from answer4 import detect_failure_or_overload_duration
+from answer2 import detect_failure_duration
+from ipaddress import IPv4Interface, IPv4Network
+from unittest import TestCase
+
+
+class IntervalIndexTest(TestCase):
+    def test_find_and_overlapping(self):
+        index = IntervalIndex()
+        index.add(30, 40)
+        index.add(10, 20)
+        index.add(50, None)
+        self.assertEqual(index.starts, [10, 30, 50])
+        self.assertIsNone(index.find(5))
+        self.assertEqual(index.find(10), (10, 20))
+        self.assertIsNone(index.find(20))
+        self.assertEqual(index.find(1000), (50, None))
+        self.assertEqual(index.overlapping(15, 35), [(10, 20), (30, 40)])
+        self.assertEqual(index.overlapping(20, 30), [])
+        self.assertEqual(index.overlapping(45, 60), [(50, None)])
+
+    def test_update_open_period(self):
+        index = IntervalIndex()
+        index.add(10, None)
+        index.add(10, 20)
+        self.assertEqual((index.starts, index.ends), ([10], [20]))
+
+    def test_close_open_period(self):
+        index = IntervalIndex()
+        index.add(10, None)
+        index.add(30, 40)
+        self.assertEqual((index.starts, index.ends), ([10, 30], [30, 40]))
+        self.assertIsNone(index.find(50))
+        self.assertEqual(index.find(35), (30, 40))
+        self.assertEqual(index.find(20), (10, 30))
+        index.add(5, None)
+        self.assertEqual(index.ends, [10, 30, 40])
+        self.assertEqual(index.overlapping(0, 100), [(5, 10), (10, 30), (30, 40)])
+
+
+class StateIndexTest(TestCase):
+    def setUp(self):
+        with open("samplelog4.csv") as f:
+            ip_state_map, network_state_map = detect_failure_or_overload_duration(
+                read_log(f), 3, 200, 3
+            )
+        self.periods = list(iter_failure_periods(ip_state_map)) + list(
+            iter_failure_periods(network_state_map)
+        )
+
+    def test_state_at(self):
+        index = StateIndex()
+        index.add_periods(self.periods)
+        server = IPv4Interface("10.20.30.1/16")
+        self.assertEqual(
+            index.state_at(server, parse_timestamp("20201019133000")), HEALTHY
+        )
+        self.assertEqual(
+            index.state_at(server, parse_timestamp("20201019133300")), FAILED
+        )
+        self.assertEqual(
+            index.state_at(server, parse_timestamp("20201019133524")), HEALTHY
+        )
+        self.assertEqual(
+            index.state_at(
+                IPv4Interface("192.168.1.2/24"), parse_timestamp("20201019133400")
+            ),
+            OVERLOADED,
+        )
+        self.assertEqual(
+            index.state_at(
+                IPv4Network("192.168.10.0/24"), parse_timestamp("20201019140000")
+            ),
+            FAILED,
+        )
+
+    def test_fed_as_periods_close(self):
+        with open("samplelog2.csv") as f:
+            lines = [line.rstrip("\n") + "\n" for line in f]
+        # 同じ記録を1時間後にもう一度流し、最初の故障期間を閉じた期間として残す
+        later = [f"{int(line[:14]) + 10000},{line[15:]}" for line in lines]
+        index = StateIndex()
+        store = IncidentStore()
+        contexts = detect_failure_duration(
+            read_log(lines + later), 2, PeriodRecorder(index.add_period, store.write)
+        )
+        server = IPv4Interface("10.20.30.1/16")
+        inside_first = parse_timestamp("20201019133300")
+        self.assertEqual(index.state_at(server, inside_first), FAILED)
+        self.assertEqual(
+            index.state_at(server, parse_timestamp("20201019143300")), FAILED
+        )
+        index.add_periods(
+            iter_failure_periods({ip: c.state for ip, c in contexts.items()})
+        )
+        self.assertEqual(index.state_at(server, inside_first), FAILED)
+        self.assertEqual(
+            StateIndex.from_store(store).state_at(server, inside_first), FAILED
+        )
+        store.close()
+
+    def test_from_store(self):
+        store = IncidentStore()
+        store.write_all(self.periods)
+        index = StateIndex.from_store(store)
+        store.close()
+        self.assertEqual(
+            index.periods_between(
+                IPv4Interface("192.168.1.2/24"),
+                parse_timestamp("20201019133000"),
+                parse_timestamp("20201019140000"),
+            ),
+            [
+                (
+                    OVERLOADED,
+                    parse_timestamp("20201019133235"),
+                    parse_timestamp("20201019133535"),
+                )
+            ],
+        )
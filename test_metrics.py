@@ -0,0 +1,101 @@
+from util import read_log, parse_timestamp
+from metrics import (
+    CONTENT_TYPE,
+    MetricsRegistry,
+    InstrumentedFailureOrOverloadDetector,
+    serve_metrics,
+)
+from answer3 import detect_failure_or_overload_duration
+from unittest import TestCase
+from urllib.request import urlopen
+
+
+class MetricsRegistryTest(TestCase):
+    def test_exposition(self):
+        registry = MetricsRegistry()
+        registry.counter("records", "Records.").inc(3)
+        gauge = registry.gauge("servers", "Servers.", ("state",))
+        gauge.inc(2, "healthy")
+        gauge.set(1, 'fa"iled')
+        registry.gauge("depth", "Depth.").set_function(lambda: 7)
+        self.assertEqual(
+            registry.exposition(),
+            "# TYPE records counter\n# HELP records Records.\nrecords_total 3\n"
+            "# TYPE servers gauge\n# HELP servers Servers.\n"
+            'servers{state="healthy"} 2\nservers{state="fa\\"iled"} 1\n'
+            "# TYPE depth gauge\n# HELP depth Depth.\ndepth 7\n# EOF\n",
+        )
+        with self.assertRaises(ValueError):
+            registry.gauge("depth", "Depth.")
+
+
+class InstrumentedDetectorTest(TestCase):
+    def setUp(self):
+        with open("samplelog3.csv") as f:
+            self.log = list(read_log(f))
+        self.detector = InstrumentedFailureOrOverloadDetector(
+            3, 200, 3, clock=lambda: parse_timestamp("20201019133600")
+        )
+        for record in self.log:
+            self.detector.push_newer_record(record)
+
+    def test_metrics(self):
+        self.assertEqual(
+            self.detector.result(),
+            detect_failure_or_overload_duration(self.log, 3, 200, 3),
+        )
+        registry = self.detector.registry
+        self.assertEqual(registry.metric("monitor_records").get(), 25)
+        self.assertEqual(registry.metric("monitor_parse_lag_seconds").get(), 24)
+        servers = registry.metric("monitor_servers")
+        self.assertEqual(
+            {
+                state: servers.get(state)
+                for state in [
+                    "healthy",
+                    "failed",
+                    "recovered",
+                    "overload",
+                    "overload_recovered",
+                ]
+            },
+            {
+                "healthy": 1,
+                "failed": 1,
+                "recovered": 1,
+                "overload": 1,
+                "overload_recovered": 1,
+            },
+        )
+        self.assertEqual(
+            registry.metric("monitor_network_failed_servers").get("192.168.1.0/24"),
+            1,
+        )
+
+    def test_parse_lag_with_utc_offset(self):
+        # 日本時間の監視ログを UTC の時計で処理する
+        detector = InstrumentedFailureOrOverloadDetector(
+            3,
+            200,
+            3,
+            clock=lambda: parse_timestamp("20201019043600"),
+            utc_offset=9 * 3600,
+        )
+        for record in self.log:
+            detector.push_newer_record(record)
+        self.assertEqual(
+            detector.registry.metric("monitor_parse_lag_seconds").get(), 24
+        )
+
+    def test_serve(self):
+        server = serve_metrics(self.detector.registry)
+        try:
+            host, port = server.server_address
+            with urlopen(f"http://{host}:{port}/metrics") as response:
+                self.assertEqual(response.headers["Content-Type"], CONTENT_TYPE)
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn("monitor_records_total 25\n", body)
+        self.assertTrue(body.endswith("# EOF\n"))
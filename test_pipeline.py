@@ -0,0 +1,43 @@
+from util import read_log
+from pipeline import (
+    Pipeline,
+    FailureDetector,
+    FailureOrOverloadDetector,
+    NetworkFailureDetector,
+)
+import answer2
+import answer3
+import answer4
+from unittest import TestCase
+
+
+class PipelineTest(TestCase):
+    def test_run(self):
+        with open("samplelog4.csv") as f:
+            expected_log = list(read_log(f))
+        pipeline = (
+            Pipeline()
+            .register("failure", FailureDetector(3))
+            .register("overload", FailureOrOverloadDetector(3, 200, 3))
+            .register("network", NetworkFailureDetector(3, 200, 3))
+        )
+        with open("samplelog4.csv") as f:
+            result = pipeline.run(read_log(f))
+        self.maxDiff = None
+        self.assertEqual(
+            result,
+            {
+                "failure": answer2.detect_failure_duration(expected_log, 3),
+                "overload": answer3.detect_failure_or_overload_duration(
+                    expected_log, 3, 200, 3
+                ),
+                "network": answer4.detect_failure_or_overload_duration(
+                    expected_log, 3, 200, 3
+                ),
+            },
+        )
+
+    def test_register_duplicated_name(self):
+        pipeline = Pipeline().register("failure", FailureDetector(3))
+        with self.assertRaises(ValueError):
+            pipeline.register("failure", FailureDetector(2))
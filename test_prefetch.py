@@ -0,0 +1,36 @@
+from util import read_log
+from prefetch import iter_lines_prefetched, read_log_prefetched
+from io import BytesIO
+from threading import active_count
+from unittest import TestCase
+
+
+class BrokenFile(BytesIO):
+    def read(self, size=-1):
+        raise OSError("broken")
+
+
+class PrefetchTest(TestCase):
+    def test_read_log_prefetched(self):
+        with open("samplelog4.csv") as f:
+            expected = list(read_log(f))
+        with open("samplelog4.csv", "rb") as f:
+            self.assertEqual(list(read_log_prefetched(f, buffer_size=7)), expected)
+
+    def test_multibyte_split_across_buffers(self):
+        f = BytesIO("あい\nう\nえお".encode())
+        self.assertEqual(
+            list(iter_lines_prefetched(f, buffer_size=1, max_buffers=1)),
+            ["あい\n", "う\n", "えお"],
+        )
+
+    def test_error_is_raised_in_caller(self):
+        with self.assertRaises(OSError):
+            list(iter_lines_prefetched(BrokenFile()))
+
+    def test_stop_early(self):
+        threads = active_count()
+        lines = iter_lines_prefetched(BytesIO(b"a\n" * 10000), buffer_size=2)
+        self.assertEqual(next(lines), "a\n")
+        lines.close()
+        self.assertEqual(active_count(), threads)
@@ -0,0 +1,66 @@
+from util import read_log, LogRecord, parse_timestamp
+from probe_history import ProbeHistory, ProbeSeries
+from ipaddress import IPv4Interface
+from unittest import TestCase
+
+
+class ProbeSeriesTest(TestCase):
+    def test_round_trip(self):
+        start = parse_timestamp("20201019000000")
+        probes = [
+            (start + i * 60 + i % 3, None if i % 50 == 7 else 100 + i % 13 * 7)
+            for i in range(5000)
+        ]
+        series = ProbeSeries(block_size=256)
+        for timestamp, response_ms in probes:
+            series.append(timestamp, response_ms)
+        self.assertEqual(len(series), len(probes))
+        self.assertEqual(list(series.between()), probes)
+        self.assertLess(series.nbytes / len(probes), 4)
+        since, until = probes[1000][0], probes[1300][0]
+        self.assertEqual(list(series.between(since, until)), probes[1000:1300])
+
+    def test_negative_and_large_values(self):
+        series = ProbeSeries(block_size=2)
+        probes = [(100, 5), (90, 100000), (200, 0), (10**10, None), (10**10 + 1, 1)]
+        for timestamp, response_ms in probes:
+            series.append(timestamp, response_ms)
+        self.assertEqual(list(series.between()), probes)
+
+
+class ProbeHistoryTest(TestCase):
+    def test_records(self):
+        with open("samplelog3.csv") as f:
+            log = list(read_log(f))
+        history = ProbeHistory()
+        for record in log:
+            history.push_newer_record(record)
+        server = IPv4Interface("10.20.30.1/16")
+        self.assertEqual(
+            list(history.records(server)),
+            [record for record in log if record.ipv4interface == server],
+        )
+        self.assertEqual(
+            list(
+                history.records(
+                    server,
+                    parse_timestamp("20201019133224"),
+                    parse_timestamp("20201019133424"),
+                )
+            ),
+            [
+                LogRecord(parse_timestamp("20201019133224"), server, None),
+                LogRecord(parse_timestamp("20201019133324"), server, None),
+            ],
+        )
+        self.assertEqual(list(history.records(IPv4Interface("10.0.0.1/8"))), [])
+
+    def test_retention(self):
+        server = IPv4Interface("10.20.30.1/16")
+        history = ProbeHistory(retention=600, block_size=4)
+        for minute in range(60):
+            history.push_newer_record(LogRecord(minute * 60, server, 1))
+        timestamps = [record.datetime for record in history.records(server)]
+        self.assertLessEqual(len(timestamps), 20)
+        self.assertEqual(timestamps[-1], 59 * 60)
+        self.assertLessEqual(timestamps[0], 59 * 60 - 600)
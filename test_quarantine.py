@@ -0,0 +1,79 @@
+from util import read_log
+from quarantine import LenientLogReader
+from cli import main
+from contextlib import redirect_stderr, redirect_stdout
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+
+
+class LenientLogReaderTest(TestCase):
+    def test_same_records_as_read_log(self):
+        with open("samplelog4.csv") as f:
+            expected = list(read_log(f))
+        reader = LenientLogReader()
+        with open("samplelog4.csv", "rb") as f:
+            self.assertEqual(list(reader.read(f)), expected)
+        self.assertEqual((reader.records, reader.rejected), (len(expected), 0))
+
+    def test_quarantine(self):
+        lines = [
+            b"20201019133124,10.20.30.1/16,2\n",
+            b"20201019133125,10.20.3\n",
+            b"20201019133126,10.20.30.x/16,3\n",
+            b"20201019133127,10.20.30.1/16,fast\n",
+            b"2020101913312,10.20.30.1/16,4\n",
+            b"20201019246000,10.20.30.1/16,4\n",
+            b"\xff\xfe\n",
+            b"\n",
+            b'"20201019133128","10.20.30.1/16","-"\r\n',
+        ]
+        quarantine = StringIO()
+        reader = LenientLogReader(quarantine)
+        records = list(reader.read(BytesIO(b"".join(lines)), "log.csv"))
+        with BytesIO(b"".join(lines[:1] + lines[-1:])) as f:
+            valid = [line.decode() for line in f]
+        self.assertEqual(records, list(read_log(valid)))
+        offsets = [sum(map(len, lines[:i])) for i in range(len(lines))]
+        self.assertEqual(
+            quarantine.getvalue().splitlines(),
+            [
+                f"log.csv\t{offsets[1]}\tfield_count\t20201019133125,10.20.3",
+                f"log.csv\t{offsets[2]}\tipv4interface\t20201019133126,10.20.30.x/16,3",
+                f"log.csv\t{offsets[3]}\tresponse_ms\t20201019133127,10.20.30.1/16,fast",
+                f"log.csv\t{offsets[4]}\tdatetime\t2020101913312,10.20.30.1/16,4",
+                f"log.csv\t{offsets[5]}\tdatetime\t20201019246000,10.20.30.1/16,4",
+                f"log.csv\t{offsets[6]}\tencoding\t\\xff\\xfe",
+            ],
+        )
+        self.assertEqual(
+            reader.summary(),
+            "2 records, 6 rejected "
+            "(datetime: 2, encoding: 1, field_count: 1, ipv4interface: 1, response_ms: 1)",
+        )
+
+    def test_cli(self):
+        with TemporaryDirectory() as directory:
+            log = os.path.join(directory, "log.csv")
+            other = os.path.join(directory, "other.csv")
+            quarantine = os.path.join(directory, "rejected.tsv")
+            with open("samplelog1.csv", "rb") as f:
+                content = f.read()
+            with open(log, "wb") as f:
+                f.write(b"garbage\n" + content)
+            with open(other, "wb") as f:
+                f.write(b"garbage\n")
+            with redirect_stdout(StringIO()) as out, redirect_stderr(StringIO()) as err:
+                main(["answer2", "-N", "1", "--quarantine", quarantine, log, other])
+            with redirect_stdout(StringIO()) as expected:
+                main(["answer2", "-N", "1", "samplelog1.csv"])
+            self.assertEqual(out.getvalue(), expected.getvalue())
+            self.assertIn("2 rejected (field_count: 2)", err.getvalue())
+            # バイト位置はファイルごとに0から数えるので、ファイル名で区別する
+            with open(quarantine) as f:
+                self.assertEqual(
+                    f.read(),
+                    f"{log}\t0\tfield_count\tgarbage\n"
+                    f"{other}\t0\tfield_count\tgarbage\n",
+                )
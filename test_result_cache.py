@@ -0,0 +1,93 @@
+from util import read_log
+from pipeline import FailureOrOverloadDetector
+from result_cache import ResultCache, fingerprint
+from answer3 import detect_failure_or_overload_duration
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+import shutil
+
+
+class ResultCacheTest(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "log.csv")
+        self.cache = ResultCache(
+            os.path.join(self.directory.name, "cache"), sample_size=64
+        )
+        with open("samplelog3.csv") as f:
+            self.lines = f.read().splitlines(keepends=True)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_log(self, lines: list[str], mode: str = "w"):
+        with open(self.path, mode) as f:
+            f.writelines(lines)
+
+    def expected(self):
+        with open(self.path) as f:
+            return detect_failure_or_overload_duration(read_log(f), 3, 200, 3)
+
+    def test_hit(self):
+        shutil.copy("samplelog3.csv", self.path)
+        first = self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        second = self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.assertEqual((self.cache.misses, self.cache.hits), (1, 1))
+        self.assertEqual(first, self.expected())
+        self.assertEqual(second, self.expected())
+
+    def test_different_thresholds(self):
+        shutil.copy("samplelog3.csv", self.path)
+        self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.cache.run(self.path, FailureOrOverloadDetector(2, 200, 3))
+        self.assertEqual((self.cache.misses, self.cache.hits), (2, 0))
+
+    def test_resume_appended(self):
+        self.write_log(self.lines[:12])
+        self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.write_log(self.lines[12:], "a")
+        result = self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.assertEqual(self.cache.resumes, 1)
+        self.assertEqual(result, self.expected())
+
+    def test_resume_after_partial_line(self):
+        content = "".join(self.lines)
+        cut = content.index("483") + 2
+        self.write_log([content[:cut]])
+        self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.write_log([content[cut:]], "a")
+        result = self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.assertEqual(self.cache.resumes, 1)
+        self.assertEqual(result, self.expected())
+
+    def test_resume_small_file(self):
+        cache = ResultCache(os.path.join(self.directory.name, "default"))
+        self.write_log(self.lines[:12])
+        cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.write_log(self.lines[12:], "a")
+        result = cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.assertEqual(cache.resumes, 1)
+        self.assertEqual(result, self.expected())
+
+    def test_rewritten(self):
+        self.write_log(self.lines[:12])
+        self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.write_log(self.lines[:11] + self.lines[12:])
+        result = self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.assertEqual((self.cache.misses, self.cache.resumes), (2, 0))
+        self.assertEqual(result, self.expected())
+
+    def test_evict(self):
+        shutil.copy("samplelog3.csv", self.path)
+        self.cache.max_bytes = 0
+        self.cache.run(self.path, FailureOrOverloadDetector(3, 200, 3))
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+    def test_fingerprint(self):
+        shutil.copy("samplelog3.csv", self.path)
+        before = fingerprint(self.path, 64)
+        self.write_log(self.lines[:1], "a")
+        after = fingerprint(self.path, 64)
+        self.assertEqual(before.head_hash, after.head_hash)
+        self.assertNotEqual(before.tail_hash, after.tail_hash)
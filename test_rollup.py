@@ -0,0 +1,69 @@
+from util import read_log, parse_timestamp
+from rollup import (
+    RollupDetector,
+    RollupRow,
+    ListRollupWriter,
+    CsvRollupWriter,
+)
+from ipaddress import IPv4Interface, IPv4Network
+from io import StringIO
+from unittest import TestCase
+
+
+class RollupDetectorTest(TestCase):
+    def test_finest_rows(self):
+        detector = RollupDetector()
+        with open("samplelog4.csv") as f:
+            for record in read_log(f):
+                detector.push_newer_record(record)
+        rows = detector.result().rows
+        minute_rows = [row for row in rows if row.resolution == 60]
+        self.assertEqual(len(minute_rows), 5 * (7 + 3))
+        self.assertIn(
+            RollupRow(
+                resolution=60,
+                start=parse_timestamp("20201019133200"),
+                key=IPv4Network("192.168.10.0/24"),
+                count=2,
+                timeout_count=0,
+                min_ms=320,
+                mean_ms=415.5,
+                max_ms=511,
+                p99_ms=511,
+            ),
+            minute_rows,
+        )
+
+    def test_coarser_rows_match_direct_aggregation(self):
+        detector = RollupDetector()
+        direct = RollupDetector(ListRollupWriter(), (5 * 60, 60 * 60))
+        with open("samplelog4.csv") as f:
+            for record in read_log(f):
+                detector.push_newer_record(record)
+                direct.push_newer_record(record)
+        coarse_rows = [row for row in detector.result().rows if row.resolution != 60]
+        self.assertEqual(coarse_rows, direct.result().rows)
+        hour_rows = [row for row in coarse_rows if row.resolution == 60 * 60]
+        self.assertEqual(len(hour_rows), 7 + 3)
+        server_row = next(
+            row for row in hour_rows if row.key == IPv4Interface("10.20.30.1/16")
+        )
+        self.assertEqual((server_row.count, server_row.timeout_count), (2, 3))
+
+    def test_csv_writer_writes_incrementally(self):
+        f = StringIO()
+        detector = RollupDetector(CsvRollupWriter(f))
+        with open("samplelog1.csv") as log:
+            records = list(read_log(log))
+        for record in records[:4]:
+            detector.push_newer_record(record)
+        self.assertEqual(
+            f.getvalue().splitlines()[0],
+            "1m,20201019133100,10.20.30.1/16,1,0,522,522.000,522,522",
+        )
+        detector.result()
+        self.assertTrue(f.getvalue().splitlines()[-1].startswith("1h,20201019130000,"))
+
+    def test_invalid_resolutions(self):
+        with self.assertRaises(ValueError):
+            RollupDetector(resolutions=(2 * 60, 5 * 60))
@@ -0,0 +1,71 @@
+from util import read_log
+from shared_ring import SharedRingBuffer, write_log_file
+from answer3 import detect_failure_or_overload_duration
+from multiprocessing import Process
+from multiprocessing.shared_memory import SharedMemory
+from subprocess import run
+from unittest import TestCase
+import sys
+
+
+class SharedRingBufferTest(TestCase):
+    def setUp(self):
+        self.ring = SharedRingBuffer.create(capacity=4)
+
+    def tearDown(self):
+        self.ring.close()
+        self.ring.unlink()
+
+    def test_round_trip(self):
+        with open("samplelog.csv") as f:
+            log = list(read_log(f))
+        self.ring.write(log[:4])
+        reader = SharedRingBuffer.attach(self.ring.name)
+        records = reader.read()
+        self.assertEqual([next(records) for _ in range(4)], log[:4])
+        self.ring.write(log[4:])
+        self.ring.close_writer()
+        self.assertEqual(list(records), log[4:])
+        reader.close()
+
+    def test_writer_does_not_wait_forever(self):
+        with open("samplelog.csv") as f:
+            log = list(read_log(f))
+        self.ring.write(log[:4])
+        with self.assertRaises(TimeoutError):
+            self.ring.write(log[4:], timeout=0.01)
+        self.ring.close_reader()
+        with self.assertRaises(BrokenPipeError):
+            self.ring.write(log[4:])
+
+    def test_between_processes(self):
+        process = Process(
+            target=write_log_file, args=(self.ring.name, "samplelog3.csv")
+        )
+        process.start()
+        ip_context_map = detect_failure_or_overload_duration(
+            self.ring.read(), 3, 200, 3
+        )
+        process.join()
+        with open("samplelog3.csv") as f:
+            self.assertEqual(
+                ip_context_map,
+                detect_failure_or_overload_duration(read_log(f), 3, 200, 3),
+            )
+
+    def test_attached_process_does_not_unlink(self):
+        # 別の resource_tracker を持つプロセスがつないで終了しても、共有メモリは残る
+        run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from multiprocessing import resource_tracker; "
+                "from shared_ring import SharedRingBuffer; "
+                "SharedRingBuffer.attach(sys.argv[1]).close(); "
+                # resource_tracker の後始末が終わるまで待つ
+                "resource_tracker._resource_tracker._stop()",
+                self.ring.name,
+            ],
+            check=True,
+        )
+        SharedMemory(name=self.ring.name).close()
@@ -0,0 +1,92 @@
+from util import read_log, parse_timestamp
+from sinks import (
+    FailurePeriod,
+    CsvResultSink,
+    JsonLinesResultSink,
+    BinaryResultSink,
+    iter_failure_periods,
+    sort_failure_periods,
+    read_binary_failure_periods,
+)
+from answer3 import detect_failure_or_overload_duration
+from answer4 import detect_failure_or_overload_duration as detect_network_failure
+from ipaddress import IPv4Interface, IPv4Network
+from io import BytesIO, StringIO
+from unittest import TestCase
+import json
+
+
+class CountingStringIO(StringIO):
+    writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+class SinksTest(TestCase):
+    def setUp(self):
+        with open("samplelog3.csv") as f:
+            contexts = detect_failure_or_overload_duration(read_log(f), 3, 200, 3)
+        self.state_map = {ip: context.state for ip, context in contexts.items()}
+
+    def test_iter_failure_periods(self):
+        self.assertEqual(
+            list(iter_failure_periods(self.state_map))[:2],
+            [
+                FailurePeriod(
+                    IPv4Interface("10.20.30.1/16"),
+                    fail=parse_timestamp("20201019133224"),
+                    fail_recovery=parse_timestamp("20201019133524"),
+                ),
+                FailurePeriod(
+                    IPv4Interface("192.168.1.1/24"),
+                    fail=parse_timestamp("20201019133334"),
+                ),
+            ],
+        )
+
+    def test_csv(self):
+        f = StringIO()
+        CsvResultSink(f).write_all(iter_failure_periods(self.state_map))
+        self.assertEqual(
+            f.getvalue(),
+            "10.20.30.1/16,2020-10-19T13:32:24,2020-10-19T13:35:24,,\n"
+            "192.168.1.1/24,2020-10-19T13:33:34,,,\n"
+            "192.168.1.2/24,,,2020-10-19T13:32:35,2020-10-19T13:35:35\n"
+            "192.168.1.3/24,,,2020-10-19T13:33:36,\n",
+        )
+
+    def test_jsonl_sorted_by_time(self):
+        f = StringIO()
+        periods = sort_failure_periods(iter_failure_periods(self.state_map), "time")
+        JsonLinesResultSink(f).write_all(periods)
+        rows = [json.loads(line) for line in f.getvalue().splitlines()]
+        self.assertEqual(
+            [row["server"] for row in rows],
+            ["10.20.30.1/16", "192.168.1.2/24", "192.168.1.1/24", "192.168.1.3/24"],
+        )
+
+    def test_buffered_writes(self):
+        f = CountingStringIO()
+        periods = list(iter_failure_periods(self.state_map)) * 25
+        CsvResultSink(f, buffer_size=1000).write_all(periods)
+        self.assertLessEqual(f.writes, 6)
+        self.assertEqual(len(f.getvalue().splitlines()), len(periods))
+
+    def test_binary_round_trip(self):
+        with open("samplelog4.csv") as f:
+            ip_state_map, network_state_map = detect_network_failure(
+                read_log(f), 3, 200, 3
+            )
+        periods = list(iter_failure_periods(ip_state_map)) + list(
+            iter_failure_periods(network_state_map)
+        )
+        f = BytesIO()
+        BinaryResultSink(f).write_all(sort_failure_periods(periods, "server"))
+        f.seek(0)
+        self.assertEqual(
+            list(read_binary_failure_periods(f, buffer_size=1)),
+            sort_failure_periods(periods, "server"),
+        )
+        self.assertIn(IPv4Network("192.168.10.0/24"), [p.address for p in periods])
@@ -0,0 +1,76 @@
+from util import read_log, parse_timestamp
+from sliding_window import WindowAverage, WindowMax, create_sliding_window
+from answer3 import (
+    RecordOverloadState,
+    RecordOverloadRecorveredState,
+    detect_failure_or_overload_duration,
+)
+from ipaddress import IPv4Interface
+from unittest import TestCase
+
+
+class SlidingWindowTest(TestCase):
+    def test_average(self):
+        window = WindowAverage(10)
+        self.assertIsNone(window.value)
+        window.push(0, 100)
+        window.push(5, 300)
+        self.assertEqual(window.value, 200)
+        window.push(10, 500)
+        self.assertEqual(window.value, 400)
+
+    def test_max(self):
+        window = WindowMax(10)
+        window.push(0, 500)
+        window.push(5, 100)
+        window.push(6, 300)
+        self.assertEqual(window.value, 500)
+        window.push(10, 200)
+        self.assertEqual(window.value, 300)
+        window.push(17, 50)
+        self.assertEqual(window.value, 200)
+
+    def test_create(self):
+        self.assertIsNone(create_sliding_window(None))
+        self.assertIsInstance(create_sliding_window(60, "max"), WindowMax)
+        with self.assertRaises(ValueError):
+            create_sliding_window(60, "median")
+        with self.assertRaises(ValueError):
+            create_sliding_window(0)
+
+
+class WindowOverloadTest(TestCase):
+    def detect(self, aggregate: str):
+        with open("samplelog3.csv") as f:
+            return detect_failure_or_overload_duration(
+                read_log(f), 3, 200, 3, 120, aggregate
+            )
+
+    def test_average(self):
+        ip_context_map = self.detect("average")
+        self.assertEqual(
+            ip_context_map[IPv4Interface("192.168.1.2/24")].state,
+            RecordOverloadState(
+                last_overload_datetime=parse_timestamp("20201019133235")
+            ),
+        )
+        self.assertEqual(
+            ip_context_map[IPv4Interface("192.168.1.3/24")].state,
+            RecordOverloadState(
+                last_overload_datetime=parse_timestamp("20201019133436")
+            ),
+        )
+        state = ip_context_map[IPv4Interface("10.20.30.1/16")].state
+        self.assertIsInstance(state, RecordOverloadRecorveredState)
+        self.assertEqual(
+            state.overload_recovery_datetime, parse_timestamp("20201019133524")
+        )
+
+    def test_max(self):
+        ip_context_map = self.detect("max")
+        self.assertEqual(
+            ip_context_map[IPv4Interface("192.168.1.3/24")].state,
+            RecordOverloadState(
+                last_overload_datetime=parse_timestamp("20201019133336")
+            ),
+        )
@@ -0,0 +1,91 @@
+from util import read_log
+from subnet_columns import NetworkSummary, ServerColumns
+from answer4 import calc_failure_or_overload, group_by_ip_network, summarize_networks
+from histogram import LatencyHistogramDetector
+from ipaddress import IPv4Interface, IPv4Network
+from unittest import TestCase
+
+
+class ServerColumnsTest(TestCase):
+    def test_groups_match_network(self):
+        servers = [
+            IPv4Interface("10.20.30.1/16"),
+            IPv4Interface("192.168.1.1/24"),
+            IPv4Interface("10.20.0.9/16"),
+            IPv4Interface("10.20.30.1/24"),
+            IPv4Interface("0.0.0.1/0"),
+            IPv4Interface("255.255.255.255/32"),
+        ]
+        columns = ServerColumns.from_interfaces(servers)
+        groups = {
+            columns.network(key): [servers[row] for row in rows]
+            for key, rows in columns.groups().items()
+        }
+        expected: dict[IPv4Network, list[IPv4Interface]] = {}
+        for server in servers:
+            expected.setdefault(server.network, []).append(server)
+        self.assertEqual(groups, expected)
+        self.assertEqual(list(groups), list(expected))
+
+    def test_summarize(self):
+        servers = [
+            IPv4Interface("10.0.0.1/24"),
+            IPv4Interface("10.0.0.2/24"),
+            IPv4Interface("10.0.1.1/24"),
+        ]
+        columns = ServerColumns.from_interfaces(servers)
+        self.assertEqual(
+            columns.summarize([True, False, False], [30, None, 5]),
+            [
+                NetworkSummary(IPv4Network("10.0.0.0/24"), 2, 1, 30),
+                NetworkSummary(IPv4Network("10.0.1.0/24"), 1, 0, 5),
+            ],
+        )
+        self.assertEqual(
+            columns.summarize([False] * 3)[0],
+            NetworkSummary(IPv4Network("10.0.0.0/24"), 2, 0, None),
+        )
+
+    def test_large_fleet(self):
+        servers = [IPv4Interface((0x0A000000 + i, 24)) for i in range(100000)]
+        columns = ServerColumns.from_interfaces(servers)
+        summaries = columns.summarize([i % 7 == 0 for i in range(len(servers))])
+        self.assertEqual(len(summaries), 391)
+        self.assertEqual(sum(summary.members for summary in summaries), 100000)
+        self.assertEqual(sum(summary.failed for summary in summaries), 14286)
+        self.assertEqual(
+            summaries[0], NetworkSummary(IPv4Network("10.0.0.0/24"), 256, 37, None)
+        )
+
+
+class Answer4NetworkTest(TestCase):
+    def test_group_by_ip_network(self):
+        with open("samplelog4.csv") as f:
+            servers = [record.ipv4interface for record in read_log(f)]
+        expected: dict[IPv4Network, set[IPv4Interface]] = {}
+        for server in servers:
+            expected.setdefault(server.network, set()).add(server)
+        self.assertEqual(group_by_ip_network(servers), expected)
+
+    def test_summarize_networks(self):
+        with open("samplelog3.csv") as f:
+            log = list(read_log(f))
+        histograms = LatencyHistogramDetector()
+        for record in log:
+            histograms.push_newer_record(record)
+        summaries = summarize_networks(
+            calc_failure_or_overload(log, 3, 200, 3),
+            {ip: histogram.max_ms for ip, histogram in histograms.result().items()},
+        )
+        for summary in summaries:
+            members = [
+                histogram.max_ms
+                for ip, histogram in histograms.result().items()
+                if ip.network == summary.network
+            ]
+            self.assertEqual(summary.members, len(members))
+            self.assertEqual(summary.worst_ms, max(m for m in members if m is not None))
+        self.assertEqual(
+            {str(summary.network): summary.failed for summary in summaries},
+            {"10.20.0.0/16": 0, "192.168.1.0/24": 1},
+        )
@@ -1,6 +1,10 @@
 from util import (
     read_log,
+    group_by_server,
     LogRecord,
+    parse_timestamp,
+    format_timestamp,
+    to_datetime,
 )
 from datetime import datetime
 from ipaddress import ip_interface
@@ -15,27 +19,65 @@ class UtilTest(TestCase):
             log,
             [
                 LogRecord(
-                    datetime(2020, 10, 19, 13, 31, 24), ip_interface("10.20.30.1/16"), 2
+                    parse_timestamp("20201019133124"), ip_interface("10.20.30.1/16"), 2
                 ),
                 LogRecord(
-                    datetime(2020, 10, 19, 13, 31, 35),
+                    parse_timestamp("20201019133135"),
                     ip_interface("192.168.1.2/24"),
                     5,
                 ),
                 LogRecord(
-                    datetime(2020, 10, 19, 13, 32, 24),
+                    parse_timestamp("20201019133224"),
                     ip_interface("10.20.30.1/16"),
                     522,
                 ),
                 LogRecord(
-                    datetime(2020, 10, 19, 13, 32, 35),
+                    parse_timestamp("20201019133235"),
                     ip_interface("192.168.1.2/24"),
                     15,
                 ),
                 LogRecord(
-                    datetime(2020, 10, 19, 13, 33, 24),
+                    parse_timestamp("20201019133324"),
                     ip_interface("10.20.30.1/16"),
                     None,
                 ),
             ],
         )
+
+    def test_parse_timestamp(self):
+        timestamp = parse_timestamp("20201019133124")
+        self.assertEqual(timestamp, 1603114284)
+        self.assertEqual(to_datetime(timestamp), datetime(2020, 10, 19, 13, 31, 24))
+        self.assertEqual(format_timestamp(timestamp), "2020-10-19T13:31:24")
+
+    def test_parse_invalid_timestamp(self):
+        for s in [
+            "2020101913",
+            "202010191331245",
+            "20201019256199",
+            "20201019136024",
+            "20201019133160",
+            "20201399133124",
+            "2020-10-19 13:3",
+            "",
+        ]:
+            with self.subTest(s=s):
+                with self.assertRaises(ValueError):
+                    parse_timestamp(s)
+
+    def test_group_by_server(self):
+        with open("samplelog.csv") as f:
+            log = list(read_log(f))
+        self.assertEqual(
+            list(group_by_server(log, batch_size=3)),
+            [
+                {
+                    ip_interface("10.20.30.1/16"): [log[0], log[2]],
+                    ip_interface("192.168.1.2/24"): [log[1]],
+                },
+                {
+                    ip_interface("192.168.1.2/24"): [log[3]],
+                    ip_interface("10.20.30.1/16"): [log[4]],
+                },
+            ],
+        )
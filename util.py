@@ -1,13 +1,67 @@
 from __future__ import annotations
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 from csv import DictReader
-from datetime import datetime
+from datetime import datetime, timedelta
 from dataclasses import dataclass
+from functools import lru_cache
 from ipaddress import IPv4Interface
-from typing import TextIO, TypedDict, Optional
+from itertools import islice
+from typing import TypedDict, Optional
 
 TimeoutResponse = "-"
 
+DEFAULT_GROUP_SIZE = 4096
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=1024)
+def _parse_date(yyyymmdd: str) -> int:
+    return (datetime.strptime(yyyymmdd, "%Y%m%d") - _EPOCH) // timedelta(seconds=1)
+
+
+def parse_timestamp(s: str) -> int:
+    """監視ログの確認日時（YYYYMMDDhhmmss）をUNIX時間（秒）に変換する
+
+    日付部分の変換はキャッシュするので、行ごとに `datetime` を作らない。
+    14桁の数字でないか、日時として正しくなければ `ValueError` を送出する
+
+    Args:
+        s: 確認日時
+    """
+    if len(s) != 14 or not (s.isascii() and s.isdigit()):
+        raise ValueError(f"invalid timestamp: {s!r}")
+    hours, minutes, seconds = int(s[8:10]), int(s[10:12]), int(s[12:])
+    if hours >= 24 or minutes >= 60 or seconds >= 60:
+        raise ValueError(f"invalid timestamp: {s!r}")
+    return _parse_date(s[:8]) + hours * 3600 + minutes * 60 + seconds
+
+
+def to_datetime(timestamp: int) -> datetime:
+    """UNIX時間（秒）を `datetime` に戻す
+
+    Args:
+        timestamp: UNIX時間（秒）
+    """
+    return _EPOCH + timedelta(seconds=timestamp)
+
+
+@lru_cache(maxsize=1024)
+def _format_date(days: int) -> str:
+    return (_EPOCH + timedelta(days=days)).date().isoformat()
+
+
+def format_timestamp(timestamp: int) -> str:
+    """UNIX時間（秒）をISO 8601形式の文字列にする
+
+    日付部分の変換はキャッシュするので、呼び出しごとに `datetime` を作らない
+
+    Args:
+        timestamp: UNIX時間（秒）
+    """
+    days, seconds = divmod(timestamp, 86400)
+    return f"{_format_date(days)}T{seconds // 3600:02}:{seconds // 60 % 60:02}:{seconds % 60:02}"
+
 
 class PrimitiveLogDict(TypedDict):
     datetime: str
@@ -20,12 +74,12 @@ class LogRecord:
     """監視ログ1行分
 
     Attributes:
-        datetime: 確認日時
+        datetime: 確認日時（UNIX時間・秒）
         ipv4interface: サーバアドレス
         response_ms: 応答時間（ミリ秒）
     """
 
-    datetime: datetime
+    datetime: int
     ipv4interface: IPv4Interface
     response_ms: Optional[int] = None
 
@@ -35,7 +89,7 @@ class LogRecord:
 
     @staticmethod
     def from_primitive_dict(d: PrimitiveLogDict) -> LogRecord:
-        dt = datetime.strptime(d["datetime"], "%Y%m%d%H%M%S")
+        dt = parse_timestamp(d["datetime"])
         ipv4interface = IPv4Interface(d["ipv4interface"])
         if d["response_ms"] == TimeoutResponse:
             return LogRecord(datetime=dt, ipv4interface=ipv4interface)
@@ -44,12 +98,37 @@ class LogRecord:
         )
 
 
-def read_log(f: TextIO) -> Iterable[LogRecord]:
+def read_log(f: Iterable[str]) -> Iterable[LogRecord]:
     """監視ログを読み込む
 
     Args:
-        f: 監視ログ
+        f: 監視ログ（テキストモードで開いたファイルまたは行のイテラブル）
     """
     reader = DictReader(f, fieldnames=["datetime", "ipv4interface", "response_ms"])
     for row in reader:
         yield LogRecord.from_primitive_dict(row)
+
+
+def group_by_server(
+    log: Iterable[LogRecord], batch_size: int = DEFAULT_GROUP_SIZE
+) -> Iterator[dict[IPv4Interface, list[LogRecord]]]:
+    """監視ログを `batch_size` 行ずつ区切り、サーバごとにまとめる
+
+    サーバごとの記録の順序は保たれる。区切るのでログ全体は保持しない
+
+    Args:
+        log: 読み込まれた監視ログ
+        batch_size: 1回にまとめる行数
+    """
+    records = iter(log)
+    while True:
+        batch: dict[IPv4Interface, list[LogRecord]] = {}
+        for record in islice(records, batch_size):
+            server_records = batch.get(record.ipv4interface)
+            if server_records is None:
+                batch[record.ipv4interface] = [record]
+            else:
+                server_records.append(record)
+        if not batch:
+            return
+        yield batch